@@ -0,0 +1,221 @@
+"""
+Behaviour check for upm.download against a local http.server stand-in.
+
+Serves a generated file from a local HTTP server that honors Range, If-Range and conditional
+requests (and can drop a connection part-way through a response), then checks that the download
+manager resumes interrupted transfers, restarts when the file changed under a partial download,
+rejects content that doesn't match its SHA-256 and serves repeat downloads from its cache. Exits
+non-zero if any check fails.
+
+    python benchmarks/download_check.py
+"""
+import os
+import sys
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from upm import download
+
+FILE_SIZE = 3 * 1024 * 1024 + 123
+FILE_PATH = '/Installer.bin'
+
+class StandIn:
+    """The file served, its validators and a log of the requests made for it."""
+    def __init__(self):
+        self.requests = []
+        self.drop_after = None
+        self.set_content(os.urandom(FILE_SIZE), '"v1"')
+
+    def set_content(self, content, etag):
+        self.content = content
+        self.etag = etag
+        self.last_modified = 'Mon, 05 Oct 2026 10:00:00 GMT'
+
+    def sha256(self):
+        return hashlib.sha256(self.content).hexdigest()
+
+    def requests_of(self, method):
+        return [headers for request_method, headers in self.requests if request_method == method]
+
+def make_handler(stand_in):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_HEAD(self):
+            self.respond(body=False)
+
+        def do_GET(self):
+            self.respond(body=True)
+
+        def respond(self, body):
+            stand_in.requests.append((self.command, dict(self.headers)))
+            if self.path != FILE_PATH:
+                self.send_error(404)
+                return
+            if self.headers.get('If-None-Match') == stand_in.etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+
+            content = stand_in.content
+            start, end = 0, len(content) - 1
+            ranged = False
+            if self.headers.get('Range') and self.headers.get('If-Range') in (None, stand_in.etag, stand_in.last_modified):
+                first, _, last = self.headers['Range'][len('bytes='):].partition('-')
+                start, end = int(first), int(last) if last else end
+                ranged = True
+
+            self.send_response(206 if ranged else 200)
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('ETag', stand_in.etag)
+            self.send_header('Last-Modified', stand_in.last_modified)
+            if ranged:
+                self.send_header('Content-Range', f"bytes {start}-{end}/{len(content)}")
+            self.end_headers()
+            if not body:
+                return
+            data = content[start:end + 1]
+            if stand_in.drop_after is not None:
+                # Simulate a dropped connection: promise the full length, send part of it
+                data = data[:stand_in.drop_after]
+                stand_in.drop_after = None
+            self.wfile.write(data)
+
+    return Handler
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def expect_failure(message, function, *args, **kwargs):
+    try:
+        function(*args, **kwargs)
+    except Exception as e:
+        if message not in str(e):
+            raise AssertionError(f"expected an error containing {message!r}, got {e!r}")
+        return
+    raise AssertionError(f"expected an error containing {message!r}, but the download succeeded")
+
+def check_resume(stand_in, url, cache_dir):
+    stand_in.drop_after = FILE_SIZE // 3
+    expect_failure('run again to resume', download.download, url, cache_dir=cache_dir)
+
+    stand_in.requests.clear()
+    path = download.download(url, sha256=stand_in.sha256(), cache_dir=cache_dir)
+    assert read(path) == stand_in.content, "resumed download doesn't match the served file"
+    gets = stand_in.requests_of('GET')
+    assert len(gets) == 1, f"expected one GET to resume, got {len(gets)}"
+    assert gets[0].get('Range') == f"bytes={FILE_SIZE // 3}-", f"resume sent Range {gets[0].get('Range')!r}"
+    assert gets[0].get('If-Range') == stand_in.etag, f"resume sent If-Range {gets[0].get('If-Range')!r}"
+
+def check_changed_during_resume(stand_in, url, cache_dir):
+    stand_in.drop_after = FILE_SIZE // 2
+    expect_failure('run again to resume', download.download, url, cache_dir=cache_dir)
+
+    # The server's file changes before the retry; the partial bytes belong to the old file
+    stand_in.set_content(os.urandom(FILE_SIZE), '"v2"')
+    stand_in.requests.clear()
+    path = download.download(url, sha256=stand_in.sha256(), cache_dir=cache_dir)
+    assert read(path) == stand_in.content, "download after a server-side change doesn't match the new file"
+    gets = stand_in.requests_of('GET')
+    assert len(gets) == 1 and 'Range' not in gets[0], "a partial download of the old file was resumed"
+
+def check_segmented(stand_in, url, cache_dir):
+    segment_size = download.MIN_SEGMENT_SIZE
+    download.MIN_SEGMENT_SIZE = FILE_SIZE // 4
+    try:
+        path = download.download(url, sha256=stand_in.sha256(), segments=4, cache_dir=cache_dir)
+    finally:
+        download.MIN_SEGMENT_SIZE = segment_size
+    assert read(path) == stand_in.content, "segmented download doesn't match the served file"
+    ranges = sorted(headers.get('Range') for headers in stand_in.requests_of('GET'))
+    assert len(ranges) == 4 and all(ranges), f"expected 4 ranged GETs, got {ranges}"
+
+def check_sha256_mismatch(stand_in, url, cache_dir):
+    wrong = hashlib.sha256(b'something else').hexdigest()
+    expect_failure('SHA-256 mismatch', download.download, url, sha256=wrong, cache_dir=cache_dir)
+    blob_dir = download.Downloader(cache_dir).blob_dir
+    blobs = os.listdir(blob_dir) if os.path.isdir(blob_dir) else []
+    assert not blobs, f"mismatched content was kept in the cache: {blobs}"
+    assert download.Downloader(cache_dir).lookup(url, None) is None, "mismatched content was indexed for its url"
+
+def check_cache_hit(stand_in, url, cache_dir):
+    first = download.download(url, cache_dir=cache_dir)
+
+    # With the expected hash the blob is used without touching the network
+    stand_in.requests.clear()
+    dest = os.path.join(cache_dir, 'copy', 'Installer.bin')
+    assert download.download(url, dest, sha256=stand_in.sha256(), cache_dir=cache_dir) == dest
+    assert read(dest) == stand_in.content, "cached copy doesn't match the served file"
+    assert not stand_in.requests, f"a download with a known hash made {len(stand_in.requests)} requests"
+
+    # Without it, a conditional request revalidates the blob and nothing is downloaded
+    assert download.download(url, cache_dir=cache_dir) == first
+    assert not stand_in.requests_of('GET'), "an unchanged file was downloaded again"
+    heads = stand_in.requests_of('HEAD')
+    assert len(heads) == 1 and heads[0].get('If-None-Match') == stand_in.etag, "the cached download wasn't revalidated"
+
+    # A newer file on the server is downloaded again
+    stand_in.set_content(os.urandom(FILE_SIZE), '"v3"')
+    path = download.download(url, cache_dir=cache_dir)
+    assert read(path) == stand_in.content, "a changed file was served from the cache"
+
+CHECKS = [
+    ('resume with Range/If-Range', check_resume),
+    ('restart after server change', check_changed_during_resume),
+    ('segmented download', check_segmented),
+    ('SHA-256 mismatch', check_sha256_mismatch),
+    ('cache hit', check_cache_hit),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description="Check upm.download against a local HTTP server.")
+    parser.add_argument('--only', type=str, nargs='+', help="Only run the named checks")
+    parser.add_argument('--verbose', action='store_true', help="Show the download manager's output")
+    args = parser.parse_args()
+
+    stand_in = StandIn()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(stand_in))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}{FILE_PATH}"
+
+    failed = False
+    try:
+        for name, check in CHECKS:
+            if args.only and name not in args.only:
+                continue
+            stand_in.set_content(os.urandom(FILE_SIZE), '"v1"')
+            stand_in.requests.clear()
+            cache_dir = tempfile.mkdtemp(prefix='upm-download-')
+            stdout = sys.stdout
+            try:
+                if not args.verbose:
+                    sys.stdout = open(os.devnull, 'w')
+                check(stand_in, url, cache_dir)
+                status = 'ok'
+            except Exception as e:
+                status = f"FAILED: {e}"
+                failed = True
+            finally:
+                if sys.stdout is not stdout:
+                    sys.stdout.close()
+                    sys.stdout = stdout
+                shutil.rmtree(cache_dir, ignore_errors=True)
+            print(f"  {name:<30} {status}")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""
+End-to-end benchmarks for the UPM orchestration layer.
+
+Creates a synthetic project and a stub engine (see stub_tool.py), runs upm commands against them
+and records wall-clock timings to JSON so revisions can be compared:
+
+    python benchmarks/run.py --output before.json
+    git checkout my-branch
+    python benchmarks/run.py --output after.json --compare before.json
+
+The stub engine uses POSIX shell wrappers, so this runs on Linux and macOS.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+from synthetic import create_stub_engine, create_project
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT_NAME = 'BenchGame'
+DEFAULT_OUTPUT = 'benchmark-results.json'
+CHANGES_FILE = 'changes.txt'
+
+def get_benchmarks(project_dir, engine_dir, with_venv=False):
+    """Return (name, upm arguments, working directory) tuples in the order they run."""
+    setup_args = ['setup'] if with_venv else ['setup', '--novenv']
+    build_args = ['build', '--project-dir', project_dir, '--build-type', 'Development', '--target-name', PROJECT_NAME, '--build']
+    workdir = os.path.dirname(project_dir)
+    return [
+        # Run config from outside the project so it copies this revision's upm package in
+        ('config', ['config', '--dir', project_dir, '--project-name', PROJECT_NAME, '--unreal', engine_dir], workdir),
+        ('setup', setup_args, project_dir),
+        ('build', build_args + ['--force'], project_dir),
+        ('build-cached', build_args, project_dir),
+        ('package', ['build', '--project-dir', project_dir, '--build-type', 'Development', '--target-name', PROJECT_NAME, '--package'], project_dir),
+        ('changelog-add-change', ['changelog', '--add-change', 'Benchmark change'], project_dir),
+        ('changelog-add-changes', ['changelog', '--add-changes', os.path.join(workdir, CHANGES_FILE)], project_dir),
+        ('changelog-add-version', ['changelog', '--add-version'], project_dir),
+        ('changelog-update-readme', ['changelog', '--update-readme'], project_dir),
+        ('changelog-update-ini', ['changelog', '--update-ini'], project_dir),
+    ]
+
+def get_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_upm(upm_args, cwd, env):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-m', 'upm'] + upm_args,
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+    return time.perf_counter() - start, result
+
+def run_benchmarks(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix='upm-bench-')
+    engine_dir = os.path.join(workdir, 'Engine')
+    project_dir = os.path.join(workdir, PROJECT_NAME)
+
+    print(f"Creating synthetic project in {workdir} ...")
+    start = time.perf_counter()
+    create_stub_engine(engine_dir)
+    create_project(
+        project_dir,
+        PROJECT_NAME,
+        content_files=args.content_files,
+        source_modules=args.source_modules,
+        source_files=args.source_files,
+        versions=args.versions,
+        changes_per_version=args.changes
+    )
+    with open(os.path.join(workdir, CHANGES_FILE), 'w') as f:
+        f.writelines(f"Batched change {i}\n" for i in range(args.batch_changes))
+    print(f"Created synthetic project in {time.perf_counter() - start:.1f}s")
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_DIR, env.get('PYTHONPATH')]))
+    env['UNREAL_PATH'] = engine_dir
+    env['UPM_STUB_LATENCY'] = str(args.latency)
+    env['UPM_STUB_ACTIONS'] = str(args.actions)
+    env['UPM_STUB_LOG_LINES'] = str(args.log_lines)
+    env['CHANGELOG_BACKEND'] = args.changelog_backend
+
+    results = {}
+    try:
+        for name, upm_args, cwd in get_benchmarks(project_dir, engine_dir, with_venv=args.with_venv):
+            if args.only and name not in args.only:
+                continue
+            runs = []
+            returncode = 0
+            for _ in range(args.repeat):
+                elapsed, result = run_upm(upm_args, cwd, env)
+                runs.append(elapsed)
+                if result.returncode != 0:
+                    returncode = result.returncode
+                    print(f"  {name} failed ({result.returncode}):\n{result.stderr[-2000:]}")
+                    break
+            results[name] = {
+                'runs': runs,
+                'min': min(runs),
+                'median': statistics.median(runs),
+                'mean': statistics.mean(runs),
+                'returncode': returncode
+            }
+            print(f"  {name:<26} median {results[name]['median']:8.3f}s  min {results[name]['min']:8.3f}s  ({len(runs)} runs)")
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'revision': get_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {
+            'repeat': args.repeat,
+            'content_files': args.content_files,
+            'source_modules': args.source_modules,
+            'source_files': args.source_files,
+            'versions': args.versions,
+            'changes': args.changes,
+            'batch_changes': args.batch_changes,
+            'latency': args.latency,
+            'actions': args.actions,
+            'log_lines': args.log_lines,
+            'with_venv': args.with_venv,
+            'changelog_backend': args.changelog_backend
+        },
+        'results': results
+    }
+
+def compare(report, baseline_path):
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+
+    print(f"\nComparison against {baseline_path} ({(baseline.get('revision') or 'unknown')[:12]}):")
+    for name, result in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            print(f"  {name:<26} {'':>10}  {result['median']:8.3f}s  (new)")
+            continue
+        change = (result['median'] - previous['median']) / previous['median'] * 100 if previous['median'] else 0.0
+        print(f"  {name:<26} {previous['median']:8.3f}s -> {result['median']:8.3f}s  {change:+6.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark upm commands against a synthetic project and stub engine.")
+    parser.add_argument('--output', type=str, default=DEFAULT_OUTPUT, help=f"Where to write results JSON (default: {DEFAULT_OUTPUT})")
+    parser.add_argument('--compare', type=str, metavar='BASELINE', help="Compare against a previous results JSON")
+    parser.add_argument('--only', type=str, nargs='+', help="Only run the named benchmarks")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per benchmark (default: 3)")
+    parser.add_argument('--workdir', type=str, help="Create the synthetic project here instead of a temporary directory")
+    parser.add_argument('--keep', action='store_true', help="Keep the temporary directory afterwards")
+    parser.add_argument('--with-venv', action='store_true', help="Let upm setup create the venv and pip install (needs network)")
+    parser.add_argument('--content-files', type=int, default=2000, help="Number of Content/ files (default: 2000)")
+    parser.add_argument('--source-modules', type=int, default=4, help="Number of Source/ modules (default: 4)")
+    parser.add_argument('--source-files', type=int, default=100, help="Source files per module (default: 100)")
+    parser.add_argument('--versions', type=int, default=500, help="Versions in Changelog.json (default: 500)")
+    parser.add_argument('--changes', type=int, default=10, help="Changes per version (default: 10)")
+    parser.add_argument('--batch-changes', type=int, default=200, help="Changes fed to changelog --add-changes (default: 200)")
+    parser.add_argument('--latency', type=float, default=0.5, help="Stub tool latency in seconds (default: 0.5)")
+    parser.add_argument('--actions', type=int, default=200, help="Compile actions printed by stub builds (default: 200)")
+    parser.add_argument('--log-lines', type=int, default=2000, help="Log lines per stub BuildCookRun stage (default: 2000)")
+    parser.add_argument('--changelog-backend', type=str, default='json', choices=['json', 'journal'], help="CHANGELOG_BACKEND for the changelog benchmarks (default: json)")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"Wrote results to {args.output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+    if any(result['returncode'] != 0 for result in report['results'].values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
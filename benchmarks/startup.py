@@ -0,0 +1,117 @@
+"""
+Startup-time regression check for the upm CLI.
+
+Times `upm --help`, `upm build --help`, `import upm.api` and a cached `upm build` dispatch against a
+stub engine, subtracts bare interpreter startup, and exits non-zero if any exceeds its budget. Also
+checks that importing the upm modules does not read the project's .env, and that the CLI entry point
+and upm.api don't import subprocess or dotenv until a command needs them.
+
+    python benchmarks/startup.py
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+import time
+
+from synthetic import create_stub_engine, write_file
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT_NAME = 'StartupGame'
+SENTINEL_KEY = 'UPM_STARTUP_SENTINEL'
+UPM_MODULES = ['upm.api', 'upm.build', 'upm.matrix', 'upm.changelog', 'upm.setup', 'upm.config', 'upm.query']
+# Imported for every command (or by tools embedding upm), so they must stay free of heavy imports
+LIGHT_MODULES = ['upm.__main__', 'upm.api']
+HEAVY_MODULES = ['subprocess', 'dotenv']
+
+# Milliseconds allowed on top of a bare `python -c pass`
+DEFAULT_BUDGETS = {
+    'upm --help': 60,
+    'upm build --help': 60,
+    'import upm.api': 30,
+    'upm build (cached)': 150,
+}
+
+def time_command(command, cwd, env, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        runs.append((time.perf_counter() - start) * 1000)
+    return statistics.median(runs)
+
+def check_import_side_effects(project_dir, env):
+    """Return the side effects of importing upm modules: .env loaded, or heavy modules in the light ones."""
+    problems = []
+    code = f"import os, {', '.join(UPM_MODULES)}; raise SystemExit(1 if {SENTINEL_KEY!r} in os.environ else 0)"
+    if subprocess.run([sys.executable, '-c', code], cwd=project_dir, env=env).returncode != 0:
+        problems.append(".env was loaded at import time")
+    for module in LIGHT_MODULES:
+        code = f"import sys, {module}; print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+        loaded = subprocess.run([sys.executable, '-c', code], cwd=project_dir, env=env, stdout=subprocess.PIPE, text=True, check=True).stdout.split()
+        if loaded:
+            problems.append(f"importing {module} loads {', '.join(loaded)}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Check upm CLI startup time against fixed budgets.")
+    parser.add_argument('--repeat', type=int, default=10, help="Runs per command (default: 10)")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply all budgets, e.g. for slow CI machines")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='upm-startup-')
+    try:
+        engine_dir = create_stub_engine(os.path.join(workdir, 'Engine'))
+        project_dir = os.path.join(workdir, PROJECT_NAME)
+        write_file(os.path.join(project_dir, f"{PROJECT_NAME}.uproject"), '{}\n')
+        write_file(os.path.join(project_dir, 'Source', f"{PROJECT_NAME}.Target.cs"), '\n')
+        write_file(os.path.join(project_dir, '.env'), '\n'.join([
+            f"PROJECT_NAME={PROJECT_NAME}",
+            f"GAME_NAME={PROJECT_NAME}",
+            f"EDITOR_NAME={PROJECT_NAME}Editor",
+            f"UNREAL_PATH={engine_dir}",
+            f"{SENTINEL_KEY}=1",
+        ]) + '\n')
+
+        env = dict(os.environ)
+        env.pop(SENTINEL_KEY, None)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_DIR, env.get('PYTHONPATH')]))
+        env['UPM_STUB_LATENCY'] = '0'
+
+        upm = [sys.executable, '-m', 'upm']
+        build = upm + ['build', '--project-dir', project_dir, '--build-type', 'Development', '--target-name', PROJECT_NAME, '--build']
+        # Warm the build cache so the timed build only measures dispatch
+        subprocess.run(build, cwd=project_dir, env=env, stdout=subprocess.DEVNULL, check=True)
+
+        commands = {
+            'upm --help': upm + ['--help'],
+            'upm build --help': upm + ['build', '--help'],
+            'import upm.api': [sys.executable, '-c', 'import upm.api'],
+            'upm build (cached)': build,
+        }
+
+        baseline = time_command([sys.executable, '-c', 'pass'], project_dir, env, args.repeat)
+        print(f"Interpreter startup: {baseline:.1f} ms")
+
+        failed = False
+        for name, command in commands.items():
+            overhead = time_command(command, project_dir, env, args.repeat) - baseline
+            budget = DEFAULT_BUDGETS[name] * args.scale
+            status = 'ok' if overhead <= budget else 'OVER BUDGET'
+            failed |= overhead > budget
+            print(f"  {name:<20} +{overhead:7.1f} ms  (budget {budget:.0f} ms)  {status}")
+
+        problems = check_import_side_effects(project_dir, env)
+        for problem in problems or ['none']:
+            print(f"  import side effects   {problem}")
+        failed |= bool(problems)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
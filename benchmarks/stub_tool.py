@@ -0,0 +1,118 @@
+"""
+Stand-in for UnrealBuildTool / AutomationTool used by the benchmark harness.
+
+Invoked by the wrapper scripts the harness writes into a stub engine (Build.sh, RunUAT.sh, ...).
+Emits log output shaped like the real tools and sleeps to emulate their latency:
+
+    UPM_STUB_LATENCY     seconds spent per tool invocation (default 0.5)
+    UPM_STUB_ACTIONS     number of "[n/N] Compile" actions printed by builds (default 200)
+    UPM_STUB_LOG_LINES   log lines printed per BuildCookRun stage (default 2000)
+    UPM_STUB_FAIL        if set, exit with this code instead of 0
+"""
+import os
+import sys
+import json
+import time
+
+UAT_STAGES = ['BUILD', 'COOK', 'STAGE', 'PACKAGE', 'ARCHIVE']
+
+def env_float(key, default):
+    return float(os.environ.get(key, default))
+
+def env_int(key, default):
+    return int(os.environ.get(key, default))
+
+def emit(lines, latency):
+    """Print lines spread evenly over latency seconds."""
+    lines = list(lines)
+    delay = latency / max(len(lines), 1)
+    for line in lines:
+        sys.stdout.write(line + '\n')
+        if delay >= 0.001:
+            sys.stdout.flush()
+            time.sleep(delay)
+    sys.stdout.flush()
+
+def build(args, latency):
+    target = args[0] if args else 'Unknown'
+    actions = env_int('UPM_STUB_ACTIONS', 200)
+
+    def lines():
+        yield f"Using bundled DotNet SDK version: 8.0.300"
+        yield f"Running UnrealBuildTool: dotnet UnrealBuildTool.dll {' '.join(args)}"
+        yield f"Building {target}..."
+        for i in range(1, actions + 1):
+            yield f"[{i}/{actions}] Compile Module.{target}.{i}.cpp"
+            if i % 50 == 0:
+                yield f"/Source/{target}/Private/File{i}.cpp(12): warning C4996: 'Deprecated': this function is deprecated"
+        yield "Result: Succeeded"
+        yield f"Total execution time: {latency:.2f} seconds"
+
+    emit(lines(), latency)
+    write_receipt(args)
+
+def write_receipt(args):
+    """Write (or on -clean remove) the target receipt and executable, as UBT does."""
+    if len(args) < 4 or not args[3].endswith('.uproject'):
+        return
+    target, platform_name, config, project_file = args[:4]
+    binaries_dir = os.path.join(os.path.dirname(project_file), 'Binaries', platform_name)
+    name = target if config == 'Development' else f"{target}-{platform_name}-{config}"
+    receipt_path = os.path.join(binaries_dir, f"{name}.target")
+    executable_path = os.path.join(binaries_dir, name)
+    if '-clean' in args:
+        for path in (receipt_path, executable_path):
+            if os.path.exists(path):
+                os.remove(path)
+        return
+    os.makedirs(binaries_dir, exist_ok=True)
+    with open(executable_path, 'w') as f:
+        f.write(f"stub {target} {config}\n")
+    with open(receipt_path, 'w') as f:
+        json.dump({
+            'TargetName': target,
+            'Platform': platform_name,
+            'Configuration': config,
+            'BuildProducts': [{'Path': f"$(ProjectDir)/Binaries/{platform_name}/{name}", 'Type': 'Executable'}]
+        }, f, indent=4)
+
+def buildcookrun(args, latency):
+    log_lines = env_int('UPM_STUB_LOG_LINES', 2000)
+    stages = [stage for stage in UAT_STAGES if f"-{stage.lower()}" in [arg.lower() for arg in args]] or UAT_STAGES
+
+    def lines():
+        yield f"Running AutomationTool... {' '.join(args)}"
+        for stage in stages:
+            yield f"********** {stage} COMMAND STARTED **********"
+            for i in range(log_lines):
+                yield f"LogCook: Display: {stage.title()} processing package /Game/Asset_{i:06d}"
+            yield f"********** {stage} COMMAND COMPLETED **********"
+        yield "BUILD SUCCESSFUL"
+        yield "AutomationTool exiting with ExitCode=0 (Success)"
+
+    emit(lines(), latency * len(stages))
+
+def projectfiles(args, latency):
+    emit([
+        "Generating VSCode project files:",
+        "Discovering modules, targets and source code for project...",
+        "Writing project files...",
+        f"Total execution time: {latency:.2f} seconds"
+    ], latency)
+
+def main():
+    tool = sys.argv[1]
+    args = sys.argv[2:]
+    latency = env_float('UPM_STUB_LATENCY', 0.5)
+
+    if tool == 'uat':
+        buildcookrun(args, latency)
+    elif tool == 'ubt' and '-projectfiles' in args:
+        projectfiles(args, latency)
+    else:
+        build(args, latency)
+
+    sys.exit(env_int('UPM_STUB_FAIL', 0))
+
+if __name__ == '__main__':
+    main()
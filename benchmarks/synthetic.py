@@ -0,0 +1,115 @@
+"""Generators for the synthetic project and stub engine used by the benchmark harness."""
+import os
+import sys
+import json
+import stat
+import random
+import subprocess
+
+STUB_TOOL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stub_tool.py')
+
+# Wrapper script -> stub tool mode, relative to the engine root
+ENGINE_SCRIPTS = {
+    os.path.join('Engine', 'Build', 'BatchFiles', 'Linux', 'Build.sh'): 'ubt',
+    os.path.join('Engine', 'Build', 'BatchFiles', 'Mac', 'Build.sh'): 'ubt',
+    os.path.join('Engine', 'Build', 'BatchFiles', 'Mac', 'Clean.sh'): 'ubt',
+    os.path.join('Engine', 'Build', 'BatchFiles', 'Mac', 'RunUBT.sh'): 'ubt',
+    os.path.join('Engine', 'Build', 'BatchFiles', 'Mac', 'Package.sh'): 'uat',
+    os.path.join('Engine', 'Build', 'BatchFiles', 'RunUAT.sh'): 'uat',
+    os.path.join('Engine', 'Binaries', 'DotNET', 'UnrealBuildTool', 'UnrealBuildTool'): 'ubt',
+    os.path.join('Engine', 'Binaries', 'DotNET', 'UnrealBuildTool', 'UnrealBuildTool.exe'): 'ubt',
+}
+
+DEFAULT_GAME_INI = """[/Script/EngineSettings.GeneralProjectSettings]
+ProjectID=0123456789ABCDEF0123456789ABCDEF
+ProjectName=Benchmark Project
+ProjectVersion=0.0.1
+; synthetic comment
+
+[/Script/Engine.AssetManagerSettings]
++PrimaryAssetTypesToScan=(PrimaryAssetType="Map",AssetBaseClass=/Script/Engine.World)
+-PrimaryAssetTypesToScan=(PrimaryAssetType="PrimaryAssetLabel",AssetBaseClass=/Script/Engine.PrimaryAssetLabel)
+bOnlyCookProductionAssets=False
+"""
+
+def write_file(path, content, mode='w'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode) as f:
+        f.write(content)
+
+def create_stub_engine(engine_dir):
+    """Create a fake engine whose build scripts call stub_tool.py."""
+    for relpath, tool in ENGINE_SCRIPTS.items():
+        path = os.path.join(engine_dir, relpath)
+        write_file(path, f'#!/bin/sh\nexec "{sys.executable}" "{STUB_TOOL}" {tool} "$@"\n')
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+    write_file(os.path.join(engine_dir, 'Engine', 'Build', 'Build.version'), json.dumps({
+        'MajorVersion': 5,
+        'MinorVersion': 4,
+        'PatchVersion': 4,
+        'Changelist': 0,
+        'CompatibleChangelist': 35576357,
+        'BranchName': '++UE5+Release-5.4'
+    }, indent=4))
+    write_file(os.path.join(engine_dir, 'Engine', 'Source', 'Programs', 'UnrealBuildTool', 'UnrealBuildTool.csproj'), '<Project />\n')
+    return engine_dir
+
+def create_project(project_dir, project_name, content_files=2000, source_modules=4, source_files=100, versions=500, changes_per_version=10, seed=0):
+    """Create a synthetic Unreal project with Source/, Content/, Config/ and a Changelog.json."""
+    rng = random.Random(seed)
+
+    write_file(os.path.join(project_dir, f"{project_name}.uproject"), json.dumps({
+        'FileVersion': 3,
+        'EngineAssociation': '5.4',
+        'Modules': [
+            {'Name': f"{project_name}Module{i}", 'Type': 'Runtime', 'LoadingPhase': 'Default'}
+            for i in range(source_modules)
+        ]
+    }, indent=4))
+
+    source_dir = os.path.join(project_dir, 'Source')
+    write_file(os.path.join(source_dir, f"{project_name}.Target.cs"), f"public class {project_name}Target : TargetRules {{ }}\n")
+    write_file(os.path.join(source_dir, f"{project_name}Editor.Target.cs"), f"public class {project_name}EditorTarget : TargetRules {{ }}\n")
+    for module in range(source_modules):
+        module_name = f"{project_name}Module{module}"
+        module_dir = os.path.join(source_dir, module_name)
+        write_file(os.path.join(module_dir, f"{module_name}.Build.cs"), f"public class {module_name} : ModuleRules {{ }}\n")
+        for i in range(source_files):
+            write_file(os.path.join(module_dir, 'Public', f"File{i}.h"), f"#pragma once\nstruct F{module_name}File{i} {{ int Value = {i}; }};\n")
+            write_file(os.path.join(module_dir, 'Private', f"File{i}.cpp"), f'#include "File{i}.h"\n' + '// padding\n' * rng.randint(10, 200))
+
+    # Spread Content/ over a realistic folder hierarchy
+    content_dir = os.path.join(project_dir, 'Content', project_name)
+    for i in range(content_files):
+        folder = os.path.join(content_dir, f"Folder{i % 40}", f"Sub{i % 7}")
+        write_file(os.path.join(folder, f"Asset_{i:06d}.uasset"), os.urandom(rng.randint(256, 4096)), mode='wb')
+    os.makedirs(os.path.join(content_dir, 'Data'), exist_ok=True)
+
+    write_file(os.path.join(project_dir, 'Config', 'DefaultGame.ini'), DEFAULT_GAME_INI)
+    write_file(os.path.join(project_dir, 'Config', 'DefaultEngine.ini'), "[/Script/EngineSettings.GameMapsSettings]\nGameDefaultMap=/Game/Maps/Main\n")
+
+    changelog = [
+        {
+            'Version': f"0.{i // 100}.{i % 100}",
+            'PrereleaseType': 'Alpha',
+            'ReleaseDate': '2024-01-01',
+            'Changes': [f"Change {j} for version {i}: " + 'x' * rng.randint(10, 80) for j in range(changes_per_version)],
+            'Commit': f"{rng.getrandbits(160):040x}"
+        }
+        for i in range(versions)
+    ]
+    write_file(os.path.join(project_dir, 'Changelog.json'), json.dumps(changelog, indent=4))
+    write_file(os.path.join(project_dir, 'README.md'), f"# {project_name}\n\nSynthetic benchmark project.\n")
+
+    init_git(project_dir)
+    return project_dir
+
+def init_git(project_dir):
+    """Give the project a HEAD commit so changelog commands resolve a commit hash."""
+    git = ['git', '-c', 'user.name=upm-bench', '-c', 'user.email=bench@localhost', '-c', 'commit.gpgsign=false']
+    try:
+        subprocess.run(['git', 'init', '-q'], cwd=project_dir, check=True)
+        subprocess.run(git + ['commit', '-q', '--allow-empty', '-m', 'Synthetic project'], cwd=project_dir, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        print("git not available; changelog benchmarks will run without a commit hash")
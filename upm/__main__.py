@@ -1,7 +1,6 @@
 import argparse
 import sys
 import os
-import subprocess
 
 def is_admin():
     try:
@@ -12,8 +11,8 @@ def is_admin():
 
 def run_as_admin(cmd):
     if sys.version_info >= (3, 5):
-        cmd = cmd
-        subprocess.run(cmd, shell=True)
+        from upm.process import run
+        run(cmd, shell=True, check=False, process_group=False)
     else:
         raise RuntimeError("Python 3.5+ is required to run this script.")
 
@@ -54,12 +53,25 @@ def main():
     parser_setup.add_argument('--game-name', type=str, help='Specify the name for your game. Default: [project-name].')
     parser_setup.add_argument('--editor-name', type=str, help='Specify the name for your editor target. Default: \'[game-name]Editor\'.')
     parser_setup.add_argument('--workspace', type=str, help='Specify the name for your VS Code workspace. If not specified, the name of the current directory will be used.')
+    parser_setup.add_argument('--prerelease-type', type=str, help='Specify the prerelease type recorded for new changelog versions, e.g. Alpha.')
     parser_setup.add_argument('--clean', action='store_true', help='Remove UPM config files from destination folder.')
+    parser_setup.add_argument('--link', choices=['hardlink', 'symlink'], default=None, help='Link UPM scripts to this installation instead of copying them (for many checkouts on one machine).')
+    parser_setup.add_argument('--no-prune', action='store_true', help='Keep UPM scripts that a previous config copied but this version no longer has.')
+    parser_setup.add_argument('--root', type=valid_dir_path, default=None, help='Configure every project (directory with a .uproject) found under ROOT instead of --dir.')
+    parser_setup.add_argument('--jobs', type=int, default=None, help='Maximum number of projects to configure at once with --root (default: 4)')
+    parser_setup.add_argument('--shared-names', action='store_true', help='With --root, give every project the --game-name, --editor-name and --workspace values instead of names from its own .uproject.')
 
     parser_setup = subparsers.add_parser('setup', help='Run setup script.')
     parser_setup.add_argument('--clean', action='store_true', help='Clean generated project files.')
     parser_setup.add_argument('--noprojfiles', action='store_true', help='Skip generating project files.')
+    parser_setup.add_argument('--force', action='store_true', help='Regenerate project files even if their inputs have not changed.')
     parser_setup.add_argument('--novenv', action='store_true', help='Skip creating virtual environment.')
+    parser_setup.add_argument('--offline', action='store_true', help='Install dependencies only from the wheelhouse (see upm wheelhouse sync); fail if it is not synced.')
+    parser_setup.add_argument('--wheelhouse', type=str, default=None, metavar='DIR', help='Wheelhouse to install dependencies from when synced (default: $UPM_WHEELHOUSE or the user cache).')
+    parser_setup.add_argument('--shared-venv', action='store_true', help='Link .venv to a virtual environment in the user cache shared by checkouts with the same requirements.')
+    parser_setup.add_argument('--jobs', type=int, default=None, help='Maximum number of setup stages, or projects with --root, to run at once (default: 4)')
+    parser_setup.add_argument('--root', type=valid_dir_path, default=None, help='Set up every project (directory with a .uproject) found under ROOT, sharing one venv.')
+    parser_setup.add_argument('--profile', type=str, default=None, metavar='PATH', help='Write a Chrome trace-event JSON timing profile to PATH.')
 
     parser_setup = subparsers.add_parser('install-vscode', help='Download and install Visual Studio Code.')
     parser_setup = subparsers.add_parser('install-vs', help='Download and install Visual Studio Community (prompts for admin privileges).')
@@ -68,9 +80,9 @@ def main():
     parser_setup = subparsers.add_parser('build', help='Build commands.')
     parser_setup.add_argument('--project-dir', type=str, required=True,
                         help="Path to the project directory")
-    parser_setup.add_argument('--build-type', type=str, required=True,
+    parser_setup.add_argument('--build-type', type=str,
                         help="Type of build (debug, development, testomg. release)")
-    parser_setup.add_argument('--target-name', type=str, required=True,
+    parser_setup.add_argument('--target-name', type=str,
                         help="Name of target to build")
     parser_setup.add_argument('--clean', action='store_true',
                         help="Clean selected targets")
@@ -78,21 +90,79 @@ def main():
                         help="Build selected targets")
     parser_setup.add_argument('--package', action='store_true',
                         help="Package selected target for deployment")
+    parser_setup.add_argument('--force', action='store_true',
+                        help="Build even if the build cache says the target is up to date")
+    parser_setup.add_argument('--full-clean', action='store_true',
+                        help="With --package, clean the build and cook and run every packaging phase")
+    parser_setup.add_argument('--log-events', type=str, default=None, metavar='PATH',
+                        help="Append classified build log events (errors, warnings, progress, phases) to PATH as NDJSON")
+    parser_setup.add_argument('--profile', type=str, default=None, metavar='PATH',
+                        help="Write a Chrome trace-event JSON timing profile to PATH")
+    parser_setup.add_argument('--matrix', type=str, nargs='+', metavar='KEY=VALUES',
+                        help="Build every combination, e.g. targets=Game,GameEditor configs=Development,Shipping")
+    parser_setup.add_argument('--jobs', type=int, default=None,
+                        help="Maximum number of matrix jobs to run at once (default: 2)")
+    parser_setup.add_argument('--watch', action='store_true',
+                        help="Build, then rebuild whenever Source, Plugins or the .uproject change (and stamp ProjectVersion when the changelog does)")
+    parser_setup.add_argument('--debounce', type=float, default=None, metavar='SECONDS',
+                        help="With --watch, wait until files have been quiet this long before rebuilding (default: 0.3)")
     
+    parser_setup = subparsers.add_parser('ini', help='Patch Unreal Config/*.ini files.')
+    parser_setup.add_argument('--set', nargs=3, action='append', metavar=('FILE', 'SECTION', 'KEY=VALUE'),
+                        help="Set KEY in SECTION of FILE; repeat for more edits. Prefix KEY with + or - for array entries")
+
+    parser_setup = subparsers.add_parser('wheelhouse', help='Manage the local wheelhouse used for offline dependency installs.')
+    parser_setup.add_argument('action', choices=['sync', 'path'], help="'sync' builds wheels for the requirements; 'path' prints the wheelhouse directory")
+    parser_setup.add_argument('--requirements', type=str, default=os.path.join('upm', 'requirements.txt'), metavar='FILE', help="Requirements file to sync (default: upm/requirements.txt)")
+    parser_setup.add_argument('--wheelhouse', type=str, default=None, metavar='DIR', help="Wheelhouse directory (default: $UPM_WHEELHOUSE or the user cache)")
+    parser_setup.add_argument('--force', action='store_true', help='Sync even if the wheelhouse is already up to date')
+
+    parser_setup = subparsers.add_parser('daemon', help='Run the build daemon used by the generated VS Code tasks.')
+    parser_setup.add_argument('--project-dir', type=str, default='.', help="Path to the project directory")
+    parser_setup.add_argument('--machine', action='store_true', help="Run one daemon that queues builds for every project on this machine")
+    parser_setup.add_argument('--group-access', action='store_true', help="Let members of the daemon directory's group submit builds (shared build machines)")
+
     parser_setup = subparsers.add_parser('changelog', help='Changelog commands.')
     parser_setup.add_argument('--add-version', action='store_true', help='Add an incremented version to the changelog')
     parser_setup.add_argument('--add-change', type=str, help='Add a change to the most recent version')
-    parser_setup.add_argument('--update-readme', action='store_true', help='Append changes to README.md')
+    parser_setup.add_argument('--add-changes', type=str, metavar='FILE', help="Add one change per line of FILE ('-' for stdin) to the most recent version")
+    parser_setup.add_argument('--from-git', type=str, metavar='RANGE', help='Add the subject of each non-merge commit in RANGE (e.g. v1.2..HEAD) to the most recent version')
+    parser_setup.add_argument('--update-readme', action='store_true', help='Regenerate the changelog section of README.md')
+    parser_setup.add_argument('--readme-versions', type=int, default=10, metavar='N', help='Versions to render with --update-readme, newest first; 0 for all (default: 10)')
     parser_setup.add_argument('--update-ini', action='store_true', help='Copy the most recent version number Config/DefaultGame.ini')
+    parser_setup.add_argument('--export', action='store_true', help='Write Changelog.json from the changelog journal (CHANGELOG_BACKEND=journal)')
+    parser_setup.add_argument('--profile', type=str, default=None, metavar='PATH', help='Write a Chrome trace-event JSON timing profile to PATH.')
 
     args = parser.parse_args()
+    try:
+        run_command(parser, args)
+    except KeyboardInterrupt:
+        # Tools started from worker threads (stages, matrix jobs) are in their own process groups and
+        # don't see the terminal's Ctrl+C; stop them rather than waiting for them to finish
+        from upm.process import terminate_all
+        terminate_all()
+        raise
 
+def run_command(parser, args):
     if args.command == 'config':
+        if args.root and (args.game_name or args.editor_name or args.workspace) and not args.shared_names:
+            parser.error("with --root each project's names come from its .uproject; add --shared-names to use --game-name, --editor-name or --workspace for every project")
+        if args.root:
+            from upm.monorepo import config_all
+            stages = config_all(args)
+            sys.exit(1 if any(stage['status'] != 'done' for stage in stages) else 0)
         from upm.config import config
         config(args)
     elif args.command == 'setup':
-        from upm.setup import setup
-        setup(args)
+        from upm.timing import profiled
+        with profiled(args.profile, 'upm setup'):
+            if args.root:
+                from upm.monorepo import setup_all
+                stages = setup_all(args)
+            else:
+                from upm.setup import setup
+                stages = setup(args)
+        sys.exit(1 if any(stage['status'] != 'done' for stage in stages) else 0)
 
     elif args.command == 'install-vscode':
         from upm.install_vscode import install_vscode
@@ -117,19 +187,74 @@ def main():
         upmconfig(args)
     
     elif args.command == 'build':
-        from upm.build import build_project
-        build_project(
-            build_type=args.build_type,
-            target_name=args.target_name,
-            project_path=args.project_dir,
-            clean=args.clean,
-            build=args.build,
-            package=args.package
-        )
+        if not args.matrix and not (args.build_type and args.target_name):
+            parser.error("--build-type and --target-name are required unless --matrix is given")
+        if args.watch and (args.matrix or args.clean or args.package):
+            parser.error("--watch rebuilds a single target; it can't be combined with --matrix, --clean or --package")
+
+        from upm.timing import profiled, span
+        with profiled(args.profile, 'upm build'):
+            from upm.api import load_env
+            with span('load config'):
+                load_env()
+
+            if args.matrix:
+                from upm.matrix import build_matrix, parse_matrix
+                results = build_matrix(
+                    project_dir=args.project_dir,
+                    matrix=parse_matrix(args.matrix),
+                    clean=args.clean,
+                    build=args.build,
+                    package=args.package,
+                    jobs=args.jobs,
+                    force=args.force,
+                    full_clean=args.full_clean,
+                    events_path=args.log_events
+                )
+                sys.exit(1 if any(result['status'] == 'failed' for result in results) else 0)
+
+            if args.watch:
+                from upm.watch import watch_project, DEFAULT_DEBOUNCE
+                watch_project(
+                    project_dir=args.project_dir,
+                    target_name=args.target_name,
+                    build_type=args.build_type,
+                    force=args.force,
+                    events_path=args.log_events,
+                    debounce=args.debounce if args.debounce is not None else DEFAULT_DEBOUNCE
+                )
+                return
+
+            from upm.build import build_project
+            build_project(
+                build_type=args.build_type,
+                target_name=args.target_name,
+                project_dir=args.project_dir,
+                clean=args.clean,
+                build=args.build,
+                package=args.package,
+                force=args.force,
+                full_clean=args.full_clean,
+                events_path=args.log_events
+            )
     
+    elif args.command == 'ini':
+        from upm.ini import ini
+        ini(args)
+
+    elif args.command == 'wheelhouse':
+        from upm.wheelhouse import wheelhouse
+        wheelhouse(args)
+
+    elif args.command == 'daemon':
+        from upm.daemon import serve
+        sys.exit(serve(args.project_dir, machine=args.machine, group_access=args.group_access))
+
     elif args.command == 'changelog':
-        from upm.changelog import changelog
-        changelog(args)
+        from upm.timing import profiled
+        with profiled(args.profile, 'upm changelog'):
+            from upm.changelog import changelog
+            changelog(args)
 
     else:
         parser.print_help()
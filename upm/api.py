@@ -0,0 +1,95 @@
+"""
+Importable UPM API.
+
+Importing this module (or any upm module) performs no I/O. The project's .env is read the first
+time a configuration value is needed, so tools that call UPM in-process pay for it at most once.
+"""
+import os
+import argparse
+import threading
+
+DOTENV_PATH = '.env'
+
+loaded_paths = set()
+env_lock = threading.Lock()
+
+def load_env(dotenv_path=DOTENV_PATH, reload=False):
+    """Load dotenv_path into os.environ once per process (existing variables win, as before)."""
+    path = os.path.abspath(dotenv_path)
+    with env_lock:
+        if path in loaded_paths and not reload:
+            return
+        loaded_paths.add(path)
+        if not os.path.exists(path):
+            return
+        from dotenv import load_dotenv
+        load_dotenv(path, override=reload)
+
+def get_env(key, default=None, dotenv_path=DOTENV_PATH):
+    """Return a configuration value, resolving .env on first use."""
+    load_env(dotenv_path)
+    return os.getenv(key, default)
+
+def build(project_dir, target_name, build_type=None, build=False, clean=False, package=False, force=False, full_clean=False, events_path=None):
+    from upm.build import build_project, DEFAULT_BUILD_TYPE
+    return build_project(
+        project_dir,
+        target_name,
+        build_type=build_type or DEFAULT_BUILD_TYPE,
+        build=build,
+        clean=clean,
+        package=package,
+        force=force,
+        full_clean=full_clean,
+        events_path=events_path
+    )
+
+def build_matrix(project_dir, targets=None, configs=None, build=False, clean=False, package=False, jobs=None, force=False, full_clean=False, events_path=None):
+    from upm.matrix import build_matrix, parse_matrix, TARGETS_KEY, CONFIGS_KEY
+    specs = []
+    if targets:
+        specs.append(f"{TARGETS_KEY}={','.join(targets)}")
+    if configs:
+        specs.append(f"{CONFIGS_KEY}={','.join(configs)}")
+    return build_matrix(
+        project_dir,
+        parse_matrix(specs),
+        build=build,
+        clean=clean,
+        package=package,
+        jobs=jobs,
+        force=force,
+        full_clean=full_clean,
+        events_path=events_path
+    )
+
+def setup(clean=False, noprojfiles=False, novenv=False, jobs=None, shared_venv=False, offline=False, wheelhouse=None, force=False, project_dir='.', root=None):
+    args = argparse.Namespace(clean=clean, noprojfiles=noprojfiles, novenv=novenv, jobs=jobs, shared_venv=shared_venv,
+                              offline=offline, wheelhouse=wheelhouse, force=force, root=root)
+    if root:
+        from upm.monorepo import setup_all
+        return setup_all(args)
+    from upm.setup import setup
+    return setup(args, project_dir)
+
+def changelog(add_version=False, add_change=None, add_changes=None, from_git=None, update_readme=False, readme_versions=10, update_ini=False, export=False):
+    from upm.changelog import changelog
+    return changelog(argparse.Namespace(
+        add_version=add_version,
+        add_change=add_change,
+        add_changes=add_changes,
+        from_git=from_git,
+        update_readme=update_readme,
+        readme_versions=readme_versions,
+        update_ini=update_ini,
+        export=export
+    ))
+
+def patch_ini(edits):
+    """Apply [(file, section, key, value)] edits, reading and writing each INI file at most once."""
+    from upm.ini import patch_ini_files
+    return patch_ini_files(edits)
+
+def sync_wheelhouse(requirements_file='upm/requirements.txt', wheelhouse_dir=None, force=False):
+    from upm.wheelhouse import sync_wheelhouse
+    return sync_wheelhouse(requirements_file, wheelhouse_dir, force=force)
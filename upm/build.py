@@ -1,45 +1,182 @@
 import os
+import sys
+import json
 import platform
 import subprocess
-import argparse
-from dotenv import load_dotenv
 
-DOTENV_PATH = '.env'
+if __name__ == "__main__" and __package__ in (None, ''):
+    # Running as a script (e.g. from generated VS Code tasks); make sibling modules importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from upm.fingerprint import (
+    EXCLUDED_DIRS,
+    get_cache_path,
+    iter_files,
+    fingerprint_files,
+    prune_file_cache,
+    load_manifest,
+    update_manifest,
+    get_output_manifest
+)
+from upm.buildlog import EventWriter, run_logged
+from upm.timing import span
+from upm.api import get_env
+
 UNREAL_PATH_KEY = 'UNREAL_PATH'
 PROJECT_NAME_KEY = 'PROJECT_NAME'
 GAME_NAME_KEY = 'GAME_NAME'
 EDITOR_NAME_KEY = 'EDITOR_NAME'
 ARCHIVE_DIRECTORY = 'Packages'
 DEFAULT_BUILD_TYPE = 'Development'
-
-load_dotenv(DOTENV_PATH)
+WAIT_MUTEX_FLAG = '-waitmutex'
+NO_MUTEX_FLAG = '-NoMutex'
+BUILD_CACHE_FILENAME = 'BuildCache.json'
+ENGINE_VERSION_PATH = os.path.join('Engine', 'Build', 'Build.version')
+PLUGIN_EXCLUDED_DIRS = EXCLUDED_DIRS | {'Content', 'Resources'}
+PROJECT_DIR_VARIABLE = '$(ProjectDir)'
 
 system = platform.system()
 
-def build_project(project_dir, target_name, build_type=DEFAULT_BUILD_TYPE, build=False, clean=False, package=False):
-    UNREAL_PATH = os.getenv(UNREAL_PATH_KEY)
-    
+def get_platform_name():
+    if system == 'Windows':
+        return 'Win64'
+    elif system == 'Darwin':
+        return 'Mac'
+    return 'Linux'
+
+def get_project_filepath(project_dir):
+    return os.path.join(project_dir, get_env(PROJECT_NAME_KEY) + '.uproject')
+
+def get_engine_version(unreal_path):
+    try:
+        with open(os.path.join(unreal_path, ENGINE_VERSION_PATH), 'r') as f:
+            return f.read()
+    except OSError:
+        return 'unknown'
+
+def get_build_inputs(project_dir):
+    yield get_project_filepath(project_dir)
+    yield from iter_files(os.path.join(project_dir, 'Source'))
+    yield from iter_files(os.path.join(project_dir, 'Plugins'), excluded_dirs=PLUGIN_EXCLUDED_DIRS)
+
+def get_build_cache_key(target_name, build_type):
+    return f"{target_name}|{build_type}|{get_platform_name()}"
+
+def get_target_receipt_path(project_dir, target_name, build_type):
+    # UBT names the Development receipt after the target alone
+    platform_name = get_platform_name()
+    if build_type.lower() == 'development':
+        filename = f"{target_name}.target"
+    else:
+        filename = f"{target_name}-{platform_name}-{build_type}.target"
+    return os.path.join(project_dir, 'Binaries', platform_name, filename)
+
+def get_build_outputs(project_dir, target_name, build_type):
+    """
+    Return a manifest digest over the target's receipt and the project build products it lists (see
+    upm.fingerprint.get_output_manifest), or None if the target has no receipt.
+    """
+    receipt_path = get_target_receipt_path(project_dir, target_name, build_type)
+    try:
+        with open(receipt_path, 'r') as f:
+            receipt = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+    paths = [receipt_path]
+    for product in receipt.get('BuildProducts', []):
+        path = product.get('Path', '')
+        # Engine products are shared by every project and aren't this build's to check
+        if path.startswith(PROJECT_DIR_VARIABLE):
+            paths.append(os.path.join(project_dir, *path[len(PROJECT_DIR_VARIABLE):].replace('\\', '/').strip('/').split('/')))
+    return get_output_manifest(project_dir, paths)['digest']
+
+def check_build_cache(project_dir, target_name, build_type, file_cache=None):
+    """
+    Fingerprint the build inputs for a target and compare against the last successful build. The
+    target's receipt and build products must also be as that build left them; if they were deleted or
+    rebuilt outside upm, the target isn't up to date.
+
+    Returns (fingerprint, file_cache, up_to_date); pass the first two to record_build_cache after a
+    successful build. A long-lived caller can pass its own file_cache to keep the stat index in memory.
+    """
+    manifest = load_manifest(get_cache_path(project_dir, BUILD_CACHE_FILENAME))
+    if file_cache is None:
+        file_cache = manifest.get('files', {})
+    previous_file_cache = dict(file_cache)
+
+    fingerprint = fingerprint_files(
+        project_dir,
+        get_build_inputs(project_dir),
+        file_cache,
+        extra=(target_name, build_type, get_platform_name(), get_engine_version(get_env(UNREAL_PATH_KEY)))
+    )
+    recorded = manifest.get('builds', {}).get(get_build_cache_key(target_name, build_type))
+    outputs = get_build_outputs(project_dir, target_name, build_type)
+    up_to_date = outputs is not None and recorded == {'inputs': fingerprint, 'outputs': outputs}
+
+    # Persist refreshed stat entries so touched-but-unchanged files aren't re-hashed next time
+    if up_to_date and file_cache != previous_file_cache:
+        update_manifest(
+            get_cache_path(project_dir, BUILD_CACHE_FILENAME),
+            lambda manifest: manifest.setdefault('files', {}).update(file_cache)
+        )
+
+    return fingerprint, file_cache, up_to_date
+
+def record_build_cache(project_dir, target_name, build_type, fingerprint, file_cache):
+    entry = {'inputs': fingerprint, 'outputs': get_build_outputs(project_dir, target_name, build_type)}
+
+    def update(manifest):
+        manifest.setdefault('files', {}).update(file_cache)
+        prune_file_cache(manifest['files'], project_dir)
+        manifest.setdefault('builds', {})[get_build_cache_key(target_name, build_type)] = entry
+
+    update_manifest(get_cache_path(project_dir, BUILD_CACHE_FILENAME), update)
+
+def invalidate_build_cache(project_dir, target_name, build_type):
+    cache_path = get_cache_path(project_dir, BUILD_CACHE_FILENAME)
+    if os.path.exists(cache_path):
+        update_manifest(
+            cache_path,
+            lambda manifest: manifest.get('builds', {}).pop(get_build_cache_key(target_name, build_type), None)
+        )
+
+def get_package_script(unreal_path):
+    if system == 'Windows':
+        return os.path.join(unreal_path, 'Engine', 'Build', 'BatchFiles', 'RunUAT.bat')
+    elif system == 'Darwin':
+        return os.path.join(unreal_path, 'Engine', 'Build', 'BatchFiles', 'Mac', 'Package.sh')
+    return os.path.join(unreal_path, 'Engine', 'Build', 'BatchFiles', 'RunUAT.sh')
+
+def get_build_command(project_dir, target_name, build_type=DEFAULT_BUILD_TYPE, build=False, clean=False, mutex_flag=WAIT_MUTEX_FLAG):
+    UNREAL_PATH = get_env(UNREAL_PATH_KEY)
+
     if UNREAL_PATH is None:
-        raise Exception(f"Environment variable {UNREAL_PATH} not set")
+        raise Exception(f"Environment variable {UNREAL_PATH_KEY} not set")
+
+    project_filepath = get_project_filepath(project_dir)
+    platform_name = get_platform_name()
+    subprocess_list = None
 
-    project_filepath = os.path.join(project_dir, os.getenv(PROJECT_NAME_KEY) + '.uproject')
+    # Extra arguments for the clean script; Linux has no Clean.sh, so UBT cleans via Build.sh -clean
+    clean_args = []
 
     if system == 'Windows':
         batch_files_path = os.path.join('Engine', 'Build', 'BatchFiles')
         clean_script = os.path.join(UNREAL_PATH, batch_files_path, 'Clean.bat')
         build_script = os.path.join(UNREAL_PATH, batch_files_path, 'Build.bat')
-        package_script = os.path.join(UNREAL_PATH, batch_files_path, 'RunUAT.bat')
-        platform_name = 'Win64'
-    
+
     elif system == 'Darwin':  # macOS
         batch_files_path = os.path.join('Engine', 'Build', 'BatchFiles', 'Mac')
         clean_script = os.path.join(UNREAL_PATH, batch_files_path, 'Clean.sh')
         build_script = os.path.join(UNREAL_PATH, batch_files_path, 'Build.sh')
-        package_script = os.path.join(UNREAL_PATH, batch_files_path, 'Package.sh')
-        platform_name = 'Mac'
-    
+
     else:   # Linux
-        print("TODO: Linux")
+        batch_files_path = os.path.join('Engine', 'Build', 'BatchFiles', 'Linux')
+        clean_script = os.path.join(UNREAL_PATH, batch_files_path, 'Build.sh')
+        build_script = os.path.join(UNREAL_PATH, batch_files_path, 'Build.sh')
+        clean_args = ['-clean']
 
     if clean:
         print(f"Cleaning {build_type} target with Unreal Engine at {UNREAL_PATH}")
@@ -49,7 +186,8 @@ def build_project(project_dir, target_name, build_type=DEFAULT_BUILD_TYPE, build
             platform_name,
             build_type,
             project_filepath,
-            '-waitmutex'
+            *clean_args,
+            mutex_flag
         ]
 
     if build:
@@ -60,65 +198,62 @@ def build_project(project_dir, target_name, build_type=DEFAULT_BUILD_TYPE, build
             platform_name,
             build_type,
             project_filepath,
-            '-waitmutex'
+            mutex_flag
         ]
-    
+
+    if subprocess_list is None:
+        raise Exception("No build action specified; use clean or build (packaging runs through upm.package)")
+
+    return subprocess_list
+
+def build_project(project_dir, target_name, build_type=DEFAULT_BUILD_TYPE, build=False, clean=False, package=False, force=False, full_clean=False, events_path=None, file_cache=None):
     if package:
-        if target_name == os.getenv(EDITOR_NAME_KEY):
-            raise Exception("Cannot package editor target")
-        
-        print(f"Packaging {build_type} target with Unreal Engine at {UNREAL_PATH}")
-        subprocess_list = [
-            package_script,
-            'BuildCookRun',
-            '-noP4',
-            '-utf8output',
-            '-cook',
-            '-project={}'.format(project_filepath),
-            '-target={}'.format(target_name),
-            '-platform={}'.format(platform_name),
-            '-stage',
-            '-archive',
-            '-package',
-            '-build',
-            '-clean',
-            '-pak',
-            '-iostore',
-            '-prereqs',
-            '-archivedirectory={}'.format(os.path.join(project_dir, ARCHIVE_DIRECTORY, platform.system())),
-            '-manifests',
-            '-nocompileuat',
-            '-waitmutex'
-        ]
+        from upm.package import package_project
+        events = EventWriter(events_path) if events_path else None
+        try:
+            # Packaging used to always clean; now only --full-clean (or --clean with --package) does
+            package_project(project_dir, target_name, build_type, force=force, full_clean=full_clean or clean, events=events)
+        finally:
+            if events:
+                events.close()
+        return
+
+    cacheable = build
+
+    if cacheable:
+        with span('check build cache'):
+            fingerprint, file_cache, up_to_date = check_build_cache(project_dir, target_name, build_type, file_cache)
+        if up_to_date and not force:
+            print(f"{target_name} {build_type} is up to date; skipping build (use --force to build anyway)")
+            return
 
-    subprocess.check_call(subprocess_list)
+    subprocess_list = get_build_command(
+        project_dir,
+        target_name,
+        build_type=build_type,
+        build=build,
+        clean=clean
+    )
+
+    if clean and not cacheable:
+        invalidate_build_cache(project_dir, target_name, build_type)
+
+    events = EventWriter(events_path) if events_path else None
+    try:
+        returncode, parser = run_logged(subprocess_list, events=events)
+    finally:
+        if events:
+            events.close()
+
+    print(parser.format_summary())
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, subprocess_list)
+
+    if cacheable:
+        record_build_cache(project_dir, target_name, build_type, fingerprint, file_cache)
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description=f"Build commands for {os.getenv(PROJECT_NAME_KEY)} project")
-
-    parser.add_argument('--project-dir', type=str, required=True,
-                        help=f"Path to the {os.getenv(PROJECT_NAME_KEY)} project directory")
-    parser.add_argument('--build-type', type=str, required=True,
-                        help="Type of build (debug, development, testomg. release)")
-    parser.add_argument('--target-name', type=str, required=True,
-                        help=f"Name of build target, e.g. {os.getenv(PROJECT_NAME_KEY)}Editor")
-    parser.add_argument('--clean', action='store_true',
-                        help="Clean selected targets")
-    parser.add_argument('--build', action='store_true',
-                        help="Build selected targets")
-    parser.add_argument('--package', action='store_true',
-                        help="Package selected target for deployment")
-    
-    args = parser.parse_args()
-
-    build_project(
-        build_type=args.build_type,
-        target_name=args.target_name,
-        project_dir=args.project_dir,
-        build=args.build,
-        clean=args.clean,
-        package=args.package
-        )
-    
-    
-    
\ No newline at end of file
+    # Same command as `upm build`; its parser and dispatch (Ctrl+C handling included) live in upm.__main__
+    from upm.__main__ import main
+    sys.argv[1:1] = ['build']
+    main()
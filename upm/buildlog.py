@@ -0,0 +1,162 @@
+import os
+import re
+import sys
+import json
+import time
+import threading
+import subprocess
+
+from upm.timing import span, begin_span, end_span
+from upm.process import run
+
+MAX_KEPT_DIAGNOSTICS = 20
+
+# MSVC "error C2065:", clang/gcc "file:1:2: error:", UAT "ERROR:", UE log categories "LogCook: Error:"
+ERROR_RE = re.compile(r'(?:\berror [A-Z]{1,3}\d+\s*:|:\s*(?:fatal )?error\s*:|^\s*ERROR:|\bLog\w+:\s+Error:)')
+WARNING_RE = re.compile(r'(?:\bwarning [A-Z]{1,3}\d+\s*:|:\s*warning\s*:|^\s*WARNING:|\bLog\w+:\s+Warning:)')
+PROGRESS_RE = re.compile(r'^\s*\[(\d+)/(\d+)\]\s*(.*)')
+# BuildCookRun prints "********** COOK COMMAND STARTED **********" / "... COMPLETED ..." around each stage
+PHASE_RE = re.compile(r'\*{3,}\s+([A-Z]+)\s+COMMAND\s+(STARTED|COMPLETED)\s+\*{3,}')
+
+class BuildLogParser:
+    """
+    Incrementally classify UBT/UAT output lines.
+
+    Memory use is bounded: only counters, the current phase and the first few diagnostics are kept.
+    """
+
+    def __init__(self, label=None):
+        self.label = label
+        self.lines = 0
+        self.errors = 0
+        self.warnings = 0
+        self.progress = None
+        self.phase = None
+        self.phases = []
+        self.first_errors = []
+        self.first_warnings = []
+        self.start_time = time.time()
+
+    def feed(self, line):
+        """Classify one line of output; returns an event dict or None for plain lines."""
+        self.lines += 1
+        text = line.rstrip('\r\n')
+
+        match = PHASE_RE.search(text)
+        if match:
+            name, status = match.group(1).lower(), match.group(2).lower()
+            if status == 'started':
+                self.phase = name
+                self.phases.append(name)
+            elif self.phase == name:
+                self.phase = None
+            return self.event('phase', text, phase=name, status=status)
+
+        match = PROGRESS_RE.match(text)
+        if match:
+            self.progress = (int(match.group(1)), int(match.group(2)))
+            return self.event('progress', match.group(3), current=self.progress[0], total=self.progress[1])
+
+        if ERROR_RE.search(text):
+            self.errors += 1
+            if len(self.first_errors) < MAX_KEPT_DIAGNOSTICS:
+                self.first_errors.append(text)
+            return self.event('error', text)
+
+        if WARNING_RE.search(text):
+            self.warnings += 1
+            if len(self.first_warnings) < MAX_KEPT_DIAGNOSTICS:
+                self.first_warnings.append(text)
+            return self.event('warning', text)
+
+        return None
+
+    def event(self, event_type, text, **fields):
+        event = {
+            'type': event_type,
+            'time': round(time.time() - self.start_time, 3),
+            'line': self.lines,
+            'text': text
+        }
+        if self.label:
+            event['job'] = self.label
+        event.update(fields)
+        return event
+
+    def summary(self):
+        return {
+            'lines': self.lines,
+            'errors': self.errors,
+            'warnings': self.warnings,
+            'progress': list(self.progress) if self.progress else None,
+            'phases': self.phases,
+            'first_errors': self.first_errors,
+            'duration': round(time.time() - self.start_time, 3)
+        }
+
+    def format_summary(self):
+        summary = f"{self.lines} lines, {self.errors} errors, {self.warnings} warnings"
+        if self.progress:
+            summary += f", {self.progress[0]}/{self.progress[1]} actions"
+        if self.phases:
+            summary += f", phases: {' -> '.join(self.phases)}"
+        result = [f"Build log summary: {summary}"]
+        for error in self.first_errors:
+            result.append(f"  {error.strip()}")
+        if self.errors > len(self.first_errors):
+            result.append(f"  ... and {self.errors - len(self.first_errors)} more errors")
+        return '\n'.join(result)
+
+class EventWriter:
+    """Append parser events to an NDJSON file; safe to share between threads."""
+
+    def __init__(self, path):
+        self.file = open(path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def write(self, event):
+        with self.lock:
+            self.file.write(json.dumps(event) + '\n')
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def write_line(line):
+    sys.stdout.write(line)
+    # stdout is block-buffered when it's a pipe (CI); flush so output streams as it happens
+    sys.stdout.flush()
+
+def run_logged(subprocess_list, label=None, events=None, output=write_line):
+    """
+    Run a UBT/UAT command, echoing its output through output(line) while parsing it.
+
+    Returns (returncode, parser). If events is an EventWriter, classified lines and a final summary
+    are written to it as they happen.
+    """
+    parser = BuildLogParser(label)
+
+    def handle_line(line):
+        output(line)
+        event = parser.feed(line)
+        if event is None:
+            return
+        if event['type'] == 'phase':
+            if event['status'] == 'started':
+                begin_span((label, event['phase']), f"UAT {event['phase']}", category='uat')
+            else:
+                end_span((label, event['phase']))
+        if events:
+            events.write(event)
+
+    with span(label or os.path.basename(subprocess_list[0]), category='process', command=subprocess_list):
+        try:
+            returncode = run(subprocess_list, on_output=handle_line, stderr=subprocess.STDOUT, check=False)['returncode']
+        finally:
+            for phase in parser.phases:
+                end_span((label, phase))
+
+    if events:
+        events.write(parser.event('summary', parser.format_summary().splitlines()[0], returncode=returncode, **parser.summary()))
+
+    return returncode, parser
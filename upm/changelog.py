@@ -1,159 +1,311 @@
 import json
 import argparse
 from datetime import datetime
-import subprocess
-import configparser
 import os
-import configparser
 import shlex
+import sys
 
-import configparser
+if __name__ == '__main__' and __package__ in (None, ''):
+    # Running as a script (e.g. from generated VS Code tasks); make sibling modules importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-class CustomConfigParser(configparser.ConfigParser):
-    def optionxform(self, optionstr):
-        return optionstr  # Retain the original case
-
-    def write(self, fp, spaces=False):
-        """Write an .ini-format representation of the configuration state."""
-        if spaces:
-            delimiter = " = "
-        else:
-            delimiter = "="
-        for section in self._sections:
-            fp.write(f"[{section}]\n")
-            for key, value in self._sections[section].items():
-                if key != "__name__":
-                    fp.write(f"{key}{delimiter}{value}\n")
-            fp.write("\n")
+from upm.timing import span, profiled
+from upm.api import get_env
+from upm.fingerprint import get_cache_path, write_atomic
+from upm.journal import ChangelogJournal
+from upm.gitmeta import get_head_commit
+from upm.ini import patch_ini
+from upm.process import output_of
 
 PROJECT_DIR = './'
-CHANGELOG_FILE = os.path.join(PROJECT_DIR, 'Changelog.json')
+CHANGELOG_FILENAME = 'Changelog.json'
+CHANGELOG_FILE = os.path.join(PROJECT_DIR, CHANGELOG_FILENAME)
 README_FILE = os.path.join(PROJECT_DIR, 'README.md')
-INI_FILE_PATH = os.path.join(PROJECT_DIR, 'Config', 'DefaultGame.ini')
+INI_FILE_RELPATH = os.path.join('Config', 'DefaultGame.ini')
+INI_FILE_PATH = os.path.join(PROJECT_DIR, INI_FILE_RELPATH)
+PROJECT_SETTINGS_SECTION = '/Script/EngineSettings.GeneralProjectSettings'
 PRERELEASE_TYPE_KEY = 'PRERELEASE_TYPE'
+README_START_MARKER = '<!-- upm:changelog:start -->'
+README_END_MARKER = '<!-- upm:changelog:end -->'
+DEFAULT_README_VERSIONS = 10
+CHANGELOG_BACKEND_KEY = 'CHANGELOG_BACKEND'
+JSON_BACKEND = 'json'
+JOURNAL_BACKEND = 'journal'
+CHANGELOG_JOURNAL_FILENAME = 'Changelog.jsonl'
+CHANGELOG_INDEX_FILENAME = 'Changelog.idx'
+CHANGELOG_JOURNAL_FILE = os.path.join(PROJECT_DIR, CHANGELOG_JOURNAL_FILENAME)
+CHANGELOG_INDEX_FILE = get_cache_path(PROJECT_DIR, CHANGELOG_INDEX_FILENAME)
 
-def load_changelog():
-    if os.path.exists(CHANGELOG_FILE):
-        with open(CHANGELOG_FILE, 'r') as file:
-            return json.load(file)
-    else:
-        return None
+def load_changelog(project_dir=PROJECT_DIR):
+    path = os.path.join(project_dir, CHANGELOG_FILENAME)
+    with span('load changelog'):
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                return json.load(file)
+        else:
+            return None
 
-def save_changelog(changelog):
+def save_changelog(changelog, commit=None):
     changelog[-1]['ReleaseDate'] = datetime.now().strftime('%Y-%m-%d')
 
-    commit = get_commit_hash()
     if commit:
-        changelog[-1]['Commit'] = get_commit_hash()
-
-    with open(CHANGELOG_FILE, 'w') as file:
-        json.dump(changelog, file, indent=4)
-
-def update_readme(changelog):
-    with open(README_FILE, 'a') as file:
-        entry = changelog[-1]
-        version = entry.get('Version', 'Unknown')
-        prerelease = entry.get('PrereleaseType', 'Release')
-        prerelease = ""
-        if 'PrereleaseType' in entry:
-            prerelease = f" - {entry['PrereleaseType']}"
-        release_date = entry.get('ReleaseDate', 'Unknown')
-        commit = entry.get('Commit', 'Unknown')
-        file.write(f"\n\n### Version {version} {prerelease}\n\n")
-        file.write(f"**Release Date**: {release_date}\n\n")
-        file.write(f"**Commit**: {commit}\n\n")
-        file.write("**Changes**\n\n")
-        for change in entry['Changes']:
-            file.write(f"- {change}\n")
+        changelog[-1]['Commit'] = commit
 
-def get_commit_hash():
-    try:
-        output = subprocess.check_output(['git', 'rev-parse', 'HEAD']).strip().decode()
-        return output
-    except (subprocess.CalledProcessError, FileNotFoundError):
+    with span('write changelog'):
+        with open(CHANGELOG_FILE, 'w') as file:
+            json.dump(changelog, file, indent=4)
+
+def get_journal(project_dir=PROJECT_DIR):
+    """Return the changelog journal if CHANGELOG_BACKEND is 'journal', importing Changelog.json on first use."""
+    backend = (get_env(CHANGELOG_BACKEND_KEY) or JSON_BACKEND).lower()
+    if backend == JSON_BACKEND:
         return None
+    if backend != JOURNAL_BACKEND:
+        raise Exception(f"Unknown {CHANGELOG_BACKEND_KEY} '{backend}'; expected '{JSON_BACKEND}' or '{JOURNAL_BACKEND}'")
+
+    journal = ChangelogJournal(
+        os.path.join(project_dir, CHANGELOG_JOURNAL_FILENAME),
+        get_cache_path(project_dir, CHANGELOG_INDEX_FILENAME)
+    )
+    if not journal.exists():
+        changelog = load_changelog(project_dir)
+        if changelog:
+            with span('import changelog'):
+                journal.import_changelog(changelog)
+            print(f"Imported {len(changelog)} versions from {os.path.join(project_dir, CHANGELOG_FILENAME)} into {journal.path}")
+    return journal
+
+def load_versions(count, project_dir=PROJECT_DIR):
+    """Return the last count versions (all if count is 0), oldest first."""
+    journal = get_journal(project_dir)
+    if journal:
+        with span('load changelog'):
+            return journal.tail(count)
+    changelog = load_changelog(project_dir) or []
+    return changelog[-count:] if count else changelog
+
+def load_latest_version(project_dir=PROJECT_DIR):
+    versions = load_versions(1, project_dir)
+    return versions[-1] if versions else None
+
+def export_changelog():
+    journal = get_journal()
+    if not journal:
+        print(f"{CHANGELOG_BACKEND_KEY} is '{JSON_BACKEND}'; {CHANGELOG_FILE} is already up to date")
+        return
+
+    with span('export changelog'):
+        changelog = journal.entries()
+        write_atomic(CHANGELOG_FILE, json.dumps(changelog, indent=4))
+    print(f"Exported {len(changelog)} versions to {CHANGELOG_FILE}")
+
+def render_version(entry):
+    version = entry.get('Version', 'Unknown')
+    prerelease = ""
+    if entry.get('PrereleaseType'):
+        prerelease = f" - {entry['PrereleaseType']}"
+    release_date = entry.get('ReleaseDate', 'Unknown')
+    commit = entry.get('Commit', 'Unknown')
+    yield f"\n### Version {version}{prerelease}\n\n"
+    yield f"**Release Date**: {release_date}\n\n"
+    yield f"**Commit**: {commit}\n\n"
+    yield "**Changes**\n\n"
+    for change in entry['Changes']:
+        yield f"- {change}\n"
+
+def render_readme_section(entries):
+    """Render entries newest first between the README changelog markers."""
+    parts = [f"{README_START_MARKER}\n"]
+    for entry in reversed(entries):
+        parts.extend(render_version(entry))
+    parts.append(f"\n{README_END_MARKER}\n")
+    return ''.join(parts)
+
+def update_readme(entries):
+    """Regenerate the changelog section of README.md, writing only if it changed."""
+    section = render_readme_section(entries)
+
+    try:
+        with open(README_FILE, 'r') as file:
+            content = file.read()
+    except FileNotFoundError:
+        content = ''
+
+    start = content.find(README_START_MARKER)
+    end = content.find(README_END_MARKER, start) if start != -1 else -1
+    if end != -1:
+        end += len(README_END_MARKER)
+        if content.startswith('\n', end):
+            end += 1
+        if content[start:end] == section:
+            print(f"{README_FILE} changelog is up to date")
+            return
+        updated = content[:start] + section + content[end:]
+    else:
+        # First run: add the managed section at the end, leaving anything written before alone
+        if content and not content.endswith('\n'):
+            content += '\n'
+        updated = content + ('\n' if content else '') + section
+
+    with span('write readme'):
+        write_atomic(README_FILE, updated)
+    print(f"Updated changelog in {README_FILE} ({len(entries)} versions)")
+
+def get_commit_hash():
+    return get_head_commit(PROJECT_DIR)
 
 def increment_version(version):
     major, minor, patch = map(int, version.split('.'))
     patch += 1
     return f"{major}.{minor}.{patch}"
 
-def add_version():
-    changelog = load_changelog()
+def add_version(commit=None):
+    journal = get_journal()
+    if journal:
+        latest = journal.latest()
+    else:
+        changelog = load_changelog() or []
+        latest = changelog[-1] if changelog else None
 
-    if not changelog:
+    if not latest:
         new_version = "0.0.1"
-        changelog = []
     else:
-        new_version = increment_version(changelog[-1]['Version'])
+        new_version = increment_version(latest['Version'])
 
     new_entry = {
         "Version": new_version,
-        "PrereleaseType": os.environ.get(PRERELEASE_TYPE_KEY),
+        "PrereleaseType": get_env(PRERELEASE_TYPE_KEY),
         "ReleaseDate": datetime.now().strftime('%Y-%m-%d'),
         "Changes": []
     }
 
-    commit = get_commit_hash()
     if commit:
         new_entry['Commit'] = commit
 
+    if journal:
+        with span('write changelog'):
+            journal.add_version(new_entry)
+        return
+
     changelog.append(new_entry)
-    save_changelog(changelog)
+    save_changelog(changelog, commit)
 
 def escape_input(user_input):
     return shlex.quote(user_input)
 
-def add_change(change):
+def add_change(change, commit=None):
+    journal = get_journal()
+    if journal:
+        if not journal.exists():
+            raise Exception(f"No versions in {CHANGELOG_JOURNAL_FILE}; add a version first")
+        # Only the new record is written, so adding a change costs the same regardless of history
+        with span('write changelog'):
+            journal.add_change(change, datetime.now().strftime('%Y-%m-%d'), commit)
+        return
+
     changelog = load_changelog()
     changelog[-1]['Changes'].append(change)
-    save_changelog(changelog)
+    save_changelog(changelog, commit)
 
-def update_ini():
-    changelog = load_changelog()
-    config = CustomConfigParser(strict=False)
-    config.read(INI_FILE_PATH)
+def read_changes(source):
+    """Read one change per line from a file, or from stdin if source is '-'."""
+    if source == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, 'r', encoding='utf-8') as file:
+            lines = file.read().splitlines()
+    return [line.strip() for line in lines if line.strip()]
+
+def get_git_changes(revision_range):
+    """Return the subjects of non-merge commits in revision_range, oldest first."""
+    with span(f'git log {revision_range}', category='process'):
+        output = output_of(['git', 'log', '--no-merges', '--reverse', '--format=%s', revision_range])
+    return [line.strip() for line in output.splitlines() if line.strip()]
 
-    section = '/Script/EngineSettings.GeneralProjectSettings'
-    if section in config:
-        config[section]['ProjectVersion'] = changelog[-1]['Version']
+def add_changes(changes, commit=None):
+    """
+    Add many changes to the most recent version in one load/save.
+
+    Changes already in the version (or repeated within the batch) are skipped.
+    """
+    journal = get_journal()
+    if journal:
+        latest = journal.latest()
     else:
-        raise Exception(f"Section {section} not found in {INI_FILE_PATH}")
-
-    # Read the original file content
-    with open(INI_FILE_PATH, 'r') as file:
-        original_content = file.readlines()
-
-    # Write the updated content back to the file
-    with open(INI_FILE_PATH, 'w') as file:
-        section_found = False
-        for line in original_content:
-            if line.strip().startswith(f"[{section}]"):
-                section_found = True
-            if section_found and line.strip().startswith("ProjectVersion"):
-                file.write(f"ProjectVersion={changelog[-1]['Version']}\n")
-                section_found = False  # Only update the first occurrence
-            else:
-                file.write(line)
+        changelog = load_changelog()
+        latest = changelog[-1] if changelog else None
+    if not latest:
+        raise Exception("No versions in the changelog; add a version first")
+
+    seen = set(latest['Changes'])
+    new_changes = []
+    for change in changes:
+        if change not in seen:
+            seen.add(change)
+            new_changes.append(change)
+
+    skipped = len(changes) - len(new_changes)
+    print(f"Adding {len(new_changes)} changes to version {latest['Version']}" + (f" (skipped {skipped} duplicates)" if skipped else ""))
+    if not new_changes:
+        return
+
+    if journal:
+        with span('write changelog'):
+            journal.add_changes(new_changes, datetime.now().strftime('%Y-%m-%d'), commit)
+        return
+
+    latest['Changes'].extend(new_changes)
+    save_changelog(changelog, commit)
+
+def update_ini(project_dir=PROJECT_DIR):
+    latest = load_latest_version(project_dir)
+    ini_path = os.path.join(project_dir, INI_FILE_RELPATH)
+    if patch_ini(ini_path, [(PROJECT_SETTINGS_SECTION, 'ProjectVersion', latest['Version'])]):
+        print(f"Updated ProjectVersion in {ini_path} to {latest['Version']}")
 
 def changelog(args):
+    # Resolved once per call, so every entry written by this call is stamped with the same commit
+    commit = None
+    if args.add_version or args.add_change or args.add_changes or args.from_git:
+        commit = get_commit_hash()
+
     if args.add_version:
-        add_version()
+        with span('add_version'):
+            add_version(commit)
     if args.add_change:
-        add_change(args.add_change)
+        with span('add_change'):
+            add_change(args.add_change, commit)
+    if args.add_changes or args.from_git:
+        with span('add_changes'):
+            changes = []
+            if args.add_changes:
+                changes.extend(read_changes(args.add_changes))
+            if args.from_git:
+                changes.extend(get_git_changes(args.from_git))
+            add_changes(changes, commit)
     if args.update_readme:
-        changelog = load_changelog()
-        update_readme(changelog)
+        with span('update_readme'):
+            update_readme(load_versions(args.readme_versions))
     if args.update_ini:
-        update_ini()
+        with span('update_ini'):
+            update_ini()
+    if args.export:
+        with span('export'):
+            export_changelog()
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Manage changelog')
     parser.add_argument('--add-version', action='store_true', help='Add an incremented version to the changelog')
     parser.add_argument('--add-change', type=str, help='Add a change to the most recent version')
-    parser.add_argument('--update-readme', action='store_true', help='Append changes to README.md')
+    parser.add_argument('--add-changes', type=str, metavar='FILE', help="Add one change per line of FILE ('-' for stdin) to the most recent version")
+    parser.add_argument('--from-git', type=str, metavar='RANGE', help='Add the subject of each non-merge commit in RANGE (e.g. v1.2..HEAD) to the most recent version')
+    parser.add_argument('--update-readme', action='store_true', help='Regenerate the changelog section of README.md')
+    parser.add_argument('--readme-versions', type=int, default=DEFAULT_README_VERSIONS, metavar='N', help=f'Versions to render with --update-readme, newest first; 0 for all (default: {DEFAULT_README_VERSIONS})')
     parser.add_argument('--update-ini', action='store_true', help='Copy the most recent version number Config/DefaultGame.ini')
+    parser.add_argument('--export', action='store_true', help='Write Changelog.json from the changelog journal (CHANGELOG_BACKEND=journal)')
+    parser.add_argument('--profile', type=str, default=None, metavar='PATH', help='Write a Chrome trace-event JSON timing profile to PATH.')
 
     args = parser.parse_args()
 
-    changelog(args)
\ No newline at end of file
+    with profiled(args.profile, 'upm changelog'):
+        changelog(args)
\ No newline at end of file
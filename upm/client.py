@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+
+if __name__ == "__main__" and __package__ in (None, ''):
+    # Running as a script (e.g. from generated VS Code tasks); make sibling modules importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Kept free of upm imports so a task-triggered build only pays for socket + json.
+ADDRESS_FILENAME = 'upmd.json'
+DAEMON_LOG_FILENAME = 'upmd.log'
+PROJECT_DAEMON_DIR = os.path.join('Intermediate', 'UPM')
+MACHINE_DAEMON_DIR = 'daemon'
+DAEMON_DIR_ENV = 'UPM_DAEMON_DIR'
+MACHINE_DAEMON_ENV = 'UPM_MACHINE_DAEMON'
+DAEMON_START_TIMEOUT = 10.0
+UPM_PARENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Lower runs first; jobs of the same priority run in the order they were submitted
+PRIORITIES = {'interactive': 0, 'normal': 1, 'batch': 2}
+DEFAULT_PRIORITY = 'normal'
+
+def get_daemon_dir(project_dir=None):
+    """Return the directory holding a project's daemon address, or the machine-wide daemon's if project_dir is None."""
+    if project_dir is not None:
+        return os.path.join(project_dir, PROJECT_DAEMON_DIR)
+    if os.getenv(DAEMON_DIR_ENV):
+        return os.getenv(DAEMON_DIR_ENV)
+    from upm.download import get_cache_dir
+    return os.path.join(get_cache_dir(), MACHINE_DAEMON_DIR)
+
+def get_address_path(daemon_dir):
+    return os.path.join(daemon_dir, ADDRESS_FILENAME)
+
+def read_address(daemon_dir):
+    try:
+        with open(get_address_path(daemon_dir), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def connect(daemon_dir):
+    """Return (socket, address) for the daemon in daemon_dir, or raise ConnectionError."""
+    address = read_address(daemon_dir)
+    if address is None:
+        raise ConnectionError(f"No upm daemon address found at {get_address_path(daemon_dir)}")
+
+    try:
+        if address['family'] == 'unix':
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(address['address'])
+        else:
+            sock = socket.create_connection(('127.0.0.1', address['port']))
+    except OSError as e:
+        raise ConnectionError(f"upm daemon is not responding: {e}")
+    return sock, address
+
+def request(daemon_dir, message, on_message=None):
+    """
+    Send one request to the daemon and return its final 'result' message.
+
+    Every intermediate message (log lines, queue notifications) is passed to on_message.
+    """
+    sock, address = connect(daemon_dir)
+    with sock, sock.makefile('rwb') as stream:
+        stream.write((json.dumps(dict(message, token=address['token'])) + '\n').encode())
+        stream.flush()
+        for line in stream:
+            try:
+                response = json.loads(line)
+            except ValueError:
+                # A partial line from a daemon that died mid-write
+                raise ConnectionError("upm daemon sent an incomplete message")
+            if response['type'] == 'result':
+                return response
+            if on_message:
+                on_message(response)
+    raise ConnectionError("upm daemon closed the connection before sending a result")
+
+def ping(daemon_dir):
+    try:
+        return request(daemon_dir, {'command': 'ping'})
+    except ConnectionError:
+        return None
+
+def start_daemon(project_dir=None):
+    """Start a detached daemon for project_dir (or the machine-wide one if None) and wait until it answers."""
+    import subprocess
+
+    daemon_dir = get_daemon_dir(project_dir)
+    log_path = os.path.join(daemon_dir, DAEMON_LOG_FILENAME)
+    os.makedirs(daemon_dir, exist_ok=True)
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [UPM_PARENT_DIR, env.get('PYTHONPATH')]))
+
+    kwargs = {}
+    if sys.platform == 'win32':
+        kwargs['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs['start_new_session'] = True
+
+    command = [sys.executable, '-m', 'upm', 'daemon']
+    command.extend(['--project-dir', project_dir] if project_dir is not None else ['--machine'])
+    with open(log_path, 'a') as log:
+        subprocess.Popen(
+            command,
+            cwd=project_dir or daemon_dir,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            **kwargs
+        )
+
+    deadline = time.monotonic() + DAEMON_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if ping(daemon_dir):
+            return True
+        time.sleep(0.05)
+    return False
+
+def print_message(message):
+    if message['type'] == 'log':
+        sys.stdout.write(message['line'])
+        sys.stdout.flush()
+    elif message['type'] == 'queued':
+        if message['position'] == 0:
+            print("Joined an identical build already running", flush=True)
+        else:
+            note = " (joined an identical request)" if message.get('coalesced') else ""
+            print(f"Queued at position {message['position']} of {message['depth']} ({message['priority']} priority){note}", flush=True)
+    elif message['type'] == 'started':
+        print(f"Started after waiting {message['waited']:.1f}s", flush=True)
+
+def get_client_daemon_dir(args):
+    return get_daemon_dir(None if args.machine else os.path.abspath(args.project_dir))
+
+def build_locally(args):
+    import subprocess
+    from upm.build import build_project
+    try:
+        build_project(
+            project_dir=args.project_dir,
+            target_name=args.target_name,
+            build_type=args.build_type,
+            build=args.build,
+            clean=args.clean,
+            package=args.package,
+            force=args.force,
+            full_clean=args.full_clean
+        )
+    except subprocess.CalledProcessError as e:
+        return e.returncode
+    return 0
+
+def build(args):
+    message = {
+        'command': 'build',
+        'project_dir': os.path.abspath(args.project_dir),
+        'target_name': args.target_name,
+        'build_type': args.build_type,
+        'build': args.build,
+        'clean': args.clean,
+        'package': args.package,
+        'force': args.force,
+        'full_clean': args.full_clean,
+        'priority': args.priority
+    }
+
+    daemon_dir = get_client_daemon_dir(args)
+    try:
+        result = request(daemon_dir, message, print_message)
+    except ConnectionError:
+        if not args.start_daemon or not start_daemon(None if args.machine else os.path.abspath(args.project_dir)):
+            print("upm daemon not running; building in this process")
+            return build_locally(args)
+        try:
+            result = request(daemon_dir, message, print_message)
+        except ConnectionError:
+            print("upm daemon stopped responding; building in this process")
+            return build_locally(args)
+
+    if result.get('error'):
+        print(result['error'])
+    return result['returncode']
+
+def main():
+    parser = argparse.ArgumentParser(description="Thin client for the upm daemon.", prog="upm-client")
+    subparsers = parser.add_subparsers(dest='command')
+
+    parser_build = subparsers.add_parser('build', help='Build through the daemon (falls back to building in-process).')
+    parser_build.add_argument('--project-dir', type=str, required=True, help="Path to the project directory")
+    parser_build.add_argument('--build-type', type=str, required=True, help="Type of build (debug, development, testomg. release)")
+    parser_build.add_argument('--target-name', type=str, required=True, help="Name of target to build")
+    parser_build.add_argument('--clean', action='store_true', help="Clean selected targets")
+    parser_build.add_argument('--build', action='store_true', help="Build selected targets")
+    parser_build.add_argument('--package', action='store_true', help="Package selected target for deployment")
+    parser_build.add_argument('--force', action='store_true', help="Build even if the build cache says the target is up to date")
+    parser_build.add_argument('--full-clean', action='store_true', help="With --package, clean the build and cook and run every packaging phase")
+    parser_build.add_argument('--start-daemon', action='store_true', help="Start the daemon if it is not running")
+    parser_build.add_argument('--priority', choices=list(PRIORITIES), default=DEFAULT_PRIORITY, help="Queue priority; interactive builds run before normal and batch ones")
+
+    for command, help_text in (('status', 'Show the daemon queue and wait time statistics.'), ('stop', 'Stop the daemon.')):
+        subparser = subparsers.add_parser(command, help=help_text)
+        subparser.add_argument('--project-dir', type=str, default='.', help="Path to the project directory")
+
+    for subparser in (parser_build, subparsers.choices['status'], subparsers.choices['stop']):
+        subparser.add_argument('--machine', action='store_true', default=os.getenv(MACHINE_DAEMON_ENV, '') not in ('', '0'),
+                               help=f"Use the machine-wide daemon instead of the project's (default if {MACHINE_DAEMON_ENV} is set)")
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        sys.exit(build(args))
+    elif args.command in ('status', 'stop'):
+        try:
+            result = request(get_client_daemon_dir(args), {'command': args.command})
+        except ConnectionError as e:
+            print(e)
+            sys.exit(1)
+        print(json.dumps(result, indent=4))
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,9 @@ import json
 import platform
 from datetime import datetime
 
+from upm.fingerprint import get_cache_path
+from upm.sync import sync_tree, COPY_MODE
+
 UNREAL_PATH_KEY = "UNREAL_PATH"
 PROJECT_NAME_KEY = "PROJECT_NAME"
 WORKSPACE_NAME_KEY = "WORKSPACE_NAME"
@@ -16,6 +19,7 @@ CONFIG_FILENAME = "config.upm"
 GITIGNORE_SRCFILE = "gitignore.upm"
 GITIGNORE_DSTFILE = ".gitignore"
 UPM_DIR = os.path.normpath(os.path.abspath(os.path.dirname(__file__)))
+SYNC_MANIFEST_FILENAME = 'ConfigSync.json'
 
 def clean(args):
     upm_dir_path = os.path.join(args.dir, "upm")
@@ -66,12 +70,19 @@ def config(args):
         clean(args)
         return
 
-    shutil.copytree(
-        UPM_DIR,
-        os.path.join(args.dir, "upm"),
-        dirs_exist_ok=True
-        )
-    print(f"Copied UPM scripts to {os.path.join(args.dir, 'upm')}")
+    if os.path.normcase(os.path.abspath(os.path.join(args.dir, "upm"))) == os.path.normcase(UPM_DIR):
+        print(f"Skipping copy; UPM scripts are already running from {UPM_DIR}")
+    else:
+        mode = args.link or COPY_MODE
+        counts = sync_tree(
+            UPM_DIR,
+            os.path.join(args.dir, "upm"),
+            get_cache_path(args.dir, SYNC_MANIFEST_FILENAME),
+            mode=mode,
+            prune=not args.no_prune
+            )
+        print(f"Synced UPM scripts to {os.path.join(args.dir, 'upm')} ({mode}): "
+              f"{counts['updated']} updated, {counts['unchanged']} unchanged, {counts['pruned']} removed")
     
     if not args.nogitignore:
         shutil.copy(
@@ -113,7 +124,7 @@ def config(args):
         config[system][EDITOR_NAME_KEY] = f"{config[system][GAME_NAME_KEY]}Editor"
     
     if args.prerelease_type:
-        config['system'][PRERELEASE_TYPE_KEY] = args.prerelease_type
+        config[system][PRERELEASE_TYPE_KEY] = args.prerelease_type
 
     if os.path.exists(os.path.join(args.dir, CONFIG_FILENAME)):
         print(f"Skipping create config file; UPM config file already exists at {os.path.join(args.dir, CONFIG_FILENAME)}")
@@ -0,0 +1,143 @@
+"""
+Persistent index of the files under a project's Content/ and Config/, used by packaging to decide
+whether cooking is needed.
+
+The index is a SQLite database, Intermediate/UPM/ContentIndex.db, with one row per file: its path
+relative to the project, size, mtime and, once known, SHA-256. refresh_index() walks the directories
+with os.scandir on a thread pool, one task per directory, and short-circuits on size and mtime.
+
+Hashes are computed lazily. A file seen for the first time isn't read; it's identified by its size
+and mtime. A file is only hashed when its size or mtime changes, which is when the cook decision
+needs to know whether its content did: from then on, a save that leaves the content unchanged doesn't
+invalidate the cook. A first refresh of a large Content/ tree, or one where nothing changed, costs
+one stat per file and no reads.
+"""
+import os
+import hashlib
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from upm.fingerprint import EXCLUDED_DIRS, get_cache_path, hash_file
+
+CONTENT_INDEX_FILENAME = 'ContentIndex.db'
+INDEXED_DIRS = ('Content', 'Config')
+# Walking and hashing wait on the disk rather than the CPU, so use more threads than cores
+DEFAULT_INDEX_JOBS = min(32, (os.cpu_count() or 1) * 4)
+# Seconds to wait for another UPM process writing the index
+SQLITE_TIMEOUT = 60
+# Bumped when the table changes; an index with another version is dropped and rebuilt
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT
+)
+"""
+
+def get_index_path(project_dir):
+    return get_cache_path(project_dir, CONTENT_INDEX_FILENAME)
+
+def connect(project_dir):
+    path = get_index_path(project_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path, timeout=SQLITE_TIMEOUT)
+    if connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+        with connection:
+            connection.execute('DROP TABLE IF EXISTS files')
+            connection.execute(SCHEMA)
+            connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    return connection
+
+def scan_dir(directory, relpath):
+    """
+    Return the (path, relative path, size, mtime_ns) of the files in directory, and its subdirectories
+    as (path, relative path). Relative paths are built up by name rather than with os.path.relpath,
+    which would dominate a walk of a large, unchanged tree.
+    """
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in EXCLUDED_DIRS:
+                        subdirs.append((entry.path, f"{relpath}/{entry.name}"))
+                elif entry.is_file():
+                    stat = entry.stat()
+                    files.append((entry.path, f"{relpath}/{entry.name}", stat.st_size, stat.st_mtime_ns))
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    return files, subdirs
+
+def walk_files(project_dir, executor):
+    """
+    Return {relative path: (path, (size, mtime_ns))} for every file in the indexed directories,
+    scanning directories in parallel.
+    """
+    found = {}
+    roots = [(os.path.join(project_dir, name), name) for name in INDEXED_DIRS]
+    pending = {executor.submit(scan_dir, *root) for root in roots if os.path.isdir(root[0])}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            files, subdirs = future.result()
+            for path, relpath, size, mtime_ns in files:
+                found[relpath] = (path, (size, mtime_ns))
+            pending |= {executor.submit(scan_dir, *subdir) for subdir in subdirs}
+    return found
+
+def try_hash_file(path):
+    try:
+        return hash_file(path)
+    except (FileNotFoundError, PermissionError):
+        # Deleted or locked since the walk; it's picked up by the next refresh
+        return None
+
+def refresh_index(project_dir, jobs=None):
+    """
+    Bring the index up to date with Content/ and Config/ and return a dict with the number of files
+    indexed and hashed, and the relative paths of the files that were added, modified or removed.
+
+    Only files that were indexed before and whose size or mtime changed are hashed; new files are
+    added without a digest.
+    """
+    with ThreadPoolExecutor(max_workers=jobs or DEFAULT_INDEX_JOBS) as executor:
+        found = walk_files(project_dir, executor)
+        connection = connect(project_dir)
+        try:
+            known = {row[0]: row[1:] for row in connection.execute('SELECT path, size, mtime_ns, digest FROM files')}
+            added = [relpath for relpath in found if relpath not in known]
+            stale = [relpath for relpath, (path, stat) in found.items() if relpath in known and known[relpath][:2] != stat]
+            digests = dict(zip(stale, executor.map(try_hash_file, [found[relpath][0] for relpath in stale])))
+
+            rows = [(relpath, *found[relpath][1], None) for relpath in added]
+            rows += [(relpath, *found[relpath][1], digest) for relpath, digest in digests.items() if digest is not None]
+            removed = sorted(relpath for relpath in known if relpath not in found or digests.get(relpath, '') is None)
+            # A file without a digest was identified by its size and mtime, which just changed
+            changed = sorted(added + [relpath for relpath, digest in digests.items() if digest is not None and known[relpath][2] != digest])
+            with connection:
+                connection.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)', rows)
+                connection.executemany('DELETE FROM files WHERE path = ?', [(relpath,) for relpath in removed])
+        finally:
+            connection.close()
+
+    return {'files': len(found), 'hashed': len(stale), 'changed': changed, 'removed': removed}
+
+def get_index_digest(project_dir, directory):
+    """
+    Return a SHA-256 over the indexed files under directory (e.g. 'Content'): each file's path and its
+    content hash, or its size and mtime if it hasn't been hashed yet.
+    """
+    sha = hashlib.sha256()
+    connection = connect(project_dir)
+    try:
+        for relpath, size, mtime_ns, digest in connection.execute(
+            'SELECT path, size, mtime_ns, digest FROM files WHERE path GLOB ? ORDER BY path', (f"{directory}/*",)
+        ):
+            sha.update(f"{relpath}\0{digest or f'{size}:{mtime_ns}'}\0".encode())
+    finally:
+        connection.close()
+    return sha.hexdigest()
@@ -0,0 +1,429 @@
+import os
+import sys
+import json
+import time
+import heapq
+import itertools
+import secrets
+import threading
+import traceback
+import subprocess
+import socketserver
+from collections import deque
+from contextlib import redirect_stdout, redirect_stderr
+
+from upm.api import load_env, DOTENV_PATH
+from upm.process import run
+from upm.client import get_daemon_dir, get_address_path, ping, UPM_PARENT_DIR, PRIORITIES, DEFAULT_PRIORITY
+
+SOCKET_FILENAME = 'upmd.sock'
+# sun_path is limited to ~104-108 bytes; longer project paths fall back to loopback TCP
+MAX_UNIX_SOCKET_PATH = 100
+BUILD_ARGS = ('project_dir', 'target_name', 'build_type', 'build', 'clean', 'package', 'force', 'full_clean')
+# Output replayed to clients that join a build already in progress
+MAX_REPLAY_LINES = 2000
+# Completed jobs the wait time statistics are computed over
+MAX_WAIT_SAMPLES = 100
+
+def log(message):
+    # sys.stdout is redirected into the running job, so server messages go to the real stderr
+    sys.__stderr__.write(f"[upm daemon] {message}\n")
+    sys.__stderr__.flush()
+
+class Job:
+    """A queued build whose output and result are shared by every client waiting on it."""
+
+    def __init__(self, key, request, rank):
+        self.key = key
+        self.request = request
+        self.rank = rank
+        self.order = None
+        self.state = 'queued'
+        self.submitted = time.time()
+        self.started = None
+        self.result = None
+        # Replayed to clients that join after the job started, like the log history
+        self.started_message = None
+        self.subscribers = []
+        self.history = deque(maxlen=MAX_REPLAY_LINES)
+        self.lock = threading.Lock()
+
+    def subscribe(self):
+        event = threading.Event()
+        with self.lock:
+            subscriber = deque(self.history)
+            if self.started_message is not None:
+                subscriber.appendleft(self.started_message)
+            if subscriber:
+                event.set()
+            if self.result is not None:
+                subscriber.append(self.result)
+                event.set()
+            else:
+                self.subscribers.append((subscriber, event))
+        return subscriber, event
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers = [(queue, event) for queue, event in self.subscribers if queue is not subscriber]
+
+    def publish(self, message):
+        with self.lock:
+            if message['type'] == 'log':
+                self.history.append(message)
+            elif message['type'] == 'started':
+                self.started_message = message
+            for queue, event in self.subscribers:
+                queue.append(message)
+                event.set()
+
+    def finish(self, result):
+        with self.lock:
+            self.result = result
+        self.publish(result)
+
+    def describe(self):
+        return {
+            'request': {key: self.request.get(key) for key in BUILD_ARGS},
+            'priority': get_priority_name(self.rank),
+            'state': self.state,
+            'waiters': len(self.subscribers),
+            'waited': round((self.started or time.time()) - self.submitted, 3)
+        }
+
+class JobWriter:
+    """File-like object that forwards complete lines of output to a job's subscribers."""
+
+    def __init__(self, job):
+        self.job = job
+        self.buffer = ''
+
+    def write(self, text):
+        self.buffer += text
+        while '\n' in self.buffer:
+            line, self.buffer = self.buffer.split('\n', 1)
+            self.job.publish({'type': 'log', 'line': line + '\n'})
+        return len(text)
+
+    def flush(self):
+        if self.buffer:
+            self.job.publish({'type': 'log', 'line': self.buffer})
+            self.buffer = ''
+
+def get_priority_rank(priority):
+    return PRIORITIES.get(priority or DEFAULT_PRIORITY, PRIORITIES[DEFAULT_PRIORITY])
+
+def get_priority_name(rank):
+    return next(name for name, value in PRIORITIES.items() if value == rank)
+
+def summarize_waits(waits):
+    if not waits:
+        return {'mean': 0.0, 'max': 0.0}
+    return {'mean': round(sum(waits) / len(waits), 3), 'max': round(max(waits), 3)}
+
+class BuildQueue:
+    """Priority build queue that coalesces identical requests into one job."""
+
+    def __init__(self):
+        self.active = {}
+        # Heap of (rank, sequence, job); entries for promoted or started jobs are skipped when popped
+        self.pending = []
+        self.sequence = itertools.count()
+        self.completed = 0
+        self.coalesced = 0
+        self.waits = deque(maxlen=MAX_WAIT_SAMPLES)
+        self.condition = threading.Condition()
+
+    def submit(self, request):
+        key = json.dumps([request.get(key) for key in BUILD_ARGS])
+        rank = get_priority_rank(request.get('priority'))
+        with self.condition:
+            job = self.active.get(key)
+            if job is not None:
+                self.coalesced += 1
+                if job.state == 'queued' and rank < job.rank:
+                    # A more urgent waiter promotes the shared job
+                    job.rank = rank
+                    self.push(job)
+                return job, True, self.position(job)
+            job = Job(key, request, rank)
+            self.active[key] = job
+            self.push(job)
+            self.condition.notify()
+            return job, False, self.position(job)
+
+    def push(self, job):
+        job.order = (job.rank, next(self.sequence))
+        heapq.heappush(self.pending, job.order + (job,))
+
+    def queued_jobs(self):
+        return sorted((job for job in self.active.values() if job.state == 'queued'), key=lambda job: job.order)
+
+    def position(self, job):
+        if job.state == 'running':
+            return 0
+        return sum(1 for other in self.active.values() if other.state == 'queued' and other.order < job.order) + 1
+
+    def depth(self):
+        return sum(1 for job in self.active.values() if job.state == 'queued')
+
+    def next_job(self):
+        with self.condition:
+            while True:
+                while not self.pending:
+                    self.condition.wait()
+                rank, sequence, job = heapq.heappop(self.pending)
+                if job.state == 'queued' and job.order == (rank, sequence):
+                    break
+            job.state = 'running'
+            job.started = time.time()
+            self.waits.append(job.started - job.submitted)
+            return job
+
+    def done(self, job):
+        with self.condition:
+            self.active.pop(job.key, None)
+            self.completed += 1
+
+    def status(self):
+        with self.condition:
+            return {
+                'running': [job.describe() for job in self.active.values() if job.state == 'running'],
+                'queued': [job.describe() for job in self.queued_jobs()],
+                'depth': self.depth(),
+                'completed': self.completed,
+                'coalesced': self.coalesced,
+                'wait': summarize_waits(self.waits)
+            }
+
+class ProjectState:
+    """Configuration and file index kept warm between requests."""
+
+    def __init__(self, project_dir):
+        self.project_dir = project_dir
+        self.dotenv_path = os.path.join(project_dir, DOTENV_PATH)
+        self.dotenv_mtime = None
+        self.config_loaded = False
+        self.file_cache = {}
+
+    def refresh_config(self):
+        try:
+            mtime = os.stat(self.dotenv_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self.dotenv_mtime or not self.config_loaded:
+            load_env(self.dotenv_path, reload=self.config_loaded)
+            self.dotenv_mtime = mtime
+            self.config_loaded = True
+
+def run_job(state, job):
+    from upm.build import build_project
+
+    request = job.request
+    state.refresh_config()
+    writer = JobWriter(job)
+    returncode = 0
+    error = None
+    try:
+        with redirect_stdout(writer), redirect_stderr(writer):
+            build_project(
+                project_dir=request.get('project_dir') or state.project_dir,
+                target_name=request['target_name'],
+                build_type=request['build_type'],
+                build=request.get('build', False),
+                clean=request.get('clean', False),
+                package=request.get('package', False),
+                force=request.get('force', False),
+                full_clean=request.get('full_clean', False),
+                file_cache=state.file_cache
+            )
+    except subprocess.CalledProcessError as e:
+        returncode = e.returncode
+    except Exception as e:
+        returncode = 1
+        error = f"{type(e).__name__}: {e}"
+        log(traceback.format_exc())
+    writer.flush()
+    return {'type': 'result', 'returncode': returncode, 'error': error}
+
+def get_build_command(request):
+    command = [
+        sys.executable, '-m', 'upm', 'build',
+        '--project-dir', request['project_dir'],
+        '--target-name', request['target_name'],
+        '--build-type', request['build_type']
+    ]
+    command.extend(f"--{flag.replace('_', '-')}" for flag in ('build', 'clean', 'package', 'force', 'full_clean') if request.get(flag))
+    return command
+
+def run_job_process(job):
+    """Run a job in a child process; a machine-wide daemon can't share one os.environ between projects."""
+    request = job.request
+    writer = JobWriter(job)
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [UPM_PARENT_DIR, env.get('PYTHONPATH')]))
+    error = None
+    try:
+        returncode = run(
+            get_build_command(request),
+            cwd=request['project_dir'],
+            env=env,
+            on_output=writer.write,
+            stderr=subprocess.STDOUT,
+            check=False
+        )['returncode']
+    except OSError as e:
+        returncode = 1
+        error = f"{type(e).__name__}: {e}"
+    writer.flush()
+    return {'type': 'result', 'returncode': returncode, 'error': error}
+
+def worker(build_queue, execute):
+    while True:
+        job = build_queue.next_job()
+        log(f"Running {job.describe()['request']} ({get_priority_name(job.rank)}, waited {job.started - job.submitted:.1f}s)")
+        job.publish({'type': 'started', 'waited': round(job.started - job.submitted, 3)})
+        try:
+            result = execute(job)
+        except KeyboardInterrupt:
+            raise
+        except BaseException as e:
+            # SystemExit too: this is the daemon's only worker, and every queued client waits on it
+            log(traceback.format_exc())
+            result = {'type': 'result', 'returncode': 1, 'error': f"{type(e).__name__}: {e}"}
+        build_queue.done(job)
+        job.finish(dict(result, duration=round(time.time() - job.started, 3)))
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def send(self, message):
+        self.wfile.write((json.dumps(message) + '\n').encode())
+        self.wfile.flush()
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        if request.get('token') != self.server.token:
+            self.send({'type': 'result', 'returncode': 1, 'error': 'Invalid daemon token'})
+            return
+
+        command = request.get('command')
+        if command == 'ping':
+            self.send({'type': 'result', 'returncode': 0, 'pid': os.getpid()})
+        elif command == 'status':
+            self.send(dict(self.server.build_queue.status(), type='result', returncode=0, pid=os.getpid()))
+        elif command == 'stop':
+            self.send({'type': 'result', 'returncode': 0})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        elif command == 'build':
+            self.handle_build(request)
+        else:
+            self.send({'type': 'result', 'returncode': 1, 'error': f"Unknown command {command}"})
+
+    def handle_build(self, request):
+        if self.server.project_dir and os.path.normcase(request.get('project_dir') or self.server.project_dir) != os.path.normcase(self.server.project_dir):
+            self.send({'type': 'result', 'returncode': 1, 'error': f"This daemon only builds {self.server.project_dir}"})
+            return
+        request = dict(request, project_dir=request.get('project_dir') or self.server.project_dir)
+        job, coalesced, position = self.server.build_queue.submit(request)
+        subscriber, event = job.subscribe()
+        try:
+            self.send({
+                'type': 'queued',
+                'coalesced': coalesced,
+                'position': position,
+                'depth': self.server.build_queue.depth(),
+                'priority': get_priority_name(job.rank)
+            })
+            while True:
+                event.wait()
+                event.clear()
+                while subscriber:
+                    message = subscriber.popleft()
+                    self.send(message)
+                    if message['type'] == 'result':
+                        return
+        except OSError:
+            # Client went away; the job keeps running for any other waiters
+            pass
+        finally:
+            job.unsubscribe(subscriber)
+
+class ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class ThreadingUnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+def create_server(daemon_dir):
+    socket_path = os.path.join(daemon_dir, SOCKET_FILENAME)
+    if hasattr(socketserver, 'ThreadingUnixStreamServer') and len(socket_path) <= MAX_UNIX_SOCKET_PATH:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixServer(socket_path, RequestHandler)
+        return server, {'family': 'unix', 'address': socket_path}
+
+    server = ThreadingTCPServer(('127.0.0.1', 0), RequestHandler)
+    return server, {'family': 'tcp', 'port': server.server_address[1]}
+
+def write_address(path, address, mode=0o600):
+    # The token is the only thing stopping other local users from driving builds, so keep it private
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(address, f)
+    os.chmod(path, mode)
+
+def serve(project_dir='.', machine=False, group_access=False):
+    """
+    Run the daemon for one project, or with machine=True for every project of this user.
+
+    A project daemon keeps the project's configuration and file index warm and builds in-process.
+    The machine-wide daemon orders and coalesces builds from all projects on the machine and runs
+    each one in a child process. group_access lets other members of the daemon directory's group
+    use it, e.g. on a shared build box.
+    """
+    project_dir = None if machine else os.path.abspath(project_dir)
+    daemon_dir = get_daemon_dir(project_dir)
+    description = project_dir or 'all projects'
+
+    if ping(daemon_dir):
+        print(f"upm daemon is already running for {description}")
+        return 1
+
+    os.makedirs(daemon_dir, exist_ok=True)
+    if project_dir:
+        os.chdir(project_dir)
+        state = ProjectState(project_dir)
+        state.refresh_config()
+        execute = lambda job: run_job(state, job)
+    else:
+        execute = run_job_process
+
+    server, address = create_server(daemon_dir)
+    server.token = secrets.token_hex(16)
+    server.build_queue = BuildQueue()
+    server.project_dir = project_dir
+    if group_access and address['family'] == 'unix':
+        os.chmod(address['address'], 0o660)
+
+    address_path = get_address_path(daemon_dir)
+    write_address(address_path, dict(address, pid=os.getpid(), token=server.token), 0o640 if group_access else 0o600)
+
+    threading.Thread(target=worker, args=(server.build_queue, execute), daemon=True).start()
+    log(f"Listening on {address.get('address') or address.get('port')} for {description}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(address_path):
+            os.remove(address_path)
+        if address['family'] == 'unix' and os.path.exists(address['address']):
+            os.remove(address['address'])
+        log("Stopped")
+    return 0
@@ -0,0 +1,254 @@
+"""
+Resumable, verified and cached downloads for toolchain installers.
+
+Downloads stream to disk in chunks and resume interrupted transfers with HTTP Range requests. Large
+files can be fetched in parallel ranged segments. Completed files are verified with SHA-256 and
+kept in a content-addressed cache:
+
+    <cache>/downloads/blobs/<sha256>     downloaded content
+    <cache>/downloads/urls.json          url -> sha256 plus ETag/Last-Modified validators
+    <cache>/downloads/partial/           in-progress transfers, resumed on the next attempt
+
+With an expected sha256 a cached blob is used without touching the network. Without one, the cached
+blob is revalidated with a conditional request and only downloaded again if the server has a newer file.
+"""
+import os
+import shutil
+import hashlib
+import platform
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from upm.fingerprint import load_manifest, save_manifest, update_manifest
+
+CACHE_DIR_ENV = 'UPM_CACHE_DIR'
+DOWNLOADS_DIR = 'downloads'
+URL_INDEX_FILENAME = 'urls.json'
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_SEGMENTS = 4
+# Below this many bytes per segment a single stream is faster than extra connections
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+REQUEST_TIMEOUT = 60
+USER_AGENT = 'upm'
+
+def get_cache_dir():
+    """Return the per-user UPM cache directory (UPM_CACHE_DIR overrides the platform default)."""
+    if os.getenv(CACHE_DIR_ENV):
+        return os.getenv(CACHE_DIR_ENV)
+
+    system = platform.system()
+    if system == 'Windows':
+        base = os.getenv('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), 'AppData', 'Local')
+        return os.path.join(base, 'upm', 'Cache')
+    elif system == 'Darwin':
+        return os.path.join(os.path.expanduser('~'), 'Library', 'Caches', 'upm')
+    else:
+        base = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(base, 'upm')
+
+def hash_url(url):
+    return hashlib.sha256(url.encode()).hexdigest()[:32]
+
+def open_url(url, headers=None, method=None):
+    request = urllib.request.Request(url, headers=dict(headers or {}, **{'User-Agent': USER_AGENT}), method=method)
+    return urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT)
+
+def get_validators(response):
+    return {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified')
+    }
+
+def get_if_range(validators):
+    # If-Range needs a strong validator; weak ETags can't guarantee byte-identical ranges
+    etag = validators.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return validators.get('last_modified')
+
+class Downloader:
+    def __init__(self, cache_dir=None):
+        self.root = os.path.join(cache_dir or get_cache_dir(), DOWNLOADS_DIR)
+        self.blob_dir = os.path.join(self.root, 'blobs')
+        self.partial_dir = os.path.join(self.root, 'partial')
+        self.index_path = os.path.join(self.root, URL_INDEX_FILENAME)
+
+    def get_blob_path(self, sha256):
+        return os.path.join(self.blob_dir, sha256)
+
+    def download(self, url, dest=None, sha256=None, segments=DEFAULT_SEGMENTS):
+        """
+        Download url and return the path of the verified file.
+
+        The file is copied to dest if given, otherwise the cached blob's path is returned. If sha256 is
+        given, the content must match it.
+        """
+        sha256 = sha256.lower() if sha256 else None
+        blob_path = self.lookup(url, sha256)
+        if blob_path:
+            print(f"Using cached download of {url}")
+        else:
+            blob_path = self.fetch(url, sha256, segments)
+        if dest is None:
+            return blob_path
+        if os.path.dirname(dest):
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.copyfile(blob_path, dest)
+        return dest
+
+    def lookup(self, url, sha256):
+        """Return a cached blob for url without downloading it, or None."""
+        if sha256:
+            blob_path = self.get_blob_path(sha256)
+            return blob_path if os.path.exists(blob_path) else None
+
+        entry = load_manifest(self.index_path).get(url)
+        if not entry or not os.path.exists(self.get_blob_path(entry['sha256'])):
+            return None
+
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        if not headers:
+            return None
+        try:
+            with open_url(url, headers, method='HEAD'):
+                # 200: the server has a different file
+                return None
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return self.get_blob_path(entry['sha256'])
+            return None
+        except urllib.error.URLError:
+            # Offline: the last version we downloaded is better than nothing
+            print(f"Could not reach {url}; using the cached download")
+            return self.get_blob_path(entry['sha256'])
+
+    def fetch(self, url, sha256, segments):
+        os.makedirs(self.partial_dir, exist_ok=True)
+        os.makedirs(self.blob_dir, exist_ok=True)
+        part_base = os.path.join(self.partial_dir, hash_url(url))
+        state_path = f"{part_base}.json"
+
+        state = load_manifest(state_path)
+        plan = self.plan_segments(url, segments)
+        if plan != state or not get_if_range(plan['validators']):
+            # Fresh download, or the file changed on the server; parts of another file can't be resumed
+            self.remove_parts(part_base, state)
+            state = plan
+            save_manifest(state_path, state)
+
+        print(f"Downloading {url} ({len(state['segments'])} segment{'s' if len(state['segments']) > 1 else ''})...")
+        paths = [f"{part_base}.part{i}" for i in range(len(state['segments']))]
+        if len(paths) == 1:
+            self.fetch_segment(url, state, 0, paths[0])
+        else:
+            with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+                futures = [executor.submit(self.fetch_segment, url, state, i, path) for i, path in enumerate(paths)]
+                for future in futures:
+                    future.result()
+
+        digest = self.store(paths, sha256)
+        self.remove_parts(part_base, state)
+        os.remove(state_path)
+
+        def update(index):
+            index[url] = dict(state['validators'], sha256=digest, size=os.path.getsize(self.get_blob_path(digest)))
+        update_manifest(self.index_path, update)
+        return self.get_blob_path(digest)
+
+    def plan_segments(self, url, segments):
+        """Split the download into byte ranges based on the server's size and range support."""
+        size = None
+        validators = {}
+        accepts_ranges = False
+        try:
+            with open_url(url, method='HEAD') as response:
+                validators = get_validators(response)
+                accepts_ranges = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+                if response.headers.get('Content-Length'):
+                    size = int(response.headers['Content-Length'])
+        except urllib.error.HTTPError as e:
+            # Some servers don't allow HEAD; fall back to a single stream
+            if e.code not in (403, 405, 501):
+                raise
+
+        count = 1
+        if size and accepts_ranges and get_if_range(validators):
+            count = max(1, min(segments, size // MIN_SEGMENT_SIZE))
+        if count == 1:
+            ranges = [[0, None]]
+        else:
+            step = size // count
+            ranges = [[i * step, (i + 1) * step - 1 if i < count - 1 else size - 1] for i in range(count)]
+        return {'url': url, 'size': size, 'validators': validators, 'segments': ranges}
+
+    def fetch_segment(self, url, state, index, path):
+        start, end = state['segments'][index]
+        have = os.path.getsize(path) if os.path.exists(path) else 0
+        length = None if end is None else end - start + 1
+        if length is not None and have >= length:
+            return
+
+        headers = {}
+        if have or end is not None:
+            headers['Range'] = f"bytes={start + have}-{'' if end is None else end}"
+            if_range = get_if_range(state['validators'])
+            if if_range:
+                headers['If-Range'] = if_range
+
+        with open_url(url, headers) as response:
+            if response.status == 206:
+                mode = 'ab'
+            elif index == 0 and end is None:
+                # The server ignored the range (or the file changed); start this stream over
+                mode = 'wb'
+            else:
+                raise Exception(f"Server did not honor the range request for {url} (HTTP {response.status})")
+            expected = response.headers.get('Content-Length')
+            received = 0
+            with open(path, mode) as f:
+                for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                    f.write(chunk)
+                    received += len(chunk)
+            # urllib returns a short read rather than raising when the connection drops
+            if expected is not None and received != int(expected):
+                raise Exception(f"Connection closed after {received} of {expected} bytes of {url}; run again to resume")
+
+        if length is not None and os.path.getsize(path) != length:
+            raise Exception(f"Incomplete download of {url}: segment {index} has {os.path.getsize(path)} of {length} bytes")
+
+    def store(self, paths, sha256):
+        """Join the segments into the blob store, verifying the content hash. Returns the digest."""
+        tmp_path = os.path.join(self.blob_dir, f".{os.getpid()}.{threading.get_ident()}.tmp")
+        sha = hashlib.sha256()
+        try:
+            with open(tmp_path, 'wb') as out:
+                for path in paths:
+                    with open(path, 'rb') as f:
+                        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                            sha.update(chunk)
+                            out.write(chunk)
+            digest = sha.hexdigest()
+            if sha256 and digest != sha256:
+                for path in paths:
+                    os.remove(path)
+                raise Exception(f"SHA-256 mismatch: expected {sha256}, got {digest}")
+            os.replace(tmp_path, self.get_blob_path(digest))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return digest
+
+    def remove_parts(self, part_base, state):
+        for i in range(len((state or {}).get('segments', [None]))):
+            path = f"{part_base}.part{i}"
+            if os.path.exists(path):
+                os.remove(path)
+
+def download(url, dest=None, sha256=None, segments=DEFAULT_SEGMENTS, cache_dir=None):
+    return Downloader(cache_dir).download(url, dest, sha256=sha256, segments=segments)
@@ -0,0 +1,170 @@
+import os
+import json
+import hashlib
+import time
+import threading
+from contextlib import contextmanager
+
+CACHE_DIR = os.path.join('Intermediate', 'UPM')
+HASH_CHUNK_SIZE = 1024 * 1024
+# How often a waiter retries a lock where the OS can't block on it (Windows)
+LOCK_POLL_INTERVAL = 0.5
+EXCLUDED_DIRS = {'Intermediate', 'Binaries', 'Saved', 'DerivedDataCache', '.git', '.vs', '__pycache__'}
+
+manifest_lock = threading.Lock()
+
+def get_cache_path(project_dir, filename):
+    return os.path.join(project_dir, CACHE_DIR, filename)
+
+def hash_file(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def iter_files(root, suffixes=None, excluded_dirs=EXCLUDED_DIRS):
+    """Yield paths of files under root (sorted, skipping build output directories)."""
+    if not os.path.isdir(root):
+        return
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in excluded_dirs)
+        for filename in sorted(filenames):
+            if suffixes is None or filename.endswith(suffixes):
+                yield os.path.join(dirpath, filename)
+
+def fingerprint_files(base_dir, paths, file_cache, extra=()):
+    """
+    Return a combined SHA-256 over the contents of paths (and any extra strings).
+
+    file_cache maps a path relative to base_dir to [size, mtime_ns, digest] and is updated in place,
+    so unchanged files are only stat()ed rather than re-read.
+    """
+    sha = hashlib.sha256()
+    for value in extra:
+        sha.update(f"{value}\0".encode())
+
+    for path in paths:
+        relpath = os.path.relpath(path, base_dir).replace(os.sep, '/')
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        cached = file_cache.get(relpath)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            digest = cached[2]
+        else:
+            digest = hash_file(path)
+            file_cache[relpath] = [stat.st_size, stat.st_mtime_ns, digest]
+        sha.update(f"{relpath}\0{digest}\0".encode())
+
+    return sha.hexdigest()
+
+def get_output_manifest(directory, paths=None):
+    """
+    Return a digest over the path, size and mtime of every file under directory, or of paths (relative
+    to directory) with missing ones recorded as such, and the number of files that exist.
+    """
+    sha = hashlib.sha256()
+    count = 0
+    for path in (iter_files(directory, excluded_dirs=()) if paths is None else paths):
+        relpath = os.path.relpath(path, directory)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            sha.update(f"{relpath}\0missing\n".encode())
+            continue
+        sha.update(f"{relpath}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+        count += 1
+    return {'digest': sha.hexdigest(), 'files': count}
+
+def prune_file_cache(file_cache, base_dir):
+    for relpath in [relpath for relpath in file_cache if not os.path.exists(os.path.join(base_dir, relpath))]:
+        del file_cache[relpath]
+
+def load_manifest(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def write_atomic(path, text, encoding=None, newline=None):
+    """Write text to path atomically so readers never see a partial file."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding=encoding, newline=newline) as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def save_manifest(path, manifest):
+    write_atomic(path, json.dumps(manifest, separators=(',', ':')))
+
+def update_manifest(path, update):
+    """
+    Reload manifest, apply update(manifest) and save it, serialized across threads and processes (the
+    daemon, the CLI and matrix workers all write the build and package caches).
+    """
+    # The thread lock first, so threads queue on it rather than polling the lock file
+    with manifest_lock, file_lock(path, quiet=True):
+        manifest = load_manifest(path)
+        update(manifest)
+        save_manifest(path, manifest)
+        return manifest
+
+if os.name == 'nt':
+    import msvcrt
+
+    def lock_file(f, blocking):
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                time.sleep(LOCK_POLL_INTERVAL)
+
+    def unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def lock_file(f, blocking):
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            return True
+        except BlockingIOError:
+            return False
+
+    def unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+@contextmanager
+def file_lock(path, quiet=False):
+    """
+    Hold an exclusive lock on a lock file next to path, shared by every UPM process and thread on the
+    machine. The lock is an OS file lock, so it's released when its holder exits, even if it crashed;
+    the lock file itself is left in place. quiet skips the waiting message, for locks that are only
+    ever held briefly.
+    """
+    lock_path = f"{path}.lock"
+    os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+    with open(lock_path, 'a+b') as f:
+        if not lock_file(f, blocking=False):
+            if not quiet:
+                print(f"Waiting for another UPM process to finish with {path}...")
+            lock_file(f, blocking=True)
+        try:
+            yield
+        finally:
+            unlock_file(f)
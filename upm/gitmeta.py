@@ -0,0 +1,115 @@
+"""
+Read git metadata without spawning git.
+
+Resolves HEAD by reading .git/HEAD, loose refs and packed-refs directly. It also handles
+worktrees and submodules, where .git is a "gitdir:" file and shared refs live in the "commondir".
+Layouts it doesn't understand, such as reftable or a GIT_DIR override, fall back to `git rev-parse`.
+"""
+import os
+import re
+import subprocess
+
+from upm.timing import span
+from upm.process import output_of
+
+OBJECT_ID_RE = re.compile(r'^(?:[0-9a-f]{40}|[0-9a-f]{64})$')
+SYMREF_PREFIX = 'ref: '
+GITDIR_PREFIX = 'gitdir: '
+MAX_SYMREF_DEPTH = 5
+GIT_TIMEOUT = 30
+
+class UnsupportedLayout(Exception):
+    pass
+
+def read_text(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+def find_git_dir(path):
+    """Return the git directory for the repository containing path, or None."""
+    path = os.path.abspath(path)
+    while True:
+        dot_git = os.path.join(path, '.git')
+        if os.path.isdir(dot_git):
+            return dot_git
+        if os.path.isfile(dot_git):
+            contents = read_text(dot_git)
+            if not contents or not contents.startswith(GITDIR_PREFIX):
+                raise UnsupportedLayout(f"Unrecognized .git file at {dot_git}")
+            return os.path.normpath(os.path.join(path, contents[len(GITDIR_PREFIX):]))
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+def get_common_dir(git_dir):
+    commondir = read_text(os.path.join(git_dir, 'commondir'))
+    if commondir:
+        return os.path.normpath(os.path.join(git_dir, commondir))
+    return git_dir
+
+def read_packed_refs(common_dir):
+    refs = {}
+    contents = read_text(os.path.join(common_dir, 'packed-refs'))
+    for line in (contents or '').splitlines():
+        # Skip the header and peeled-tag (^) lines
+        if not line or line[0] in '#^':
+            continue
+        object_id, _, name = line.partition(' ')
+        refs[name] = object_id
+    return refs
+
+def resolve_ref(git_dir, common_dir, name):
+    packed_refs = None
+    for _ in range(MAX_SYMREF_DEPTH):
+        # HEAD and other per-worktree refs live in git_dir; branches and tags are shared
+        value = read_text(os.path.join(git_dir, name))
+        if value is None and common_dir != git_dir:
+            value = read_text(os.path.join(common_dir, name))
+        if value is None:
+            if packed_refs is None:
+                packed_refs = read_packed_refs(common_dir)
+            value = packed_refs.get(name)
+        if value is None:
+            # Unborn branch, e.g. a fresh repository without commits
+            return None
+        if value.startswith(SYMREF_PREFIX):
+            name = value[len(SYMREF_PREFIX):]
+            continue
+        if OBJECT_ID_RE.match(value):
+            return value
+        raise UnsupportedLayout(f"Unrecognized ref {name}: {value!r}")
+    raise UnsupportedLayout(f"Too many levels of symbolic refs resolving {name}")
+
+def read_head(path):
+    if 'GIT_DIR' in os.environ or 'GIT_COMMON_DIR' in os.environ:
+        raise UnsupportedLayout("GIT_DIR is set")
+    git_dir = find_git_dir(path)
+    if git_dir is None:
+        return None
+    common_dir = get_common_dir(git_dir)
+    if os.path.isdir(os.path.join(common_dir, 'reftable')):
+        raise UnsupportedLayout("reftable ref storage")
+    return resolve_ref(git_dir, common_dir, 'HEAD')
+
+def rev_parse_head(path):
+    try:
+        with span('git rev-parse HEAD', category='process'):
+            return output_of(['git', 'rev-parse', 'HEAD'], cwd=path, stderr=subprocess.DEVNULL, timeout=GIT_TIMEOUT)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
+        return None
+
+def get_head_commit(path='.'):
+    """
+    Return the commit HEAD points to for the repository containing path, or None. Not cached, since
+    HEAD moves under long-lived callers; resolve it once per operation and pass it along.
+    """
+    path = os.path.abspath(path)
+    try:
+        with span('read git HEAD'):
+            return read_head(path)
+    except (UnsupportedLayout, OSError):
+        return rev_parse_head(path)
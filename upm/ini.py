@@ -0,0 +1,221 @@
+"""
+Streaming patcher for Unreal's Config/*.ini files.
+
+Applies a batch of (section, key, value) edits to a file in a single pass and one atomic write,
+preserving comments, ordering, line endings and encoding. The file is not written if nothing changes.
+
+A section header may appear more than once in a file; UE merges the blocks and the last value of a
+key wins. A plain key sets the last "Key=..." line across all of the section's blocks, or adds one at
+the end of the section's last block. Keys prefixed with UE's array operators ("+Key", "-Key", ".Key",
+"!Key") name a whole line: the line "+Key=Value" is added to the last block if no block of the
+section has it yet. "-Key=Value" also drops a matching "+Key=Value" from every block. Missing
+sections are appended to the file.
+"""
+import os
+import sys
+import codecs
+import argparse
+
+if __name__ == "__main__" and __package__ in (None, ''):
+    # Running as a script (e.g. from generated VS Code tasks); make sibling modules importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from upm.fingerprint import write_atomic
+
+ARRAY_OPERATORS = '+-.!'
+COMMENT_PREFIXES = (';', '#')
+
+def detect_encoding(path):
+    with open(path, 'rb') as f:
+        head = f.read(4)
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    return 'utf-8'
+
+def parse_section(line):
+    stripped = line.strip()
+    if stripped.startswith('[') and stripped.endswith(']'):
+        return stripped[1:-1]
+    return None
+
+def parse_key(line):
+    """Return (key, value) for a "Key=Value" line, or (None, None) for anything else."""
+    stripped = line.strip()
+    if not stripped or stripped.startswith(COMMENT_PREFIXES) or '=' not in stripped:
+        return None, None
+    key, _, value = stripped.partition('=')
+    return key.strip(), value.strip()
+
+def parse_assignment(assignment):
+    key, separator, value = assignment.partition('=')
+    if not separator or not key.strip():
+        raise Exception(f"Expected KEY=VALUE, got '{assignment}'")
+    return key.strip(), value.strip()
+
+class SectionEdits:
+    """Pending edits for one section, consumed as the section's lines stream past."""
+
+    def __init__(self, name):
+        self.name = name
+        self.sets = {}
+        self.lines = {}
+        self.removals = set()
+
+    def add(self, key, value):
+        if key[0] in ARRAY_OPERATORS:
+            line = f"{key}={value}"
+            self.lines[line.lower()] = line
+            if key[0] == '-':
+                self.removals.add(f"+{key[1:]}={value}".lower())
+        else:
+            self.sets[key.lower()] = (key, value)
+
+    def patch_line(self, line, last):
+        """
+        Return the replacement for an existing line in this section (None to drop it). last is whether
+        no later line in the section sets the same key; only that one takes the new value.
+        """
+        key, value = parse_key(line)
+        if key is None:
+            return line
+        normalized = f"{key}={value}".lower()
+        if normalized in self.removals:
+            return None
+        if normalized in self.lines:
+            del self.lines[normalized]
+            return line
+        if last and key.lower() in self.sets:
+            _, new_value = self.sets.pop(key.lower())
+            if new_value == value:
+                return line
+            ending = line[len(line.rstrip('\r\n')):]
+            return f"{key}={new_value}{ending}"
+        return line
+
+    def remaining(self, newline):
+        lines = [f"{key}={value}{newline}" for key, value in self.sets.values()]
+        lines.extend(f"{line}{newline}" for line in self.lines.values())
+        self.sets.clear()
+        self.lines.clear()
+        return lines
+
+def scan_sections(lines):
+    """
+    Return {section: index of its last header} and the indices of the lines that set a key for the
+    last time in their section, with a section's repeated blocks counted as one.
+    """
+    last_headers = {}
+    last_keys = {}
+    section = None
+    for index, line in enumerate(lines):
+        name = parse_section(line)
+        if name is not None:
+            section = name.lower()
+            last_headers[section] = index
+            continue
+        key, _ = parse_key(line)
+        if section is not None and key is not None:
+            last_keys[(section, key.lower())] = index
+    return last_headers, set(last_keys.values())
+
+def patch_lines(lines, edits):
+    """Apply edits [(section, key, value)] to lines (with line endings) and return the new lines."""
+    sections = {}
+    for section, key, value in edits:
+        sections.setdefault(section.lower(), SectionEdits(section)).add(key, value)
+
+    last_headers, last_keys = scan_sections(lines)
+    newline = '\r\n' if lines and lines[0].endswith('\r\n') else '\n'
+    output = []
+    current = None
+    header = None
+
+    def close_section():
+        # Additions go to the section's last block, after everything they could duplicate
+        if current is None or last_headers[current.name.lower()] != header:
+            return
+        added = current.remaining(newline)
+        if not added:
+            return
+        # Insert before the blank lines that separate this section from the next
+        insert_at = len(output)
+        while insert_at > 0 and not output[insert_at - 1].strip():
+            insert_at -= 1
+        if insert_at and not output[insert_at - 1].endswith('\n'):
+            output[insert_at - 1] += newline
+        output[insert_at:insert_at] = added
+
+    for index, line in enumerate(lines):
+        name = parse_section(line)
+        if name is not None:
+            close_section()
+            current = sections.get(name.lower())
+            header = index
+            output.append(line)
+            continue
+        if current is not None:
+            line = current.patch_line(line, index in last_keys)
+            if line is None:
+                continue
+        output.append(line)
+    close_section()
+
+    for section in sections.values():
+        added = section.remaining(newline)
+        if added:
+            if output and not output[-1].endswith('\n'):
+                output[-1] += newline
+            if output and output[-1].strip():
+                output.append(newline)
+            output.append(f"[{section.name}]{newline}")
+            output.extend(added)
+    return output
+
+def patch_ini(path, edits):
+    """Apply edits [(section, key, value)] to the INI file at path. Returns True if it was written."""
+    if os.path.exists(path):
+        encoding = detect_encoding(path)
+        with open(path, 'r', encoding=encoding, newline='') as f:
+            content = f.read()
+    else:
+        encoding = 'utf-8'
+        content = ''
+
+    lines = content.splitlines(keepends=True)
+    updated = ''.join(patch_lines(lines, edits))
+    if updated == content:
+        return False
+    # newline='' so existing CRLF line endings are written back as-is
+    write_atomic(path, updated, encoding=encoding, newline='')
+    return True
+
+def patch_ini_files(edits):
+    """Apply edits [(file, section, key, value)], reading and writing each file once. Returns the files written."""
+    by_file = {}
+    for path, section, key, value in edits:
+        by_file.setdefault(os.path.normpath(path), []).append((section, key, value))
+
+    written = []
+    for path, file_edits in by_file.items():
+        if patch_ini(path, file_edits):
+            written.append(path)
+            print(f"Updated {path}")
+        else:
+            print(f"{path} is up to date")
+    return written
+
+def ini(args):
+    edits = []
+    for path, section, assignment in args.set or []:
+        key, value = parse_assignment(assignment)
+        edits.append((path, section, key, value))
+    return patch_ini_files(edits)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Patch Unreal Config/*.ini files.")
+    parser.add_argument('--set', nargs=3, action='append', metavar=('FILE', 'SECTION', 'KEY=VALUE'),
+                        help="Set KEY in SECTION of FILE; repeat for more edits. Prefix KEY with + or - for array entries")
+    args = parser.parse_args()
+    ini(args)
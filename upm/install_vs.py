@@ -1,8 +1,11 @@
 import os
 import sys
 import subprocess
-import urllib.request
 
+from upm.download import download, get_cache_dir
+from upm.process import run
+
+INSTALLERS_DIR = "installers"
 VS_INSTALLER_URL = "https://aka.ms/vs/17/release/vs_community.exe"
 
 def is_admin():
@@ -23,7 +26,7 @@ def run_as_admin():
             '-ArgumentList', f'"{module_flag} {__name__} {" ".join(sys.argv[1:])}"', 
             '-Verb', 'runAs'
         ]
-        subprocess.run(cmd, shell=True)
+        run(cmd, shell=True, check=False, process_group=False)
     else:
         raise RuntimeError("Python 3.5+ is required to run this script.")
 
@@ -32,7 +35,7 @@ def download_vs_installer(download_path):
     installer_path = os.path.join(download_path, "vs_installer.exe")
     print(f"Downloading Visual Studio installer to {installer_path}...")
     try:
-        urllib.request.urlretrieve(installer_url, installer_path)
+        download(installer_url, installer_path)
         print("Download complete.")
     except Exception as e:
         print(f"Failed to download Visual Studio installer: {e}")
@@ -45,7 +48,7 @@ def install_visual_studio():
         run_as_admin()
         sys.exit(0)
     
-    download_path = r"C:\Temp"
+    download_path = os.path.join(get_cache_dir(), INSTALLERS_DIR)
     os.makedirs(download_path, exist_ok=True)
     vs_installer_path = download_vs_installer(download_path)
     print(f"Visual Studio installer downloaded to: {vs_installer_path}")
@@ -75,7 +78,7 @@ def install_visual_studio():
 
     try:
         print("Starting Visual Studio installation. Grab some coffee, this could take a while ...")
-        subprocess.run(command, shell=True, check=True)
+        run(command, shell=True, process_group=False)
         print("Installation complete.")
     except subprocess.CalledProcessError as e:
         print(f"Installation failed: {e}")
@@ -1,8 +1,11 @@
 import os
 import sys
 import subprocess
-import urllib.request
 
+from upm.download import download, get_cache_dir
+from upm.process import run
+
+INSTALLERS_DIR = "installers"
 VSCODE_INSTALLER_URL = "https://code.visualstudio.com/sha/download?build=stable&os=win32-x64-user"
 
 def download_vscode_installer(download_path):
@@ -14,7 +17,7 @@ def download_vscode_installer(download_path):
     
     print(f"Downloading Visual Studio Code installer to {installer_path}...")
     try:
-        urllib.request.urlretrieve(installer_url, installer_path)
+        download(installer_url, installer_path)
         print("Download complete.")
     except Exception as e:
         print(f"Failed to download Visual Studio Code installer: {e}")
@@ -23,7 +26,7 @@ def download_vscode_installer(download_path):
     return installer_path
 
 def install_vscode():
-    download_path = r"C:\Temp"
+    download_path = os.path.join(get_cache_dir(), INSTALLERS_DIR)
     os.makedirs(download_path, exist_ok=True)
     vscode_installer_path = download_vscode_installer(download_path)
     print(f"Visual Studio Code installer downloaded to: {vscode_installer_path}")
@@ -34,7 +37,7 @@ def install_vscode():
 
     try:
         print("Starting Visual Studio Code installation...")
-        subprocess.run(command, shell=True, check=True)
+        run(command, shell=True, process_group=False)
         print("Installation complete.")
     except subprocess.CalledProcessError as e:
         print(f"Installation failed: {e}")
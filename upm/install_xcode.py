@@ -2,6 +2,8 @@ import os
 import sys
 import subprocess
 
+from upm.process import run
+
 XCODE_VERSION = "14.1"
 
 def is_admin():
@@ -19,15 +21,15 @@ def run_as_admin():
 def install_homebrew():
     print("Checking if Homebrew is installed...")
     try:
-        subprocess.run(["brew", "--version"], check=True)
+        run(["brew", "--version"], process_group=False)
         print("Homebrew is already installed.")
     except subprocess.CalledProcessError:
         print("Homebrew not found. Installing Homebrew...")
         try:
-            subprocess.run(
+            run(
                 '/bin/bash -c "$(curl -fsSL https://raw.githubusercontent.com/Homebrew/install/HEAD/install.sh)"',
                 shell=True,
-                check=True
+                process_group=False
             )
             print("Homebrew installation complete.")
         except subprocess.CalledProcessError as e:
@@ -37,12 +39,12 @@ def install_homebrew():
 def install_xcodes():
     print("Checking if 'xcodes' is installed...")
     try:
-        subprocess.run(["xcodes", "--version"], check=True)
+        run(["xcodes", "--version"], process_group=False)
         print("'xcodes' is already installed.")
     except subprocess.CalledProcessError:
         print("'xcodes' not found. Installing 'xcodes' via Homebrew...")
         try:
-            subprocess.run("brew install robotsandpencils/made/xcodes", shell=True, check=True)
+            run("brew install robotsandpencils/made/xcodes", shell=True, process_group=False)
             print("'xcodes' installation complete.")
         except subprocess.CalledProcessError as e:
             print(f"'xcodes' installation failed: {e}")
@@ -51,7 +53,7 @@ def install_xcodes():
 def install_xcode_version(version):
     print(f"Installing Xcode {version} using 'xcodes'...")
     try:
-        subprocess.run(f"xcodes install {version}", shell=True, check=True)
+        run(f"xcodes install {version}", shell=True, process_group=False)
         print(f"Xcode {version} installation complete.")
     except subprocess.CalledProcessError as e:
         print(f"Xcode {version} installation failed: {e}")
@@ -60,7 +62,7 @@ def install_xcode_version(version):
 def agree_to_license():
     print("Agreeing to Xcode license...")
     try:
-        subprocess.run("sudo xcodebuild -license accept", shell=True, check=True)
+        run("sudo xcodebuild -license accept", shell=True, process_group=False)
         print("Xcode license agreed.")
     except subprocess.CalledProcessError as e:
         print(f"Failed to agree to Xcode license: {e}")
@@ -69,8 +71,8 @@ def agree_to_license():
 def setup_xcode_for_unreal():
     print("Configuring Xcode for Unreal Engine development...")
     try:
-        subprocess.run("sudo xcode-select --switch /Applications/Xcode.app/Contents/Developer", shell=True, check=True)
-        subprocess.run("sudo xcodebuild -runFirstLaunch", shell=True, check=True)
+        run("sudo xcode-select --switch /Applications/Xcode.app/Contents/Developer", shell=True, process_group=False)
+        run("sudo xcodebuild -runFirstLaunch", shell=True, process_group=False)
         print("Xcode is now configured for Unreal Engine development.")
     except subprocess.CalledProcessError as e:
         print(f"Failed to configure Xcode: {e}")
@@ -0,0 +1,232 @@
+"""
+Append-only changelog journal.
+
+Each line of the journal is one JSON record: a version record (has "Version") opens a new version
+and change records (have "Change") add to the most recent one. The index file stores one
+"<offset> <version>" line per version record, so finding the current version only means reading the
+index's last line and the journal from that offset on, however long the history is.
+
+Writes to the journal and the index hold a lock file next to the journal, so concurrent
+`changelog --add-change` runs (e.g. parallel prebuild tasks) can't interleave records.
+"""
+import os
+import json
+
+from upm.fingerprint import file_lock
+
+JOURNAL_SEPARATORS = (',', ':')
+INDEX_CHUNK_SIZE = 4096
+
+def new_entry(record):
+    entry = {
+        "Version": record['Version'],
+        "PrereleaseType": record.get('PrereleaseType'),
+        "ReleaseDate": record.get('ReleaseDate'),
+        "Changes": []
+    }
+    if record.get('Commit'):
+        entry['Commit'] = record['Commit']
+    return entry
+
+def apply_change(entry, record):
+    entry['Changes'].append(record['Change'])
+    if record.get('ReleaseDate'):
+        entry['ReleaseDate'] = record['ReleaseDate']
+    if record.get('Commit'):
+        entry['Commit'] = record['Commit']
+
+class ChangelogJournal:
+    def __init__(self, path, index_path):
+        self.path = path
+        self.index_path = index_path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def lock(self):
+        return file_lock(self.path)
+
+    def append(self, records):
+        """Append records to the journal and index any version records among them."""
+        indexed = []
+        with self.lock():
+            with open(self.path, 'ab') as f:
+                offset = f.seek(0, os.SEEK_END)
+                if offset and not self._ends_with_newline():
+                    # Don't glue a new record onto a torn final line
+                    f.write(b'\n')
+                    offset += 1
+                for record in records:
+                    line = (json.dumps(record, separators=JOURNAL_SEPARATORS) + '\n').encode()
+                    if 'Version' in record:
+                        indexed.append((offset, record['Version']))
+                    f.write(line)
+                    offset += len(line)
+            if indexed:
+                self._append_index(indexed)
+
+    def add_version(self, entry):
+        record = {key: entry[key] for key in ('Version', 'PrereleaseType', 'ReleaseDate', 'Commit') if key in entry}
+        self.append([record])
+
+    def add_change(self, change, release_date=None, commit=None):
+        self.add_changes([change], release_date, commit)
+
+    def add_changes(self, changes, release_date=None, commit=None):
+        records = [{"Change": change} for change in changes]
+        # The latest change record carries the version's release date and commit
+        if release_date:
+            records[-1]['ReleaseDate'] = release_date
+        if commit:
+            records[-1]['Commit'] = commit
+        self.append(records)
+
+    def latest(self):
+        """Return the most recent version as a Changelog.json entry, or None for an empty journal."""
+        entries = self.tail(1)
+        return entries[-1] if entries else None
+
+    def tail(self, count):
+        """Return the last count versions (all if count is 0) as Changelog.json entries, oldest first."""
+        if not self.exists():
+            return []
+        offsets = self._tail_offsets(count)
+        if not offsets:
+            return []
+
+        # Reading everything starts at the top, so change records before the first version are caught
+        entries, read = self._read_entries(offsets[0] if count else 0)
+        if not all(offset in read for offset in offsets):
+            # An indexed offset isn't the start of a version record: the journal was rewritten or
+            # merged under the index. Rebuild it and read again.
+            offsets = [offset for offset, _ in self.rebuild_index()]
+            offsets = offsets[-count:] if count else offsets
+            if not offsets:
+                return []
+            entries, read = self._read_entries(offsets[0] if count else 0)
+
+        # Version records past the last indexed one were appended by something that didn't update the
+        # index (e.g. a merge)
+        discovered = [(offset, version) for offset, version in read.items() if offset > offsets[-1]]
+        if discovered:
+            with self.lock():
+                # Another process may have indexed them since we read the index
+                last = self._read_index_tail(1)
+                last_offset = last[-1][0] if last else -1
+                discovered = [(offset, version) for offset, version in discovered if offset > last_offset]
+                if discovered:
+                    self._append_index(discovered)
+        return entries[-count:] if count else entries
+
+    def entries(self):
+        """Materialize the whole journal in the Changelog.json format."""
+        if not self.exists():
+            return []
+        changelog, _ = self._read_entries(0)
+        return changelog
+
+    def import_changelog(self, changelog):
+        records = []
+        for entry in changelog:
+            records.append({key: entry[key] for key in ('Version', 'PrereleaseType', 'ReleaseDate', 'Commit') if key in entry})
+            records.extend({"Change": change} for change in entry.get('Changes', []))
+        self.append(records)
+
+    def rebuild_index(self):
+        """Rebuild the index from the journal and return its [(offset, version)] entries."""
+        indexed = []
+        with self.lock():
+            if self.exists():
+                with open(self.path, 'rb') as f:
+                    indexed = [(offset, record['Version']) for offset, record in self._read_records(f, 0) if 'Version' in record]
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            with open(self.index_path, 'w') as f:
+                f.writelines(f"{offset} {version}\n" for offset, version in indexed)
+        return indexed
+
+    def _read_entries(self, offset):
+        """
+        Read the journal from offset into Changelog.json entries. Returns the entries and
+        {offset: version} for the version records read.
+        """
+        entries = []
+        read = {}
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for record_offset, record in self._read_records(f, offset):
+                if 'Version' in record:
+                    read[record_offset] = record['Version']
+                    entries.append(new_entry(record))
+                elif entries:
+                    apply_change(entries[-1], record)
+                elif offset == 0:
+                    raise Exception(f"{self.path}: change record at offset {record_offset} comes before any version record")
+        return entries, read
+
+    def _read_records(self, f, offset):
+        for line in f:
+            if line.strip():
+                try:
+                    yield offset, json.loads(line)
+                except ValueError:
+                    # A torn final line from an interrupted write; skip it
+                    pass
+            offset += len(line)
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def _append_index(self, indexed):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        with open(self.index_path, 'a') as f:
+            f.writelines(f"{offset} {version}\n" for offset, version in indexed)
+
+    def _tail_offsets(self, count):
+        """Offsets of the last count indexed versions, rebuilding the index if it doesn't match the journal."""
+        indexed = self._read_index_tail(count)
+        if indexed:
+            offset, version = indexed[-1]
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                try:
+                    record = json.loads(f.readline())
+                except ValueError:
+                    record = None
+            if not (isinstance(record, dict) and record.get('Version') == version):
+                indexed = None
+        if not indexed:
+            indexed = self.rebuild_index()
+            if count:
+                indexed = indexed[-count:]
+        return [offset for offset, _ in indexed]
+
+    def _read_index_tail(self, count):
+        """Read the last count "<offset> <version>" lines of the index (all if count is 0)."""
+        try:
+            with open(self.index_path, 'rb') as f:
+                position = f.seek(0, os.SEEK_END)
+                data = b''
+                # Read backwards until we have enough complete lines
+                while position > 0 and (not count or data.count(b'\n') <= count):
+                    size = min(INDEX_CHUNK_SIZE, position)
+                    position -= size
+                    f.seek(position)
+                    data = f.read(size) + data
+        except FileNotFoundError:
+            return None
+
+        lines = data.decode().split('\n')
+        if position > 0:
+            # The first line may be partial
+            lines = lines[1:]
+        lines = [line for line in lines if line]
+        indexed = []
+        for line in lines[-count:] if count else lines:
+            offset, _, version = line.partition(' ')
+            try:
+                indexed.append((int(offset), version))
+            except ValueError:
+                return None
+        return indexed
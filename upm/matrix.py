@@ -0,0 +1,210 @@
+import time
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from upm.build import (
+    get_build_command,
+    check_build_cache,
+    record_build_cache,
+    invalidate_build_cache,
+    DEFAULT_BUILD_TYPE,
+    GAME_NAME_KEY,
+    EDITOR_NAME_KEY,
+    WAIT_MUTEX_FLAG,
+    NO_MUTEX_FLAG
+)
+from upm.buildlog import EventWriter, run_logged
+from upm.api import get_env
+
+TARGETS_KEY = 'targets'
+CONFIGS_KEY = 'configs'
+MATRIX_KEYS = (TARGETS_KEY, CONFIGS_KEY)
+DEFAULT_MATRIX_JOBS = 2
+
+print_lock = threading.Lock()
+
+def parse_matrix(specs):
+    """Parse ['targets=A,B', 'configs=X,Y'] (or 'targets=A,B;configs=X,Y') into a dict of lists."""
+    matrix = {}
+    for spec in specs:
+        for item in spec.split(';'):
+            if not item.strip():
+                continue
+            if '=' not in item:
+                raise Exception(f"Invalid matrix entry '{item}'; expected KEY=VALUE[,VALUE...]")
+            key, values = item.split('=', 1)
+            key = key.strip().lower()
+            if key not in MATRIX_KEYS:
+                raise Exception(f"Unknown matrix key '{key}'; expected one of {', '.join(MATRIX_KEYS)}")
+            matrix[key] = [value.strip() for value in values.split(',') if value.strip()]
+
+    if not matrix.get(TARGETS_KEY):
+        matrix[TARGETS_KEY] = [name for name in (get_env(GAME_NAME_KEY), get_env(EDITOR_NAME_KEY)) if name]
+    if not matrix.get(CONFIGS_KEY):
+        matrix[CONFIGS_KEY] = [DEFAULT_BUILD_TYPE]
+
+    if not matrix[TARGETS_KEY]:
+        raise Exception("No matrix targets given and no GAME_NAME/EDITOR_NAME found in environment")
+
+    return matrix
+
+def create_jobs(matrix, action):
+    return [
+        {
+            'target': target_name,
+            'build_type': build_type,
+            'action': action,
+            'status': 'pending',
+            'returncode': None,
+            'duration': 0.0,
+            'errors': 0,
+            'warnings': 0
+        }
+        for target_name in matrix[TARGETS_KEY]
+        for build_type in matrix[CONFIGS_KEY]
+    ]
+
+def schedule_jobs(jobs, action):
+    """
+    Group jobs into chains that must run one after another.
+
+    Builds of the same target share UHT-generated headers and the target makefile, so they are
+    serialized; different targets can overlap. Clean and package jobs (UAT drives its own UBT
+    invocations) touch shared state and always run as a single chain.
+    """
+    if action != 'build':
+        return [jobs]
+
+    chains = {}
+    for job in jobs:
+        chains.setdefault(job['target'], []).append(job)
+    return list(chains.values())
+
+def prefixed_output(label):
+    def output(line):
+        with print_lock:
+            print(f"[{label}] {line}", end='', flush=True)
+    return output
+
+def run_package_job(job, project_dir, label, mutex_flag, force=False, full_clean=False, events=None):
+    from upm.package import package_project
+
+    job['status'] = 'running'
+    start = time.perf_counter()
+    phases = []
+    try:
+        phases = package_project(project_dir, job['target'], job['build_type'], force=force, full_clean=full_clean,
+                                 events=events, label=label, output=prefixed_output(label), mutex_flag=mutex_flag)
+        job['returncode'] = 0
+    except subprocess.CalledProcessError as e:
+        job['returncode'] = e.returncode
+    except OSError as e:
+        with print_lock:
+            print(f"[{label}] Failed to start packaging: {e}")
+        job['returncode'] = -1
+    job['duration'] = time.perf_counter() - start
+    job['errors'] = sum(phase['errors'] for phase in phases)
+    job['warnings'] = sum(phase['warnings'] for phase in phases)
+    if job['returncode'] != 0:
+        job['status'] = 'failed'
+    elif all(phase['status'] == 'cached' for phase in phases):
+        job['status'] = 'cached'
+    else:
+        job['status'] = 'succeeded'
+
+def run_job(job, project_dir, mutex_flag, force=False, full_clean=False, events=None):
+    label = f"{job['target']} {job['build_type']}"
+
+    if job['action'] == 'build':
+        fingerprint, file_cache, up_to_date = check_build_cache(project_dir, job['target'], job['build_type'])
+        if up_to_date and not force:
+            with print_lock:
+                print(f"[{label}] Up to date; skipping build")
+            job['status'] = 'cached'
+            job['returncode'] = 0
+            return
+    elif job['action'] == 'clean':
+        invalidate_build_cache(project_dir, job['target'], job['build_type'])
+    elif job['action'] == 'package':
+        run_package_job(job, project_dir, label, mutex_flag, force=force, full_clean=full_clean, events=events)
+        return
+
+    subprocess_list = get_build_command(
+        project_dir,
+        job['target'],
+        build_type=job['build_type'],
+        build=job['action'] == 'build',
+        clean=job['action'] == 'clean',
+        mutex_flag=mutex_flag
+    )
+
+    job['status'] = 'running'
+    start = time.perf_counter()
+
+    try:
+        job['returncode'], parser = run_logged(subprocess_list, label=label, events=events, output=prefixed_output(label))
+        job['errors'] = parser.errors
+        job['warnings'] = parser.warnings
+    except OSError as e:
+        with print_lock:
+            print(f"[{label}] Failed to start {subprocess_list[0]}: {e}")
+        job['returncode'] = -1
+    job['duration'] = time.perf_counter() - start
+    job['status'] = 'succeeded' if job['returncode'] == 0 else 'failed'
+
+    if job['action'] == 'build' and job['status'] == 'succeeded':
+        record_build_cache(project_dir, job['target'], job['build_type'], fingerprint, file_cache)
+
+def run_chain(chain, project_dir, mutex_flag, force=False, full_clean=False, events=None):
+    for job in chain:
+        run_job(job, project_dir, mutex_flag, force=force, full_clean=full_clean, events=events)
+
+def print_summary(jobs, elapsed):
+    print("\nBuild matrix summary:")
+    target_width = max(len(job['target']) for job in jobs)
+    type_width = max(len(job['build_type']) for job in jobs)
+    for job in jobs:
+        print(f"  {job['target']:<{target_width}}  {job['build_type']:<{type_width}}  {job['action']:<7}  {job['status']:<9}  {job['duration']:7.1f}s  {job['errors']} errors, {job['warnings']} warnings")
+    failed = sum(1 for job in jobs if job['status'] == 'failed')
+    print(f"{len(jobs) - failed}/{len(jobs)} jobs succeeded in {elapsed:.1f}s")
+
+def build_matrix(project_dir, matrix, build=False, clean=False, package=False, jobs=None, force=False, full_clean=False, events_path=None):
+    if clean:
+        action = 'clean'
+    if build:
+        action = 'build'
+    if package:
+        action = 'package'
+        # As with a single target, --clean with --package means a full clean
+        full_clean = full_clean or clean
+    if not (clean or build or package):
+        raise Exception("No build action specified; use --clean, --build or --package")
+
+    if jobs is None:
+        jobs = DEFAULT_MATRIX_JOBS
+    if jobs < 1:
+        raise Exception("--jobs must be at least 1")
+
+    matrix_jobs = create_jobs(matrix, action)
+    chains = schedule_jobs(matrix_jobs, action)
+    workers = min(jobs, len(chains))
+
+    # Overlapping UBT instances would otherwise queue up behind UBT's single-instance mutex
+    mutex_flag = NO_MUTEX_FLAG if workers > 1 else WAIT_MUTEX_FLAG
+
+    print(f"Running {len(matrix_jobs)} {action} jobs in {len(chains)} chains on {workers} workers")
+
+    events = EventWriter(events_path) if events_path else None
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_chain, chain, project_dir, mutex_flag, force, full_clean, events) for chain in chains]
+            for future in futures:
+                future.result()
+    finally:
+        if events:
+            events.close()
+
+    print_summary(matrix_jobs, time.perf_counter() - start)
+    return matrix_jobs
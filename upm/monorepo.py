@@ -0,0 +1,90 @@
+"""
+Run `upm config` and `upm setup` for every Unreal project under a root directory.
+
+Projects are found by their .uproject files and processed concurrently on a bounded pool, each as a
+stage (see upm.stages), so one failing project doesn't stop the others and the run ends with a
+summary of all of them. Work the projects have in common happens once: they share a virtual
+environment (as with --shared-venv) and the wheelhouse, and UnrealBuildTool is built or restored
+once per engine.
+"""
+import os
+import copy
+
+from upm.fingerprint import EXCLUDED_DIRS
+from upm.stages import create_stage, run_stages, format_stage_summary
+
+DEFAULT_PROJECT_JOBS = 4
+# Projects don't nest, and these hold assets, plugins or engine copies rather than projects
+DISCOVERY_EXCLUDED_DIRS = EXCLUDED_DIRS | {'Content', 'Plugins', 'Source', 'Config', 'node_modules', '.venv', 'upm'}
+
+def discover_projects(root):
+    """Return the directories under root that contain a .uproject file, sorted."""
+    projects = []
+    pending = [os.path.abspath(root)]
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except (PermissionError, FileNotFoundError):
+            continue
+        if any(entry.is_file() and entry.name.endswith('.uproject') for entry in entries):
+            projects.append(directory)
+            continue
+        pending.extend(
+            entry.path for entry in entries
+            if entry.is_dir(follow_symlinks=False) and entry.name not in DISCOVERY_EXCLUDED_DIRS and not entry.name.startswith('.')
+        )
+    return sorted(projects)
+
+def get_project_name(project_dir):
+    for name in sorted(os.listdir(project_dir)):
+        if name.endswith('.uproject'):
+            return name[:-len('.uproject')]
+    return os.path.basename(project_dir)
+
+def run_projects(root, title, run, jobs=None):
+    """Call run(project_dir) for each project under root. Returns the project stages."""
+    projects = discover_projects(root)
+    if not projects:
+        raise Exception(f"No .uproject files found under {root}")
+    print(f"Found {len(projects)} project{'s' if len(projects) != 1 else ''} under {root}")
+
+    stages = [
+        create_stage(os.path.relpath(project_dir, root), lambda project_dir=project_dir: run(project_dir))
+        for project_dir in projects
+    ]
+    run_stages(stages, jobs=jobs or DEFAULT_PROJECT_JOBS)
+    failed = sum(1 for stage in stages if stage['status'] != 'done')
+    print(format_stage_summary(stages, f"{title} ({len(stages)} projects, {failed} failed)"))
+    return stages
+
+def config_all(args):
+    from upm.config import config
+
+    def run(project_dir):
+        project_args = copy.copy(args)
+        project_args.dir = project_dir
+        project_args.project_name = get_project_name(project_dir)
+        if not args.shared_names:
+            # Each project's targets and workspace are named after its own .uproject
+            project_args.game_name = project_args.project_name
+            project_args.editor_name = None
+            project_args.workspace = f"{project_args.project_name}.code-workspace"
+        config(project_args)
+    return run_projects(args.root, 'Config summary', run, jobs=args.jobs)
+
+def setup_all(args):
+    from upm.setup import setup
+
+    project_args = copy.copy(args)
+    # One venv for every project with the same requirements instead of one each
+    project_args.shared_venv = True
+    # Each project's own stages run one at a time; --jobs bounds the projects instead
+    project_args.jobs = 1
+
+    def run(project_dir):
+        stages = setup(project_args, project_dir)
+        failed = [stage['name'] for stage in stages if stage['status'] != 'done']
+        if failed:
+            raise Exception(f"{', '.join(failed)} failed")
+    return run_projects(args.root, 'Setup summary', run, jobs=args.jobs)
@@ -0,0 +1,217 @@
+"""
+Phase-split packaging for `upm build --package`.
+
+Instead of one BuildCookRun that builds, cooks, stages and archives from a clean slate, each phase
+runs as its own BuildCookRun invocation:
+
+    build    compile editor and target    inputs: Source/, plugin sources, the .uproject, the engine
+    cook     cook content                 inputs: Content/, Config/, plugin content and .uplugin files, the .uproject, the engine
+    stage    stage, pak/IoStore, package  inputs: the build and cook outputs, Config/
+    archive  copy to Packages/<OS>        inputs: the stage outputs
+
+Each phase records a fingerprint of its inputs and a manifest of its outputs (the size and mtime of
+every file in its output directory) in Intermediate/UPM/PackageCache.json. A phase is skipped while
+its inputs are unchanged and its outputs are as it left them, so a code-only change rebuilds and
+restages without recooking. --full-clean cleans the build and cook and runs every phase.
+
+The cook runs the project's editor modules, which a single `BuildCookRun -build -cook` builds as a
+side effect. With the cook in its own invocation, the build phase builds the editor target through
+UBT first; its binaries are under Binaries/<Platform> with the target's, so they're part of the
+build phase's output manifest.
+
+Content/ and Config/ are fingerprinted through the content index (see upm.contentindex), so a
+project with many assets doesn't re-hash them to find out nothing changed. When only Content/
+changed since the last cook, and the cooked output is as the cook left it, the cook runs with
+-iterativecooking so UAT only recooks the changed packages.
+"""
+import os
+import time
+import platform
+import subprocess
+
+from upm.build import (
+    UNREAL_PATH_KEY,
+    EDITOR_NAME_KEY,
+    ARCHIVE_DIRECTORY,
+    WAIT_MUTEX_FLAG,
+    get_platform_name,
+    get_project_filepath,
+    get_engine_version,
+    get_build_inputs,
+    get_build_cache_key,
+    get_build_command,
+    get_package_script
+)
+from upm.buildlog import run_logged, write_line
+from upm.contentindex import refresh_index, get_index_digest
+from upm.fingerprint import (
+    get_cache_path,
+    iter_files,
+    fingerprint_files,
+    prune_file_cache,
+    load_manifest,
+    update_manifest,
+    get_output_manifest
+)
+from upm.stages import format_stage_summary
+from upm.timing import span
+from upm.api import get_env
+
+PACKAGE_CACHE_FILENAME = 'PackageCache.json'
+PHASES = ('build', 'cook', 'stage', 'archive')
+# Cooked and staged content is laid out by cook platform rather than build platform
+COOK_PLATFORM_NAMES = {'Win64': 'Windows', 'Mac': 'Mac', 'Linux': 'Linux'}
+
+def get_cook_platform_name():
+    return COOK_PLATFORM_NAMES[get_platform_name()]
+
+def get_archive_dir(project_dir):
+    return os.path.join(project_dir, ARCHIVE_DIRECTORY, platform.system())
+
+def get_output_dir(project_dir, phase):
+    if phase == 'build':
+        return os.path.join(project_dir, 'Binaries', get_platform_name())
+    if phase == 'cook':
+        return os.path.join(project_dir, 'Saved', 'Cooked', get_cook_platform_name())
+    if phase == 'stage':
+        return os.path.join(project_dir, 'Saved', 'StagedBuilds', get_cook_platform_name())
+    return get_archive_dir(project_dir)
+
+def get_phase_args(project_dir, phase, full_clean=False, iterative=False):
+    clean = ['-clean'] if full_clean else []
+    if phase == 'build':
+        return ['-build', *clean]
+    if phase == 'cook':
+        return ['-cook', *clean, *(['-iterativecooking'] if iterative else [])]
+    if phase == 'stage':
+        return ['-skipcook', '-stage', '-pak', '-iostore', '-package', '-prereqs', '-manifests']
+    return ['-skipcook', '-skipstage', '-archive', f"-archivedirectory={get_archive_dir(project_dir)}"]
+
+def get_phase_commands(project_dir, target_name, build_type, phase, full_clean=False, iterative=False, mutex_flag=WAIT_MUTEX_FLAG):
+    """Return the commands a phase runs, in order."""
+    unreal_path = get_env(UNREAL_PATH_KEY)
+    if unreal_path is None:
+        raise Exception(f"Environment variable {UNREAL_PATH_KEY} not set")
+    commands = []
+    editor_name = get_env(EDITOR_NAME_KEY)
+    if phase == 'build' and editor_name:
+        # The cook loads the project's editor modules, so they must be built from the same sources
+        commands.append(get_build_command(project_dir, editor_name, build=True, mutex_flag=mutex_flag))
+    commands.append([
+        get_package_script(unreal_path),
+        'BuildCookRun',
+        '-noP4',
+        '-utf8output',
+        f"-project={get_project_filepath(project_dir)}",
+        f"-target={target_name}",
+        f"-platform={get_platform_name()}",
+        f"-clientconfig={build_type}",
+        *get_phase_args(project_dir, phase, full_clean, iterative),
+        '-nocompileuat',
+        mutex_flag
+    ])
+    return commands
+
+def get_cook_inputs(project_dir):
+    """Yield the cook inputs outside the content index: the .uproject, plugin content and .uplugin files."""
+    yield get_project_filepath(project_dir)
+    for path in iter_files(os.path.join(project_dir, 'Plugins')):
+        parts = os.path.relpath(path, project_dir).split(os.sep)
+        if 'Content' in parts or path.endswith('.uplugin'):
+            yield path
+
+def fingerprint_phase(project_dir, target_name, build_type, phase, file_cache, outputs, config):
+    """
+    Fingerprint a phase's inputs; outputs holds the output manifest digests of the phases before it and
+    config the content index digest of Config/. The cook fingerprint leaves out Content/, which is
+    recorded separately so a content-only change can cook iteratively.
+    """
+    extra = (phase, target_name, build_type, get_platform_name(), get_engine_version(get_env(UNREAL_PATH_KEY)))
+    if phase == 'build':
+        paths = get_build_inputs(project_dir)
+    elif phase == 'cook':
+        paths = get_cook_inputs(project_dir)
+        extra += (config,)
+    elif phase == 'stage':
+        paths = []
+        extra += (config, outputs['build'], outputs['cook'])
+    else:
+        paths = []
+        extra += (outputs['stage'], get_archive_dir(project_dir))
+    return fingerprint_files(project_dir, paths, file_cache, extra=extra)
+
+def package_project(project_dir, target_name, build_type, force=False, full_clean=False, events=None,
+                    label=None, output=write_line, mutex_flag=WAIT_MUTEX_FLAG):
+    """
+    Run the packaging phases that are out of date. Returns the phases as stage dicts (see upm.stages),
+    with status 'cached' for phases that were skipped.
+
+    Raises subprocess.CalledProcessError if a phase fails; the phases before it stay recorded.
+    """
+    if target_name == get_env(EDITOR_NAME_KEY):
+        raise Exception("Cannot package editor target")
+
+    cache_path = get_cache_path(project_dir, PACKAGE_CACHE_FILENAME)
+    cache_key = get_build_cache_key(target_name, build_type)
+    manifest = load_manifest(cache_path)
+    file_cache = manifest.get('files', {})
+    recorded = manifest.get('packages', {}).get(cache_key, {})
+    print(f"Packaging {target_name} {build_type} with Unreal Engine at {get_env(UNREAL_PATH_KEY)}"
+          f"{' (full clean)' if full_clean else ''}")
+
+    with span('refresh content index', category='cache'):
+        index = refresh_index(project_dir)
+        config = get_index_digest(project_dir, 'Config')
+        content = get_index_digest(project_dir, 'Content')
+    print(f"Content index: {index['files']} files, {index['hashed']} hashed, "
+          f"{len(index['changed'])} changed and {len(index['removed'])} removed since the last scan")
+
+    phases = [{'name': phase, 'status': 'pending', 'duration': 0.0, 'error': None, 'errors': 0, 'warnings': 0} for phase in PHASES]
+    outputs = {}
+    for index, (phase, result) in enumerate(zip(PHASES, phases)):
+        output_dir = get_output_dir(project_dir, phase)
+        with span(f"fingerprint {phase} inputs", category='cache'):
+            inputs = fingerprint_phase(project_dir, target_name, build_type, phase, file_cache, outputs, config)
+            current = get_output_manifest(output_dir)
+        previous = recorded.get(phase, {})
+        # Only the cook reads Content/ directly; every later phase sees it through the cook's outputs
+        phase_content = content if phase == 'cook' else None
+        intact = previous.get('inputs') == inputs and previous.get('outputs') == current['digest']
+        if not (force or full_clean) and intact and previous.get('content') == phase_content:
+            print(f"{phase.capitalize()}: unchanged since the last package; skipping")
+            result['status'] = 'cached'
+            outputs[phase] = current['digest']
+            continue
+
+        iterative = phase == 'cook' and not (force or full_clean) and intact and previous.get('content') is not None
+        if iterative:
+            print("Cook: only Content/ changed since the last cook; cooking iteratively")
+        start = time.perf_counter()
+        for command in get_phase_commands(project_dir, target_name, build_type, phase, full_clean, iterative, mutex_flag):
+            returncode, parser = run_logged(command, label=label, events=events, output=output)
+            result['duration'] = time.perf_counter() - start
+            result['errors'] += parser.errors
+            result['warnings'] += parser.warnings
+            print(parser.format_summary())
+            if returncode != 0:
+                result['status'] = 'failed'
+                result['error'] = f"exit code {returncode}"
+                for later in phases[index + 1:]:
+                    later['status'] = 'skipped'
+                print(format_stage_summary(phases, f"Package summary ({target_name} {build_type})"))
+                raise subprocess.CalledProcessError(returncode, command)
+
+        result['status'] = 'done'
+        current = get_output_manifest(output_dir)
+        outputs[phase] = current['digest']
+        record = {'inputs': inputs, 'content': phase_content, 'outputs': current['digest'], 'files': current['files']}
+
+        def update(manifest, phase=phase, record=record):
+            manifest.setdefault('packages', {}).setdefault(cache_key, {})[phase] = record
+            manifest.setdefault('files', {}).update(file_cache)
+            prune_file_cache(manifest['files'], project_dir)
+        # Recorded as each phase finishes, so a failure later on doesn't redo this one
+        update_manifest(cache_path, update)
+
+    print(format_stage_summary(phases, f"Package summary ({target_name} {build_type})"))
+    return phases
@@ -0,0 +1,221 @@
+"""
+Process runner shared by every upm command that starts a tool (UBT, UAT, dotnet, pip, git, installers).
+
+Commands run on asyncio. run() runs one command from ordinary, blocking code, including worker threads
+(stages, build matrix, daemon); each call gets its own event loop. run_all() runs several commands in
+one loop, at most `jobs` at a time, and aggregates their exit statuses.
+
+Each command:
+
+- gets its own process group (unless process_group=False), so a timeout, Ctrl+C or terminate_all()
+  stops the whole process tree (UBT's compilers, pip's build backends), not just the direct child,
+- may have a timeout, after which the tree is terminated and subprocess.TimeoutExpired is raised,
+- streams stdout and stderr line by line to on_output/on_error callbacks and can capture stdout,
+- reports failures as subprocess.CalledProcessError when check=True, as subprocess.check_call did.
+
+Results are dicts with command, returncode, output (captured stdout or None) and duration.
+"""
+import os
+import sys
+import time
+import signal
+import asyncio
+import platform
+import threading
+import subprocess
+
+# Time a terminated process tree gets to exit before it's killed
+TERMINATE_GRACE_SECONDS = 5.0
+# Longest output line read in one piece; UBT can print very long command lines
+MAX_LINE_LENGTH = 1024 * 1024
+ENCODING = 'utf-8'
+
+system = platform.system()
+
+# Running process trees, so terminate_all() can stop them from any thread
+live_processes = set()
+live_lock = threading.Lock()
+
+def get_group_kwargs(process_group):
+    if not process_group:
+        return {}
+    if system == 'Windows':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    # A new process group in the same session; the child can still use the terminal's stdout and stderr
+    if sys.version_info >= (3, 11):
+        return {'process_group': 0}
+    return {'preexec_fn': os.setpgrp}
+
+def signal_tree(pid, process_group, force=False):
+    """Ask a process tree to stop, or with force=True kill it."""
+    try:
+        if system == 'Windows':
+            subprocess.call(
+                ['taskkill', '/T', '/PID', str(pid)] + (['/F'] if force else []),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+        elif process_group:
+            os.killpg(pid, signal.SIGKILL if force else signal.SIGTERM)
+        else:
+            os.kill(pid, signal.SIGKILL if force else signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def terminate_all():
+    """Stop every process tree started through this module, e.g. when the main thread is interrupted."""
+    with live_lock:
+        processes = list(live_processes)
+    for pid, process_group in processes:
+        signal_tree(pid, process_group)
+    return len(processes)
+
+async def stop_process(process, process_group):
+    signal_tree(process.pid, process_group)
+    try:
+        await asyncio.wait_for(process.wait(), TERMINATE_GRACE_SECONDS)
+    except asyncio.TimeoutError:
+        signal_tree(process.pid, process_group, force=True)
+        await process.wait()
+
+async def read_lines(stream, callback, captured):
+    while True:
+        try:
+            data = await stream.readuntil(b'\n')
+        except asyncio.IncompleteReadError as e:
+            # End of stream; the last line may have no newline
+            data = e.partial
+        except asyncio.LimitOverrunError as e:
+            # A line longer than MAX_LINE_LENGTH stays buffered; pass it on in pieces rather than lose it
+            data = await stream.read(e.consumed)
+        if not data:
+            return
+        # As text=True would, so lines end in '\n' on every platform
+        line = data.decode(ENCODING, errors='replace').replace('\r\n', '\n')
+        if captured is not None:
+            captured.append(line)
+        if callback:
+            callback(line)
+
+async def run_async(command, cwd=None, env=None, timeout=None, on_output=None, on_error=None, capture=False,
+                    stdout=None, stderr=None, shell=False, check=True, process_group=True):
+    """
+    Run command and return its result dict.
+
+    stdout and stderr are inherited unless they're streamed (on_output, on_error, capture) or set to
+    subprocess.DEVNULL; stderr=subprocess.STDOUT merges stderr into the stdout stream. Pass
+    process_group=False for interactive commands that read from the terminal (sudo, installers).
+    """
+    if on_output or capture:
+        stdout = subprocess.PIPE
+    if on_error:
+        stderr = subprocess.PIPE
+    kwargs = dict(
+        cwd=cwd,
+        env=env,
+        stdin=None if not process_group else subprocess.DEVNULL,
+        stdout=stdout,
+        stderr=stderr,
+        limit=MAX_LINE_LENGTH,
+        **get_group_kwargs(process_group)
+    )
+
+    start = time.monotonic()
+    if shell:
+        if not isinstance(command, str):
+            # As subprocess does on Windows
+            command = subprocess.list2cmdline(command)
+        process = await asyncio.create_subprocess_shell(command, **kwargs)
+    else:
+        process = await asyncio.create_subprocess_exec(*command, **kwargs)
+    entry = (process.pid, process_group)
+    with live_lock:
+        live_processes.add(entry)
+
+    captured = [] if capture else None
+    readers = []
+    if process.stdout is not None:
+        readers.append(read_lines(process.stdout, on_output, captured))
+    if process.stderr is not None:
+        readers.append(read_lines(process.stderr, on_error, None))
+
+    async def communicate():
+        await asyncio.gather(*readers)
+        return await process.wait()
+
+    try:
+        returncode = await asyncio.wait_for(communicate(), timeout)
+    except asyncio.TimeoutError:
+        await stop_process(process, process_group)
+        raise subprocess.TimeoutExpired(command, timeout, output=''.join(captured) if captured is not None else None)
+    except asyncio.CancelledError:
+        # Ctrl+C, or a run_all sibling failed; don't leave the tree running
+        await stop_process(process, process_group)
+        raise
+    finally:
+        with live_lock:
+            live_processes.discard(entry)
+
+    result = {
+        'command': command,
+        'returncode': returncode,
+        'output': ''.join(captured) if captured is not None else None,
+        'duration': round(time.monotonic() - start, 3)
+    }
+    if check and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command, output=result['output'])
+    return result
+
+def run(command, **kwargs):
+    """Run command from blocking code; see run_async for the arguments."""
+    return asyncio.run(run_async(command, **kwargs))
+
+def output_of(command, **kwargs):
+    """Return the command's stdout, stripped, like subprocess.check_output(...).strip().decode()."""
+    return run(command, capture=True, **kwargs)['output'].strip()
+
+async def run_all_async(commands, jobs=None, fail_fast=False):
+    semaphore = asyncio.Semaphore(jobs or os.cpu_count() or 1)
+
+    async def run_one(spec):
+        spec = dict(spec)
+        command = spec.pop('command')
+        async with semaphore:
+            try:
+                return await run_async(command, **dict(spec, check=False))
+            except (OSError, subprocess.TimeoutExpired) as e:
+                return {'command': command, 'returncode': None, 'output': None, 'duration': None, 'error': f"{type(e).__name__}: {e}"}
+
+    tasks = [asyncio.ensure_future(run_one(spec)) for spec in commands]
+    if not fail_fast:
+        return await asyncio.gather(*tasks)
+
+    for future in asyncio.as_completed(tasks):
+        result = await future
+        if result['returncode'] != 0:
+            for task in tasks:
+                task.cancel()
+            break
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    return [
+        {'command': spec['command'], 'returncode': None, 'output': None, 'duration': None, 'error': 'cancelled'}
+        if isinstance(result, asyncio.CancelledError) else result
+        for spec, result in zip(commands, results)
+    ]
+
+def run_all(commands, jobs=None, fail_fast=False):
+    """
+    Run commands side by side and return their results in order.
+
+    Each command is a dict of run_async arguments with a 'command' key. Failures don't raise: a result
+    has returncode None and an 'error' if the command couldn't run or timed out. With fail_fast, the
+    first failure cancels the commands still running.
+    """
+    return asyncio.run(run_all_async(commands, jobs, fail_fast))
+
+def get_exit_status(results):
+    """Return 0 if every command succeeded, otherwise the first failing exit code (1 if it didn't exit)."""
+    for result in results:
+        if result['returncode'] != 0:
+            return result['returncode'] or 1
+    return 0
@@ -1,11 +1,14 @@
 import os
+import sys
 import argparse
-from dotenv import load_dotenv
 
-DOTENV_PATH = '.env'
-UNREAL_PATH_KEY = 'UNREAL_PATH'
+if __name__ == "__main__" and __package__ in (None, ''):
+    # Running as a script; make sibling modules importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from upm.api import get_env
 
-load_dotenv(DOTENV_PATH)
+UNREAL_PATH_KEY = 'UNREAL_PATH'
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Query project environment.")
@@ -15,4 +18,4 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     if args.unreal_path:
-        print(os.getenv(UNREAL_PATH_KEY))
\ No newline at end of file
+        print(get_env(UNREAL_PATH_KEY))
\ No newline at end of file
@@ -1,48 +1,41 @@
 import os
 import platform
 import subprocess
-import sys
 import json
 
+from upm.timing import span
+from upm.process import run, run_all, get_exit_status
+from upm.build import PLUGIN_EXCLUDED_DIRS, get_engine_version
+from upm.ubtcache import UbtCache, get_dotnet_version
+from upm.fingerprint import EXCLUDED_DIRS, get_cache_path, iter_files, fingerprint_files, prune_file_cache, load_manifest, save_manifest
+from upm.stages import create_stage, run_stages, format_stage_summary
+from upm.venvs import (create_virtualenv, install_dependencies, ensure_shared_venv, get_requirements_key,
+                       check_venv, describe_drift, is_link, remove_venv, get_shared_venv_path)
+from upm.wheelhouse import get_wheelhouse_dir, is_synced
+
 PROJECT_NAME_KEY = "PROJECT_NAME"
 GAME_NAME_KEY = "GAME_NAME"
 EDITOR_NAME_KEY = "EDITOR_NAME"
 WORKSPACE_NAME_KEY = "WORKSPACE_NAME"
 UNREAL_PATH_KEY = "UNREAL_PATH"
 CHANGELOG_FILENAME_KEY = "CHANGELOG_FILENAME"
+CHANGELOG_BACKEND_KEY = "CHANGELOG_BACKEND"
 VENV_DIR = ".venv"
 DOTENV_FILE = '.env'
 VSCODE_DIR = '.vscode'
-CONFIG_PATH = os.path.join(os.getcwd(),'config.upm')
-LAUNCH_TEMPLATE_PATH = os.path.join(os.getcwd(), 'upm', 'launch.upm')
-TASKS_TEMPLATE_PATH = os.path.join(os.getcwd(), 'upm', 'tasks.upm')
+CONFIG_FILENAME = 'config.upm'
+LAUNCH_TEMPLATE_PATH = os.path.join('upm', 'launch.upm')
+TASKS_TEMPLATE_PATH = os.path.join('upm', 'tasks.upm')
 REQUIREMENTS_FILE = 'requirements.txt'
+PROJECT_FILES_CACHE_FILENAME = 'ProjectFiles.json'
+# Files whose contents UBT reads when generating project files; other source files only matter by path
+PROJECT_RULES_SUFFIXES = ('.uproject', '.uplugin', '.Build.cs', '.Target.cs')
 
 UBT_SOURCE_PATH = os.path.join('Engine', 'Source', 'Programs', 'UnrealBuildTool')
 UBT_EXEC_PATH = os.path.join('Engine', 'Binaries', 'DotNET', 'UnrealBuildTool', 'UnrealBuildTool.exe')
+UBT_LINUX_EXEC_PATH = os.path.join('Engine', 'Binaries', 'DotNET', 'UnrealBuildTool', 'UnrealBuildTool')
 
-def create_virtualenv(venv_path):
-    print(f'Creating virtual environment at {venv_path}...')
-    if not os.path.exists(venv_path):
-        subprocess.check_call([sys.executable, '-m', 'venv', venv_path])
-        print(f'Created virtual environment at {venv_path}')
-    else:
-        print(f'Virtual environment already exists at {venv_path}')
-
-def install_dependencies(venv_path, requirements_file):
-    system = platform.system()
-
-    if system == 'Windows':
-        python_executable = os.path.join(venv_path, 'Scripts', 'python')
-    elif system == 'Darwin':  # macOS
-        python_executable = os.path.join(venv_path, 'bin', 'python3')
-    else:  # Assuming Linux or other Unix-like OS
-        python_executable = os.path.join(venv_path, 'bin', 'python3')
-
-    subprocess.check_call([python_executable, '-m', 'pip', 'install', '-r', requirements_file])
-    print(f'Installed dependencies from {requirements_file}')
-
-def load_config(config_file):
+def load_config(config_file, project_dir='.'):
     config = None
     with open(config_file, 'r') as f:
         config = json.load(f)
@@ -55,17 +48,17 @@ def load_config(config_file):
     env_vars = config[system]
 
 
-    with open(DOTENV_FILE, 'w') as env_file:
+    with open(os.path.join(project_dir, DOTENV_FILE), 'w') as env_file:
         for key, value in env_vars.items():
             env_file.write(f"{key}={value}\n")
 
     return env_vars
 
-def create_launch_tasks(env_vars):
+def create_launch_tasks(env_vars, project_dir='.'):
+    project_dir = os.path.abspath(project_dir)
     # Ensure the .vscode directory exists
-    vscode_dir = os.path.join(os.getcwd(), '.vscode')
-    if not os.path.exists(vscode_dir):
-        os.makedirs(vscode_dir)
+    vscode_dir = os.path.join(project_dir, '.vscode')
+    os.makedirs(vscode_dir, exist_ok=True)
 
     project_name = env_vars[PROJECT_NAME_KEY]
 
@@ -73,22 +66,22 @@ def create_launch_tasks(env_vars):
 
     if system == 'Windows':
         editor_path = os.path.join(env_vars[UNREAL_PATH_KEY], 'Engine', 'Binaries', 'Win64', 'UnrealEditor.exe')
-        exec_path = os.path.join(os.getcwd(), 'Binaries', 'Win64', f"{env_vars[GAME_NAME_KEY]}.exe")
+        exec_path = os.path.join(project_dir, 'Binaries', 'Win64', f"{env_vars[GAME_NAME_KEY]}.exe")
         visualizer_path = os.path.join(env_vars[UNREAL_PATH_KEY], 'Engine', 'Extras', 'VisualStudioDebugging', 'Unreal.natvis')
         type_val = "cppvsdbg"
     elif system == 'Darwin':  # macOS
         editor_path = os.path.join(env_vars[UNREAL_PATH_KEY], 'Engine', 'Binaries', 'Mac', 'UnrealEditor.app', 'Contents', 'MacOS', 'UnrealEditor')
-        exec_path = os.path.join(os.getcwd(), 'Binaries', 'Mac', f"{project_name}.app", 'Contents', 'MacOS', f"{env_vars[GAME_NAME_KEY]}")
+        exec_path = os.path.join(project_dir, 'Binaries', 'Mac', f"{project_name}.app", 'Contents', 'MacOS', f"{env_vars[GAME_NAME_KEY]}")
         type_val = "lldb"
         visualizer_path = None
     else:  # Assuming Linux or other Unix-like OS
         editor_path = os.path.join(env_vars[UNREAL_PATH_KEY], 'Engine', 'Binaries', 'Linux', 'UnrealEditor')
-        exec_path = os.path.join(os.getcwd(), 'Binaries', 'Linux', f"{project_name}")
+        exec_path = os.path.join(project_dir, 'Binaries', 'Linux', f"{project_name}")
         type_val = "lldb"
         visualizer_path = None
     
     launch_tasks = None
-    with open(LAUNCH_TEMPLATE_PATH, 'r') as f:
+    with open(os.path.join(project_dir, LAUNCH_TEMPLATE_PATH), 'r') as f:
         launch_tasks = json.load(f)
 
     launch_tasks['configurations'].append({
@@ -96,7 +89,7 @@ def create_launch_tasks(env_vars):
         "request": "launch",
         "program": editor_path,
         "args": [
-            os.path.join(os.getcwd(), f"{project_name}.uproject")
+            os.path.join(project_dir, f"{project_name}.uproject")
         ],
         "stopAtEntry": False,
         "console": "integratedTerminal",
@@ -127,40 +120,44 @@ def create_launch_tasks(env_vars):
     print(f'Created launch tasks in {os.path.join(vscode_dir, "launch.json")}')
     return launch_tasks
 
-def create_build_tasks(env_vars):
+def create_build_tasks(env_vars, project_dir='.'):
+    project_dir = os.path.abspath(project_dir)
     # Ensure the .vscode directory exists
-    vscode_dir = os.path.join(os.getcwd(), '.vscode')
-    if not os.path.exists(vscode_dir):
-        os.makedirs(vscode_dir)
+    vscode_dir = os.path.join(project_dir, '.vscode')
+    os.makedirs(vscode_dir, exist_ok=True)
 
     project_name = env_vars[PROJECT_NAME_KEY]
 
-    build_script = os.path.join(os.getcwd(), 'upm', 'build.py')
-    changelog_script = os.path.join(os.getcwd(), 'upm', 'changelog.py')
+    # Build tasks go through the daemon client so repeated builds skip interpreter and config startup
+    client_script = os.path.join(project_dir, 'upm', 'client.py')
+    changelog_script = os.path.join(project_dir, 'upm', 'changelog.py')
+
+    # The prebuild copies Changelog.json into Content, so materialize it from the journal first
+    export_flag = " --export" if env_vars.get(CHANGELOG_BACKEND_KEY) == 'journal' else ""
 
     system = platform.system()
 
     if system == 'Windows':
-        python_cmd = os.path.join(os.getcwd(), VENV_DIR, 'Scripts', 'python')
+        python_cmd = os.path.join(project_dir, VENV_DIR, 'Scripts', 'python')
         
         shell_cmd = 'powershell'
         prebuild_args = [
             "/c",
-            f"{python_cmd} {changelog_script} --update-ini && {python_cmd} {changelog_script} --update-readme && copy {env_vars[CHANGELOG_FILENAME_KEY]} {os.path.join('.', 'Content', project_name, 'Data')}"
+            f"{python_cmd} {changelog_script} --update-ini && {python_cmd} {changelog_script} --update-readme{export_flag} && copy {env_vars[CHANGELOG_FILENAME_KEY]} {os.path.join('.', 'Content', project_name, 'Data')}"
         ]
     elif system == 'Darwin':  # macOS
-        python_cmd = os.path.join(os.getcwd(), VENV_DIR, 'bin', 'python')
+        python_cmd = os.path.join(project_dir, VENV_DIR, 'bin', 'python')
         shell_cmd = 'sh'
         prebuild_args = [
-            f"{python_cmd} {changelog_script} --update-ini && {python_cmd} {changelog_script} --update-readme && cp {env_vars[CHANGELOG_FILENAME_KEY]} {os.path.join('.', 'Content', project_name, 'Data')}"
+            f"{python_cmd} {changelog_script} --update-ini && {python_cmd} {changelog_script} --update-readme{export_flag} && cp {env_vars[CHANGELOG_FILENAME_KEY]} {os.path.join('.', 'Content', project_name, 'Data')}"
         ]
     else:  # Assuming Linux or other Unix-like OS
-        python_cmd = os.path.join(os.getcwd(), VENV_DIR, 'bin', 'python')
+        python_cmd = os.path.join(project_dir, VENV_DIR, 'bin', 'python')
         shell_cmd = 'sh'
         prebuild_args = []
 
     build_tasks = None
-    with open(TASKS_TEMPLATE_PATH, 'r') as f:
+    with open(os.path.join(project_dir, TASKS_TEMPLATE_PATH), 'r') as f:
         build_tasks = json.load(f)
 
     build_tasks['tasks'].append({
@@ -168,7 +165,8 @@ def create_build_tasks(env_vars):
         "group": "build",
         "command": python_cmd,
         "args": [
-            build_script,
+            client_script,
+            "build",
             "--build-type",
             '${input:buildType}',
             "--target-name",
@@ -176,6 +174,9 @@ def create_build_tasks(env_vars):
             "--project-dir",
             "${workspaceFolder}",
             "--build",
+            "--start-daemon",
+            "--priority",
+            "interactive",
         ],
         "problemMatcher": "$msCompile",
         "type": "shell"
@@ -186,7 +187,8 @@ def create_build_tasks(env_vars):
         "group": "build",
         "command": python_cmd,
         "args": [
-            build_script,
+            client_script,
+            "build",
             "--build-type",
             '${input:buildType}',
             "--target-name",
@@ -194,6 +196,9 @@ def create_build_tasks(env_vars):
             "--project-dir",
             "${workspaceFolder}",
             "--clean",
+            "--start-daemon",
+            "--priority",
+            "interactive",
         ],
         "problemMatcher": "$msCompile",
         "type": "shell"
@@ -204,7 +209,8 @@ def create_build_tasks(env_vars):
         "group": "build",
         "command": python_cmd,
         "args": [
-            build_script,
+            client_script,
+            "build",
             "--build-type",
             'Development',
             "--target-name",
@@ -212,6 +218,9 @@ def create_build_tasks(env_vars):
             "--project-dir",
             "${workspaceFolder}",
             "--package",
+            "--start-daemon",
+            "--priority",
+            "batch",
         ],
         "problemMatcher": "$msCompile",
         "type": "shell"
@@ -315,7 +324,7 @@ def create_build_tasks(env_vars):
     print(f'Created build tasks in {os.path.join(vscode_dir, "build.json")}')
     return build_tasks
 
-def create_code_workspace(env_vars):
+def create_code_workspace(env_vars, project_dir='.'):
     project_name = env_vars[PROJECT_NAME_KEY]
     workspace_name = env_vars[WORKSPACE_NAME_KEY]
 
@@ -363,7 +372,7 @@ def create_code_workspace(env_vars):
     }
 
     # Write the workspace file
-    workspace_file = os.path.join(os.getcwd(), f"{workspace_name}")
+    workspace_file = os.path.join(os.path.abspath(project_dir), f"{workspace_name}")
     with open(workspace_file, 'w') as fp:
         json.dump(code_workspace, fp, indent=4)
 
@@ -387,23 +396,21 @@ def build_unreal_build_tool(env_vars):
         'Development', 
     ]
     try:
-        subprocess.check_call(subprocess_list, cwd=os.path.join(unreal_path, UBT_SOURCE_PATH))
+        run(subprocess_list, cwd=os.path.join(unreal_path, UBT_SOURCE_PATH))
         print("Built Unreal Build Tool successfully.")
     except subprocess.CalledProcessError as e:
-        print(f"Error building Unreal Build Tool: {e}")
-        sys.exit(1)
+        raise Exception(f"Error building Unreal Build Tool: {e}")
 
-def generate_project_files(env_vars):
+def find_unreal_build_tool(env_vars):
+    """Return (path to run UnrealBuildTool with, whether it needs to be built first)."""
     unreal_path = env_vars[UNREAL_PATH_KEY]
-    project_name = env_vars[PROJECT_NAME_KEY]
-
-    project_filepath = os.path.join(os.getcwd(), f"{project_name}.uproject")
 
     system = platform.system()
 
+    ubt_exec_path = os.path.join(unreal_path, UBT_EXEC_PATH)
     build_ubt = False
     if system == 'Windows':
-        if not os.path.exists(os.path.join(unreal_path, UBT_EXEC_PATH)):
+        if not os.path.exists(ubt_exec_path):
             build_ubt = True
     
     elif system == 'Darwin':  # macOS
@@ -413,15 +420,97 @@ def generate_project_files(env_vars):
             build_ubt = True
     
     else:   # Linux
-        print("TODO: Linux")
-    
+        ubt_exec_path = os.path.join(unreal_path, UBT_LINUX_EXEC_PATH)
+        if not os.path.exists(ubt_exec_path):
+            build_ubt = True
+
+    return ubt_exec_path, build_ubt
+
+def check_unreal_build_tool(env_vars, ubt_cache):
+    """Return (ubt_exec_path, fingerprint, file_cache, reason); reason says why UBT must be built, or is None."""
+    unreal_path = env_vars[UNREAL_PATH_KEY]
+    ubt_exec_path, build_ubt = find_unreal_build_tool(env_vars)
+    with span('fingerprint UnrealBuildTool sources'):
+        fingerprint, file_cache, recorded = ubt_cache.check(unreal_path)
+
     if build_ubt:
-        print(f"Unreal Build Tool not found at {os.path.join(unreal_path, UBT_EXEC_PATH)}")
-        build_unreal_build_tool(env_vars)
+        return ubt_exec_path, fingerprint, file_cache, f"Unreal Build Tool not found at {ubt_exec_path}"
+    if recorded is not None and recorded != fingerprint:
+        return ubt_exec_path, fingerprint, file_cache, f"Unreal Build Tool at {ubt_exec_path} is older than its sources"
+    if recorded is None:
+        # A binary UPM didn't build (e.g. an installed engine); treat it as matching its sources from now on
+        ubt_cache.record(unreal_path, fingerprint, file_cache)
+    return ubt_exec_path, fingerprint, file_cache, None
+
+def ensure_unreal_build_tool(env_vars):
+    """Return the path to run UnrealBuildTool with, restoring or building it if it's missing or stale."""
+    unreal_path = env_vars[UNREAL_PATH_KEY]
+    ubt_cache = UbtCache()
+    ubt_exec_path, fingerprint, file_cache, reason = check_unreal_build_tool(env_vars, ubt_cache)
+    if reason is None:
+        return ubt_exec_path
+
+    with ubt_cache.lock(unreal_path):
+        # Another project using this engine may have built it while we waited
+        ubt_exec_path, fingerprint, file_cache, reason = check_unreal_build_tool(env_vars, ubt_cache)
+        if reason is None:
+            return ubt_exec_path
+        print(reason)
+
+        dotnet_version = get_dotnet_version()
+        key = ubt_cache.get_key(fingerprint, dotnet_version)
+        if dotnet_version and ubt_cache.restore(key, unreal_path):
+            print(f"Restored Unreal Build Tool from cache ({key[:12]})")
+        else:
+            with span('build_unreal_build_tool'):
+                build_unreal_build_tool(env_vars)
+            if dotnet_version:
+                ubt_cache.store(key, unreal_path)
+        ubt_cache.record(unreal_path, fingerprint, file_cache)
+    return ubt_exec_path
+
+def fingerprint_project_files(env_vars, project_dir, ubt_exec_path, file_cache):
+    """
+    Return a fingerprint of everything that affects generated project files: the .uproject and
+    .uplugin files, module and target rules, the list of source files, the engine build and UBT itself.
+    """
+    unreal_path = env_vars[UNREAL_PATH_KEY]
+    paths = [os.path.join(project_dir, f"{env_vars[PROJECT_NAME_KEY]}.uproject")]
+    listing = []
+    for root, excluded_dirs in (('Source', EXCLUDED_DIRS), ('Plugins', PLUGIN_EXCLUDED_DIRS)):
+        for path in iter_files(os.path.join(project_dir, root), excluded_dirs=excluded_dirs):
+            listing.append(os.path.relpath(path, project_dir).replace(os.sep, '/'))
+            if path.endswith(PROJECT_RULES_SUFFIXES):
+                paths.append(path)
+
+    # A source-built engine can rebuild UBT without changing Build.version
+    ubt_stat = os.stat(ubt_exec_path)
+    extra = [unreal_path, get_engine_version(unreal_path), f"{ubt_stat.st_size}:{ubt_stat.st_mtime_ns}"] + listing
+    return fingerprint_files(project_dir, paths, file_cache, extra=extra)
+
+def generate_project_files(env_vars, force=False, project_dir='.', ubt_exec_path=None):
+    """Generate VS Code project files; pass ubt_exec_path if UnrealBuildTool was already ensured."""
+    unreal_path = env_vars[UNREAL_PATH_KEY]
+    project_name = env_vars[PROJECT_NAME_KEY]
+
+    project_dir = os.path.abspath(project_dir)
+    project_filepath = os.path.join(project_dir, f"{project_name}.uproject")
+
+    if ubt_exec_path is None:
+        ubt_exec_path = ensure_unreal_build_tool(env_vars)
+
+    cache_path = get_cache_path(project_dir, PROJECT_FILES_CACHE_FILENAME)
+    manifest = load_manifest(cache_path)
+    file_cache = manifest.get('files', {})
+    with span('fingerprint project files'):
+        fingerprint = fingerprint_project_files(env_vars, project_dir, ubt_exec_path, file_cache)
+    if manifest.get('fingerprint') == fingerprint and not force:
+        print(f"Project files for {project_filepath} are up to date; skipping generation (use --force to regenerate)")
+        return
     
     print(f"Generating project files for {project_filepath} with Unreal Engine at {unreal_path} ...")
     subprocess_list = [
-        os.path.join(unreal_path, UBT_EXEC_PATH),
+        ubt_exec_path,
         '-projectfiles',
         '-project={}'.format(project_filepath),
         '-game',
@@ -430,44 +519,62 @@ def generate_project_files(env_vars):
         '-vscode'
     ]
 
-    subprocess.check_call(subprocess_list)
+    # UBT runs one instance per engine at a time, so projects sharing an engine take turns
+    with UbtCache().lock(unreal_path), span('UnrealBuildTool -projectfiles', category='process'):
+        run(subprocess_list)
     print(f"Generated project files for {project_filepath}")
 
-def clean_project(env_vars):
+    prune_file_cache(file_cache, project_dir)
+    save_manifest(cache_path, {'fingerprint': fingerprint, 'files': file_cache})
+
+def clean_project(env_vars, project_dir='.'):
     system = platform.system()
 
+    venv_dir = os.path.join(project_dir, VENV_DIR)
+    dotenv_file = os.path.join(project_dir, DOTENV_FILE)
+    vscode_dir = os.path.join(project_dir, VSCODE_DIR)
+    workspace_file = os.path.join(project_dir, f"{env_vars[PROJECT_NAME_KEY]}.code-workspace")
+
     if system == 'Windows':
-        rm_venv_list = ['powershell', '-Command', 'Remove-Item', '-Recurse', '-Force', VENV_DIR]
-        rm_dotvenv_list = ['powershell', '-Command', 'Remove-Item', '-Force', DOTENV_FILE]
-        rm_tasks_list = ['powershell', '-Command', 'Remove-Item', '-Force', os.path.join(VSCODE_DIR, 'tasks.json')]
-        rm_launch_list = ['powershell', '-Command', 'Remove-Item', '-Force', os.path.join(VSCODE_DIR, 'launch.json')]
-        rm_workspace_list = ['powershell', '-Command', 'Remove-Item', '-Force', f"{env_vars[PROJECT_NAME_KEY]}.code-workspace"]
+        rm_venv_list = ['powershell', '-Command', 'Remove-Item', '-Recurse', '-Force', venv_dir]
+        rm_dotvenv_list = ['powershell', '-Command', 'Remove-Item', '-Force', dotenv_file]
+        rm_tasks_list = ['powershell', '-Command', 'Remove-Item', '-Force', os.path.join(vscode_dir, 'tasks.json')]
+        rm_launch_list = ['powershell', '-Command', 'Remove-Item', '-Force', os.path.join(vscode_dir, 'launch.json')]
+        rm_workspace_list = ['powershell', '-Command', 'Remove-Item', '-Force', workspace_file]
     else:
-        rm_venv_list = ['rm', '-rf', VENV_DIR]
-        rm_dotvenv_list = ['rm', '-f', DOTENV_FILE] 
-        rm_tasks_list = ['rm', '-rf', os.path.join(VSCODE_DIR, 'tasks.json')]
-        rm_launch_list = ['rm', '-f', os.path.join(VSCODE_DIR, 'launch.json')]
-        rm_workspace_list = ['rm', '-rf', f"{env_vars[PROJECT_NAME_KEY]}.code-workspace"]
-
-    if os.path.exists(VENV_DIR):
-        print(f"Removing {VENV_DIR}...")
-        subprocess.check_call(rm_venv_list)
-        print(f"Removed {VENV_DIR}")
-
-    if os.path.exists(DOTENV_FILE):
-        print(f"Removing {DOTENV_FILE}...")
-        subprocess.check_call(rm_dotvenv_list)
-        print(f"Removed {DOTENV_FILE}")
-
-    if os.path.exists(os.path.join(VSCODE_DIR, 'tasks.json')):
-        print(f"Removing {os.path.join(VSCODE_DIR, 'tasks.json')}...")
-        subprocess.check_call(rm_tasks_list)
-        print(f"Removed {os.path.join(VSCODE_DIR, 'tasks.json')}")
-
-    if os.path.exists(os.path.join(VSCODE_DIR, 'launch.json')):
-        print(f"Removing {os.path.join(VSCODE_DIR, 'launch.json')}...")
-        subprocess.check_call(rm_launch_list)
-        print(f"Removed {os.path.join(VSCODE_DIR, 'launch.json')}")
+        rm_venv_list = ['rm', '-rf', venv_dir]
+        rm_dotvenv_list = ['rm', '-f', dotenv_file] 
+        rm_tasks_list = ['rm', '-rf', os.path.join(vscode_dir, 'tasks.json')]
+        rm_launch_list = ['rm', '-f', os.path.join(vscode_dir, 'launch.json')]
+        rm_workspace_list = ['rm', '-rf', workspace_file]
+
+    if is_link(venv_dir):
+        # Recursive removal could follow the link into a shared venv other checkouts use
+        remove_venv(venv_dir)
+        print(f"Removed link {venv_dir}")
+        rm_venv_list = None
+
+    removals = [
+        (path, command) for path, command in (
+            (venv_dir, rm_venv_list),
+            (dotenv_file, rm_dotvenv_list),
+            (os.path.join(vscode_dir, 'tasks.json'), rm_tasks_list),
+            (os.path.join(vscode_dir, 'launch.json'), rm_launch_list)
+        )
+        if command and os.path.exists(path)
+    ]
+    for path, _ in removals:
+        print(f"Removing {path}...")
+    # The removals are independent, so they run side by side
+    results = run_all([{'command': command} for _, command in removals])
+    failed = []
+    for (path, _), result in zip(removals, results):
+        if result['returncode'] == 0:
+            print(f"Removed {path}")
+        else:
+            failed.append(path)
+    if get_exit_status(results):
+        raise Exception(f"Failed to remove {', '.join(failed)}")
 
     #if os.path.exists(f"{env_vars[PROJECT_NAME_KEY]}.code-workspace"):
     #    print(f"Removing {env_vars[PROJECT_NAME_KEY]}.code-workspace...")
@@ -476,38 +583,78 @@ def clean_project(env_vars):
 
     print(f"Project cleaned; {env_vars[PROJECT_NAME_KEY]}.code-workspace still exists and can be overwritten with \'upm setup\' if needed.")
 
-def setup(args):
-    config_override_path = os.path.join(os.getcwd(), '.vscode', 'config.upm')
-
-    if os.path.exists(config_override_path):
-        env_vars = load_config(config_override_path)
-    elif os.path.exists(CONFIG_PATH):
-        env_vars = load_config(CONFIG_PATH)
-    else:
-        raise Exception(f"Could not find {CONFIG_PATH} or {config_override_path}")
+def get_wheelhouse(args, key):
+    """Return the wheelhouse to install from if it's synced for these requirements, otherwise None (use PyPI)."""
+    wheelhouse_dir = args.wheelhouse or get_wheelhouse_dir()
+    if is_synced(wheelhouse_dir, key):
+        return wheelhouse_dir
+    if args.offline:
+        raise Exception(f"Wheelhouse {wheelhouse_dir} has no wheels for these requirements; run 'upm wheelhouse sync' while online")
+    return None
+
+def setup(args, project_dir='.'):
+    project_dir = os.path.abspath(project_dir)
+    config_path = os.path.join(project_dir, CONFIG_FILENAME)
+    config_override_path = os.path.join(project_dir, VSCODE_DIR, CONFIG_FILENAME)
+
+    with span('load config'):
+        if os.path.exists(config_override_path):
+            env_vars = load_config(config_override_path, project_dir)
+        elif os.path.exists(config_path):
+            env_vars = load_config(config_path, project_dir)
+        else:
+            raise Exception(f"Could not find {config_path} or {config_override_path}")
     
     if args.clean:
-        clean_project(env_vars)
-        sys.exit(0)
+        clean_project(env_vars, project_dir)
+        return []
 
-    venv_path = os.path.join(os.getcwd(), '.venv')
+    venv_path = os.path.join(project_dir, VENV_DIR)
     
-    requirements_file = os.path.join(os.getcwd(), 'upm', 'requirements.txt')
+    requirements_file = os.path.join(project_dir, 'upm', REQUIREMENTS_FILE)
 
-    if not args.novenv and not os.path.exists(venv_path):
-        print(f"No virtual environment found at {venv_path}.")
-        create_virtualenv(venv_path)
-    else:
-        print(f"Skipping virtual environment creation.")
-    
+    # Stages that don't depend on each other run concurrently: the venv/pip branch overlaps with
+    # building UBT and generating project files, and the VS Code files are then written side by side.
+    stages = []
     if args.novenv:
+        print(f"Skipping virtual environment creation.")
         print(f"Skipping dependency installation.")
+    elif args.shared_venv:
+        key = get_requirements_key(requirements_file)
+        wheelhouse = get_wheelhouse(args, key) if check_venv(get_shared_venv_path(key), key) else None
+        stages.append(create_stage('shared venv', lambda: ensure_shared_venv(venv_path, requirements_file, key, wheelhouse)))
     else:
-        install_dependencies(venv_path, requirements_file)
-        
-    if not args.noprojfiles:
-        generate_project_files(env_vars);
+        key = get_requirements_key(requirements_file)
+        reason = 'shared' if is_link(venv_path) else check_venv(venv_path, key)
+        if reason is None:
+            print(f"Virtual environment at {venv_path} is up to date; skipping dependency installation.")
+        else:
+            print(describe_drift(reason, venv_path, requirements_file))
+            wheelhouse = get_wheelhouse(args, key)
+            if reason != 'requirements':
+                stages.append(create_stage('create venv', lambda: create_virtualenv(venv_path, recreate=True)))
+            stages.append(create_stage(
+                'install_dependencies',
+                lambda: install_dependencies(venv_path, requirements_file, key, wheelhouse),
+                after=[stage['name'] for stage in stages]
+            ))
 
-    create_launch_tasks(env_vars)
-    create_build_tasks(env_vars)
-    create_code_workspace(env_vars)
+    if not args.noprojfiles:
+        ubt_stage = create_stage('build UnrealBuildTool', lambda: ensure_unreal_build_tool(env_vars))
+        stages.append(ubt_stage)
+        # Reuse the path the UBT stage resolved rather than fingerprinting the UBT sources again
+        stages.append(create_stage(
+            'generate_project_files',
+            lambda: generate_project_files(env_vars, force=args.force, project_dir=project_dir, ubt_exec_path=ubt_stage['result']),
+            after=['build UnrealBuildTool']
+        ))
+
+    # UBT -projectfiles -vscode writes the same launch.json, tasks.json and workspace; UPM's versions go on top
+    vscode_after = [] if args.noprojfiles else ['generate_project_files']
+    stages.append(create_stage('write launch.json', lambda: create_launch_tasks(env_vars, project_dir), after=vscode_after))
+    stages.append(create_stage('write tasks.json', lambda: create_build_tasks(env_vars, project_dir), after=vscode_after))
+    stages.append(create_stage(f"write {env_vars[WORKSPACE_NAME_KEY]}", lambda: create_code_workspace(env_vars, project_dir), after=vscode_after))
+
+    run_stages(stages, jobs=args.jobs)
+    print(format_stage_summary(stages, 'Setup summary'))
+    return stages
@@ -0,0 +1,82 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from upm.timing import span
+
+DEFAULT_STAGE_JOBS = 4
+
+def create_stage(name, run, after=()):
+    return {
+        'name': name,
+        'run': run,
+        'after': list(after),
+        'status': 'pending',
+        'duration': 0.0,
+        'error': None,
+        'result': None
+    }
+
+def run_stage(stage):
+    start = time.perf_counter()
+    try:
+        with span(stage['name'], category='stage'):
+            stage['result'] = stage['run']()
+        stage['status'] = 'done'
+    except (Exception, SystemExit) as e:
+        # SystemExit too: some steps still exit on failure, which must not take down the other branches
+        stage['status'] = 'failed'
+        stage['error'] = f"{type(e).__name__}: {e}"
+    finally:
+        stage['duration'] = time.perf_counter() - start
+    return stage
+
+def run_stages(stages, jobs=None):
+    """
+    Run stages (see create_stage) on a worker pool as soon as the stages they come after are done.
+
+    A failed stage doesn't stop stages that don't depend on it; its dependents are marked skipped.
+    Returns the stages with status, duration and error filled in.
+    """
+    by_name = {stage['name']: stage for stage in stages}
+    for stage in stages:
+        for dependency in stage['after']:
+            if dependency not in by_name:
+                raise Exception(f"Stage '{stage['name']}' comes after unknown stage '{dependency}'")
+
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs or DEFAULT_STAGE_JOBS)) as executor:
+        while True:
+            for stage in stages:
+                if stage['status'] != 'pending':
+                    continue
+                statuses = [by_name[dependency]['status'] for dependency in stage['after']]
+                if any(status in ('failed', 'skipped') for status in statuses):
+                    stage['status'] = 'skipped'
+                elif all(status == 'done' for status in statuses):
+                    stage['status'] = 'running'
+                    running[executor.submit(run_stage, stage)] = stage
+
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                if stage['status'] == 'failed':
+                    print(f"Stage '{stage['name']}' failed: {stage['error']}")
+
+    for stage in stages:
+        if stage['status'] == 'pending':
+            # Only reachable with a dependency cycle
+            stage['status'] = 'skipped'
+    return stages
+
+def format_stage_summary(stages, title):
+    lines = [f"{title}:"]
+    for stage in stages:
+        line = f"  {stage['name']:<28} {stage['status']:<8}"
+        if stage['status'] in ('done', 'failed'):
+            line += f" {stage['duration']:7.1f}s"
+        if stage['error']:
+            line += f"  {stage['error']}"
+        lines.append(line)
+    return '\n'.join(lines)
@@ -0,0 +1,133 @@
+"""
+Incremental directory sync, used by `upm config` to install UPM's scripts into a project.
+
+Only files whose content differs from the source are written; everything else is checked with a
+stat() against the manifest of the previous sync (kept in the project's Intermediate/UPM). Files
+can be copied, hardlinked or symlinked to the source. Files a previous sync created that no longer
+exist in the source are pruned. Files UPM didn't create are never removed.
+"""
+import os
+import shutil
+import threading
+
+from upm.fingerprint import iter_files, hash_file, load_manifest, save_manifest
+
+COPY_MODE = 'copy'
+HARDLINK_MODE = 'hardlink'
+SYMLINK_MODE = 'symlink'
+SYNC_MODES = [COPY_MODE, HARDLINK_MODE, SYMLINK_MODE]
+EXCLUDED_SUFFIXES = ('.pyc', '.pyo')
+
+def get_digest(path, stat, file_cache, relpath):
+    """Return path's SHA-256, reusing file_cache[relpath] = [size, mtime_ns, digest] if the stat matches."""
+    cached = file_cache.get(relpath)
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+    digest = hash_file(path)
+    file_cache[relpath] = [stat.st_size, stat.st_mtime_ns, digest]
+    return digest
+
+def is_synced(src_path, dst_path, mode, digest, dst_cache, relpath):
+    try:
+        stat = os.lstat(dst_path)
+    except FileNotFoundError:
+        return False
+    if mode == SYMLINK_MODE:
+        return os.path.islink(dst_path) and os.readlink(dst_path) == src_path
+    if os.path.islink(dst_path):
+        return False
+    if mode == HARDLINK_MODE:
+        return os.path.samefile(src_path, dst_path)
+    if os.path.samefile(src_path, dst_path):
+        # Left over from a hardlink sync; a copy must not write through to the source
+        return False
+    return get_digest(dst_path, stat, dst_cache, relpath) == digest
+
+def install_file(src_path, dst_path, mode):
+    """Replace dst_path atomically so scripts that are running never see a partial file."""
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    tmp_path = f"{dst_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        if mode == SYMLINK_MODE:
+            os.symlink(src_path, tmp_path)
+        elif mode == HARDLINK_MODE:
+            try:
+                os.link(src_path, tmp_path)
+            except OSError:
+                # Different volume or a filesystem without hardlinks
+                shutil.copy2(src_path, tmp_path)
+        else:
+            shutil.copy2(src_path, tmp_path)
+        os.replace(tmp_path, dst_path)
+    except BaseException:
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def remove_empty_dirs(root, relpath):
+    directory = os.path.dirname(os.path.join(root, relpath))
+    while os.path.normpath(directory) != os.path.normpath(root):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            return
+        directory = os.path.dirname(directory)
+
+def sync_tree(src, dst, manifest_path, mode=COPY_MODE, prune=True):
+    """
+    Make dst mirror the files in src. Returns a dict with counts of updated, unchanged and pruned files.
+
+    The manifest at manifest_path caches file hashes for both trees and lists the files synced into dst.
+    """
+    if mode not in SYNC_MODES:
+        raise Exception(f"Unknown sync mode '{mode}'; expected one of {', '.join(SYNC_MODES)}")
+    src = os.path.abspath(src)
+    dst = os.path.abspath(dst)
+    manifest = load_manifest(manifest_path)
+    if manifest.get('source') != src:
+        # A different UPM install; its hashes don't apply
+        manifest = {}
+    src_cache = manifest.get('source_files', {})
+    dst_cache = manifest.get('files', {})
+    previous = set(manifest.get('synced', []))
+
+    counts = {'updated': 0, 'unchanged': 0, 'pruned': 0}
+    synced = []
+    for src_path in iter_files(src):
+        if src_path.endswith(EXCLUDED_SUFFIXES):
+            continue
+        relpath = os.path.relpath(src_path, src).replace(os.sep, '/')
+        dst_path = os.path.join(dst, relpath)
+        digest = get_digest(src_path, os.stat(src_path), src_cache, relpath)
+        if is_synced(src_path, dst_path, mode, digest, dst_cache, relpath):
+            counts['unchanged'] += 1
+        else:
+            install_file(src_path, dst_path, mode)
+            counts['updated'] += 1
+            stat = os.stat(dst_path)
+            dst_cache[relpath] = [stat.st_size, stat.st_mtime_ns, digest]
+        synced.append(relpath)
+
+    current = set(synced)
+    # Without pruning, stale files stay listed so a later sync can still remove them
+    stale = previous - current
+    if prune:
+        for relpath in sorted(stale):
+            dst_path = os.path.join(dst, relpath)
+            if os.path.lexists(dst_path):
+                os.remove(dst_path)
+                remove_empty_dirs(dst, relpath)
+                counts['pruned'] += 1
+        stale = set()
+
+    for file_cache in (src_cache, dst_cache):
+        for relpath in [relpath for relpath in file_cache if relpath not in current]:
+            del file_cache[relpath]
+    save_manifest(manifest_path, {
+        'source': src,
+        'mode': mode,
+        'synced': sorted(current | stale),
+        'source_files': src_cache,
+        'files': dst_cache
+    })
+    return counts
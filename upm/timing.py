@@ -0,0 +1,94 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+
+class Tracer:
+    """Collect spans as Chrome trace events (viewable in Perfetto or chrome://tracing)."""
+
+    def __init__(self):
+        self.events = []
+        self.open_spans = {}
+        self.thread_names = {}
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.start = time.perf_counter()
+
+    def now(self):
+        return (time.perf_counter() - self.start) * 1e6
+
+    def add(self, event):
+        thread = threading.current_thread()
+        event.setdefault('pid', self.pid)
+        event.setdefault('tid', thread.ident)
+        with self.lock:
+            self.thread_names.setdefault(thread.ident, thread.name)
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name, category='upm', **args):
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.add({'name': name, 'cat': category, 'ph': 'X', 'ts': start, 'dur': self.now() - start, 'args': args})
+
+    def begin(self, key, name, category='upm', **args):
+        """Open a span that is closed later by end(key), e.g. from a parsed log marker."""
+        with self.lock:
+            self.open_spans[key] = (name, category, self.now(), args)
+
+    def end(self, key):
+        with self.lock:
+            opened = self.open_spans.pop(key, None)
+        if opened:
+            name, category, start, args = opened
+            self.add({'name': name, 'cat': category, 'ph': 'X', 'ts': start, 'dur': self.now() - start, 'args': args})
+
+    def write(self, path):
+        # Close anything left open (e.g. a stage that was interrupted) so it still shows up
+        for key in list(self.open_spans):
+            self.end(key)
+        metadata = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in self.thread_names.items()
+        ]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': metadata + self.events, 'displayTimeUnit': 'ms'}, f)
+
+tracer = None
+
+def span(name, category='upm', **args):
+    """Time a block as a trace span; a no-op unless profiling was started."""
+    if tracer is None:
+        return nullcontext()
+    return tracer.span(name, category, **args)
+
+def begin_span(key, name, category='upm', **args):
+    if tracer is not None:
+        tracer.begin(key, name, category, **args)
+
+def end_span(key):
+    if tracer is not None:
+        tracer.end(key)
+
+@contextmanager
+def profiled(path, name='upm'):
+    """Record spans for the duration of the block and write them to path (if path is set)."""
+    global tracer
+    if not path:
+        yield
+        return
+
+    tracer = Tracer()
+    try:
+        with tracer.span(name):
+            yield
+    finally:
+        tracer.write(path)
+        print(f"Wrote profile to {path}")
+        tracer = None
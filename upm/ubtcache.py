@@ -0,0 +1,107 @@
+"""
+Content-addressed cache of UnrealBuildTool builds.
+
+UBT is keyed by a fingerprint of its sources (UnrealBuildTool and the shared EpicGames.* libraries
+it references) and the dotnet SDK version. After a `dotnet build` its binaries are stored in
+<cache>/ubt/<key>/. Engine checkouts and agents with the same sources then restore them instead of
+compiling. The fingerprint each engine's UBT was built or restored from is recorded in
+<cache>/ubt/engines.json. A binary older than its sources, e.g. after pulling a source-built
+engine, is replaced.
+"""
+import os
+import shutil
+import hashlib
+import platform
+import threading
+import subprocess
+
+from upm.download import get_cache_dir
+from upm.fingerprint import EXCLUDED_DIRS, iter_files, fingerprint_files, prune_file_cache, file_lock, load_manifest, update_manifest
+from upm.timing import span
+from upm.process import output_of
+
+UBT_CACHE_DIR = 'ubt'
+ENGINES_MANIFEST = 'engines.json'
+UBT_SOURCE_DIRS = [
+    os.path.join('Engine', 'Source', 'Programs', 'UnrealBuildTool'),
+    os.path.join('Engine', 'Source', 'Programs', 'Shared')
+]
+UBT_BINARIES_PATH = os.path.join('Engine', 'Binaries', 'DotNET', 'UnrealBuildTool')
+# dotnet build's intermediate output lives next to the sources
+SOURCE_EXCLUDED_DIRS = EXCLUDED_DIRS | {'bin', 'obj'}
+# The first dotnet command on a machine can take a while to set up the SDK
+DOTNET_VERSION_TIMEOUT = 120
+
+def get_dotnet_version():
+    """Return the dotnet SDK version, or None if dotnet isn't installed."""
+    try:
+        with span('dotnet --version', category='process'):
+            return output_of(['dotnet', '--version'], stderr=subprocess.DEVNULL, timeout=DOTNET_VERSION_TIMEOUT)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
+        return None
+
+class UbtCache:
+    def __init__(self, cache_dir=None):
+        self.root = os.path.join(cache_dir or get_cache_dir(), UBT_CACHE_DIR)
+        self.engines_path = os.path.join(self.root, ENGINES_MANIFEST)
+
+    def get_entry_path(self, key):
+        return os.path.join(self.root, key)
+
+    def get_key(self, source_fingerprint, dotnet_version):
+        return hashlib.sha256(f"{source_fingerprint}\0{dotnet_version}\0{platform.system()}".encode()).hexdigest()
+
+    def lock(self, unreal_path):
+        """Serialize work on one engine's UBT (building, restoring, generating project files) across processes."""
+        engine_id = hashlib.sha256(os.path.abspath(unreal_path).encode()).hexdigest()[:16]
+        return file_lock(os.path.join(self.root, f"engine-{engine_id}"))
+
+    def check(self, unreal_path):
+        """
+        Fingerprint the engine's UBT sources.
+
+        Returns (fingerprint, file_cache, recorded): recorded is the fingerprint the engine's current
+        binaries were built from, or None if UPM hasn't built or restored them.
+        """
+        unreal_path = os.path.abspath(unreal_path)
+        engine = load_manifest(self.engines_path).get(unreal_path, {})
+        file_cache = engine.get('files', {})
+        paths = []
+        for source_dir in UBT_SOURCE_DIRS:
+            paths.extend(iter_files(os.path.join(unreal_path, source_dir), excluded_dirs=SOURCE_EXCLUDED_DIRS))
+        fingerprint = fingerprint_files(unreal_path, paths, file_cache)
+        return fingerprint, file_cache, engine.get('fingerprint')
+
+    def record(self, unreal_path, fingerprint, file_cache):
+        unreal_path = os.path.abspath(unreal_path)
+        prune_file_cache(file_cache, unreal_path)
+
+        def update(engines):
+            engines[unreal_path] = {'fingerprint': fingerprint, 'files': file_cache}
+        update_manifest(self.engines_path, update)
+
+    def restore(self, key, unreal_path):
+        """Copy cached binaries for key into the engine. Returns False if there are none."""
+        entry_path = self.get_entry_path(key)
+        if not os.path.isdir(entry_path):
+            return False
+        with span('restore UnrealBuildTool', category='cache'):
+            shutil.copytree(entry_path, os.path.join(unreal_path, UBT_BINARIES_PATH), dirs_exist_ok=True)
+        return True
+
+    def store(self, key, unreal_path):
+        binaries_path = os.path.join(unreal_path, UBT_BINARIES_PATH)
+        entry_path = self.get_entry_path(key)
+        if os.path.isdir(entry_path) or not os.path.isdir(binaries_path):
+            return
+        tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with span('store UnrealBuildTool', category='cache'):
+            try:
+                shutil.copytree(binaries_path, tmp_path)
+                os.replace(tmp_path, entry_path)
+            except OSError:
+                # Another agent stored the same key first; its copy is just as good
+                pass
+            finally:
+                if os.path.exists(tmp_path):
+                    shutil.rmtree(tmp_path)
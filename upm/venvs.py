@@ -0,0 +1,144 @@
+"""
+Virtual environment management for `upm setup`.
+
+Installing dependencies writes a marker into the venv that records a hash of the requirements file
+and the interpreter they were installed for. While both still match, setup skips pip entirely; a
+changed requirements file reinstalls the dependencies and a different interpreter recreates the venv.
+
+With --shared-venv the venv lives in the user cache under a directory named after that same key, and
+the project's .venv links to it, so checkouts with identical requirements share one installation.
+A shared venv isn't modified once it's complete; different requirements get a new one.
+"""
+import os
+import sys
+import json
+import shutil
+import hashlib
+import platform
+import subprocess
+
+from upm.download import get_cache_dir
+from upm.fingerprint import hash_file, file_lock, load_manifest, save_manifest
+from upm.process import run
+
+VENV_MARKER_FILE = 'upm-venv.json'
+SHARED_VENVS_DIR = 'venvs'
+
+DRIFT_MESSAGES = {
+    'missing': "No virtual environment found at {venv_path}.",
+    'interpreter': "Virtual environment at {venv_path} was created for a different Python; recreating it.",
+    'requirements': "{requirements_file} changed since dependencies were installed.",
+    'shared': "{venv_path} links to a shared virtual environment; creating one for this project."
+}
+
+def get_venv_python(venv_path):
+    if platform.system() == 'Windows':
+        return os.path.join(venv_path, 'Scripts', 'python.exe')
+    return os.path.join(venv_path, 'bin', 'python3')
+
+def get_requirements_key(requirements_file):
+    """Return what an installed venv must match: the requirements hash and the interpreter version."""
+    return {
+        'requirements': hash_file(requirements_file),
+        'python': platform.python_version(),
+        'implementation': sys.implementation.name
+    }
+
+def get_key_digest(key):
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()[:16]
+
+def read_venv_version(venv_path):
+    """Return the interpreter version recorded in the venv's pyvenv.cfg, or None."""
+    try:
+        with open(os.path.join(venv_path, 'pyvenv.cfg'), 'r') as f:
+            for line in f:
+                name, _, value = line.partition('=')
+                if name.strip() in ('version', 'version_info'):
+                    return value.strip()
+    except FileNotFoundError:
+        pass
+    return None
+
+def is_link(path):
+    # Shared venvs are linked with a symlink, or a directory junction on Windows
+    return os.path.islink(path) or getattr(os.path, 'isjunction', lambda path: False)(path)
+
+def check_venv(venv_path, key):
+    """Return why the venv needs work ('missing', 'interpreter' or 'requirements'), or None if it's current."""
+    # The interpreter disappears if the base Python it links to was uninstalled
+    if not os.path.exists(get_venv_python(venv_path)):
+        return 'missing'
+    version = read_venv_version(venv_path)
+    if not version or not version.startswith(key['python']):
+        return 'interpreter'
+    if load_manifest(os.path.join(venv_path, VENV_MARKER_FILE)) != key:
+        return 'requirements'
+    return None
+
+def describe_drift(reason, venv_path, requirements_file):
+    return DRIFT_MESSAGES[reason].format(venv_path=venv_path, requirements_file=requirements_file)
+
+def remove_venv(venv_path):
+    if is_link(venv_path):
+        # Only remove the link; the shared venv may be used by other checkouts
+        if os.path.islink(venv_path):
+            os.unlink(venv_path)
+        else:
+            os.rmdir(venv_path)
+    else:
+        shutil.rmtree(venv_path)
+
+def create_virtualenv(venv_path, recreate=False):
+    if recreate and os.path.lexists(venv_path):
+        print(f'Removing virtual environment at {venv_path}...')
+        remove_venv(venv_path)
+    print(f'Creating virtual environment at {venv_path}...')
+    if not os.path.exists(venv_path):
+        run([sys.executable, '-m', 'venv', venv_path])
+        print(f'Created virtual environment at {venv_path}')
+    else:
+        print(f'Virtual environment already exists at {venv_path}')
+
+def install_dependencies(venv_path, requirements_file, key=None, wheelhouse=None):
+    key = key or get_requirements_key(requirements_file)
+    marker_path = os.path.join(venv_path, VENV_MARKER_FILE)
+    # Drop the marker first so an interrupted install isn't mistaken for a complete one
+    if os.path.exists(marker_path):
+        os.remove(marker_path)
+    command = [get_venv_python(venv_path), '-m', 'pip', 'install', '-r', requirements_file]
+    if wheelhouse:
+        command += ['--no-index', '--find-links', wheelhouse]
+    run(command)
+    save_manifest(marker_path, key)
+    print(f"Installed dependencies from {requirements_file}{f' using wheelhouse {wheelhouse}' if wheelhouse else ''}")
+
+def link_venv(venv_path, shared_path):
+    if os.path.lexists(venv_path):
+        if is_link(venv_path) and os.path.realpath(venv_path) == os.path.realpath(shared_path):
+            return
+        print(f"Replacing {venv_path} with a link to {shared_path}")
+        remove_venv(venv_path)
+    if platform.system() == 'Windows':
+        # Junctions don't need the symlink privilege
+        run(['cmd', '/c', 'mklink', '/J', venv_path, shared_path], stdout=subprocess.DEVNULL)
+    else:
+        os.symlink(shared_path, venv_path, target_is_directory=True)
+    print(f"Linked {venv_path} to {shared_path}")
+
+def get_shared_venv_path(key):
+    return os.path.join(get_cache_dir(), SHARED_VENVS_DIR, get_key_digest(key))
+
+def ensure_shared_venv(venv_path, requirements_file, key=None, wheelhouse=None):
+    """Link venv_path to the shared venv for these requirements, creating it if no checkout has yet."""
+    key = key or get_requirements_key(requirements_file)
+    shared_path = get_shared_venv_path(key)
+    if check_venv(shared_path, key):
+        with file_lock(shared_path):
+            # Another checkout may have finished it while we waited
+            if check_venv(shared_path, key):
+                create_virtualenv(shared_path, recreate=True)
+                install_dependencies(shared_path, requirements_file, key, wheelhouse)
+    else:
+        print(f"Using shared virtual environment at {shared_path}")
+    link_venv(venv_path, shared_path)
+    return shared_path
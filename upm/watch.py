@@ -0,0 +1,347 @@
+"""
+Watch a project and rebuild a target as its sources change (`upm build --watch`).
+
+Source/, Plugins/ and the project's top-level files (the .uproject and the changelog) are watched
+with inotify on Linux and by polling elsewhere, or when inotify isn't available. Bursts of
+saves are debounced into one batch of changes, and each batch triggers only the follow-up actions it
+needs:
+
+- project files are regenerated when module, target or plugin rules change or source files are added
+  or removed (generate_project_files still skips if its fingerprint is unchanged),
+- the target is rebuilt when a build input changes (the build cache skips edits that net out),
+- Config/DefaultGame.ini's ProjectVersion is stamped when the changelog changes.
+
+Config/ isn't watched: the target's build doesn't read it (packaging fingerprints it separately), and
+stamping ProjectVersion writes to it.
+"""
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import platform
+import subprocess
+
+from upm.fingerprint import EXCLUDED_DIRS, iter_files
+from upm.api import DOTENV_PATH, load_env, get_env
+
+PROJECT_NAME_KEY = 'PROJECT_NAME'
+UNREAL_PATH_KEY = 'UNREAL_PATH'
+WATCHED_DIRS = ('Source', 'Plugins')
+BUILD_INPUT_DIRS = ('Source', 'Plugins')
+CHANGELOG_FILES = ('Changelog.json', 'Changelog.jsonl')
+PROJECT_RULES_SUFFIXES = ('.uproject', '.uplugin', '.Build.cs', '.Target.cs')
+DEFAULT_DEBOUNCE = 0.3
+POLL_INTERVAL = 1.0
+# Editor swap and backup files, and the temporary files atomic saves are renamed from
+IGNORED_SUFFIXES = ('.tmp', '.swp', '.swx', '~')
+
+CREATED = 'created'
+MODIFIED = 'modified'
+DELETED = 'deleted'
+# The change queue overflowed; anything may have changed
+OVERFLOW = 'overflow'
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+EVENT_HEADER = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+
+def is_watched_file(project_dir, path):
+    """Return whether a change to path matters: a file under a watched directory, or a top-level project file."""
+    relpath = os.path.relpath(path, project_dir)
+    parts = relpath.split(os.sep)
+    if path.endswith(IGNORED_SUFFIXES) or os.path.basename(path).startswith('.#'):
+        return False
+    if len(parts) == 1:
+        return relpath.endswith('.uproject') or relpath in CHANGELOG_FILES
+    return parts[0] in WATCHED_DIRS and not any(part in EXCLUDED_DIRS for part in parts[1:-1])
+
+def is_watched_dir(project_dir, path):
+    parts = os.path.relpath(path, project_dir).split(os.sep)
+    return parts[0] in WATCHED_DIRS and not any(part in EXCLUDED_DIRS for part in parts[1:])
+
+def iter_watched_files(project_dir):
+    for name in os.listdir(project_dir):
+        path = os.path.join(project_dir, name)
+        if is_watched_file(project_dir, path) and os.path.isfile(path):
+            yield path
+    for directory in WATCHED_DIRS:
+        for path in iter_files(os.path.join(project_dir, directory)):
+            if is_watched_file(project_dir, path):
+                yield path
+
+class PollingWatcher:
+    """Finds changes by comparing stat snapshots of the watched files."""
+
+    name = 'polling'
+
+    def __init__(self, project_dir, interval=POLL_INTERVAL):
+        self.project_dir = project_dir
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def scan(self):
+        snapshot = {}
+        for path in iter_watched_files(self.project_dir):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def poll(self):
+        snapshot = self.scan()
+        changes = [(DELETED, path) for path in self.snapshot if path not in snapshot]
+        for path, stat in snapshot.items():
+            previous = self.snapshot.get(path)
+            if previous is None:
+                changes.append((CREATED, path))
+            elif previous != stat:
+                changes.append((MODIFIED, path))
+        self.snapshot = snapshot
+        return changes
+
+    def read(self, timeout=None):
+        """Return the changes seen within timeout seconds (None waits until there are some)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changes = self.poll()
+            if changes:
+                return changes
+            remaining = self.interval if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    """Linux inotify backend. inotify isn't recursive, so every directory under the watched roots gets a watch."""
+
+    name = 'inotify'
+
+    def __init__(self, project_dir):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.add_watch = libc.inotify_add_watch
+        self.add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.project_dir = project_dir
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+        self.watches = {}
+        try:
+            self.watch(project_dir)
+            for directory in WATCHED_DIRS:
+                self.watch_tree(os.path.join(project_dir, directory))
+        except OSError:
+            self.close()
+            raise
+
+    def watch(self, directory):
+        wd = self.add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                # Removed before we got to it
+                return
+            # ENOSPC means fs.inotify.max_user_watches is too low for this tree
+            raise OSError(error, f"inotify_add_watch failed for {directory}: {os.strerror(error)}")
+        self.watches[wd] = directory
+
+    def watch_tree(self, root):
+        if not os.path.isdir(root):
+            return
+        self.watch(root)
+        for directory, dirnames, _ in os.walk(root):
+            dirnames[:] = [name for name in dirnames if name not in EXCLUDED_DIRS]
+            for name in dirnames:
+                self.watch(os.path.join(directory, name))
+
+    def parse(self, data):
+        changes = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                changes.append((OVERFLOW, None))
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+
+            if mask & IN_ISDIR:
+                if not is_watched_dir(self.project_dir, path):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files can land in a new directory before its watch exists, so report what's already there.
+                    # A directory renamed within the tree keeps its watches, which now point at the new path.
+                    self.watch_tree(path)
+                    changes.extend((CREATED, child) for child in iter_files(path) if is_watched_file(self.project_dir, child))
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    changes.append((DELETED, path))
+                continue
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                changes.append((CREATED, path))
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                changes.append((DELETED, path))
+            else:
+                changes.append((MODIFIED, path))
+        return [
+            (kind, path) for kind, path in changes
+            if path is None or is_watched_file(self.project_dir, path) or is_watched_dir(self.project_dir, path)
+        ]
+
+    def read(self, timeout=None):
+        """Return the changes seen within timeout seconds (None waits until there are some)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                return []
+            try:
+                data = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                continue
+            changes = self.parse(data)
+            if changes or remaining == 0.0:
+                return changes
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+def create_watcher(project_dir, backend=None):
+    """Return a watcher for project_dir; backend is 'inotify', 'polling' or None for the best available."""
+    if backend == 'polling' or (backend is None and platform.system() != 'Linux'):
+        return PollingWatcher(project_dir)
+    try:
+        return InotifyWatcher(project_dir)
+    except (OSError, AttributeError) as e:
+        if backend == 'inotify':
+            raise Exception(f"inotify is not available: {e}")
+        print(f"inotify is not available ({e}); polling for changes every {POLL_INTERVAL:g}s instead")
+        return PollingWatcher(project_dir)
+
+def wait_for_changes(watcher, debounce=DEFAULT_DEBOUNCE):
+    """Block until something changes, then keep collecting until nothing has changed for debounce seconds."""
+    changes = watcher.read()
+    while True:
+        more = watcher.read(debounce)
+        if not more:
+            return changes
+        changes.extend(more)
+
+def coalesce_changes(changes):
+    """Net out a batch of changes per path, e.g. a file created and deleted again is dropped."""
+    net = {}
+    for kind, path in changes:
+        previous = net.get(path)
+        if previous == CREATED and kind == DELETED:
+            del net[path]
+        elif previous == CREATED:
+            continue
+        elif previous == DELETED and kind == CREATED:
+            net[path] = MODIFIED
+        else:
+            net[path] = kind
+    return net
+
+def plan_actions(project_dir, changes):
+    """Return which of build, project_files and ini a batch of changes calls for."""
+    actions = {'build': False, 'project_files': False, 'ini': False}
+    if any(kind == OVERFLOW for kind, _ in changes):
+        return {action: True for action in actions}
+
+    for path, kind in coalesce_changes(changes).items():
+        relpath = os.path.relpath(path, project_dir)
+        top = relpath.split(os.sep)[0]
+        if top in BUILD_INPUT_DIRS or relpath.endswith('.uproject'):
+            actions['build'] = True
+            if path.endswith(PROJECT_RULES_SUFFIXES) or kind != MODIFIED:
+                actions['project_files'] = True
+        elif relpath in CHANGELOG_FILES:
+            actions['ini'] = True
+    return actions
+
+def describe_changes(project_dir, changes):
+    net = coalesce_changes(changes)
+    if any(kind == OVERFLOW for kind, _ in changes):
+        return "too many changes to track individually"
+    names = sorted(os.path.relpath(path, project_dir) for path in net if path)
+    shown = ', '.join(names[:5])
+    return shown + (f" and {len(names) - 5} more" if len(names) > 5 else '')
+
+def run_action(description, action):
+    """Run one follow-up action; a failure is reported and watching goes on."""
+    try:
+        action()
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"{description} failed with exit code {e.returncode}")
+    except Exception as e:
+        print(f"{description} failed: {e}")
+    return False
+
+def watch_project(project_dir, target_name, build_type, force=False, events_path=None, debounce=DEFAULT_DEBOUNCE, backend=None):
+    """Build target_name, then rebuild it and run the other follow-up actions whenever the project changes."""
+    from upm.build import build_project
+    from upm.setup import generate_project_files
+    from upm.changelog import update_ini
+
+    project_dir = os.path.abspath(project_dir)
+    load_env(os.path.join(project_dir, DOTENV_PATH))
+    env_vars = {key: get_env(key) for key in (UNREAL_PATH_KEY, PROJECT_NAME_KEY)}
+    # Kept across rebuilds so unchanged files aren't re-hashed, as in the daemon
+    file_cache = {}
+
+    def build(force=False):
+        build_project(project_dir, target_name, build_type=build_type, build=True, force=force, events_path=events_path, file_cache=file_cache)
+
+    watcher = create_watcher(project_dir, backend)
+    try:
+        run_action(f"Build of {target_name} {build_type}", lambda: build(force))
+        print(f"Watching {project_dir} for changes ({watcher.name}); press Ctrl+C to stop")
+        while True:
+            changes = wait_for_changes(watcher, debounce)
+            described = describe_changes(project_dir, changes)
+            if not described:
+                # Everything netted out, e.g. an editor's temporary file
+                continue
+            actions = plan_actions(project_dir, changes)
+            print(f"Changed: {described}")
+            if actions['project_files']:
+                run_action("Project file generation", lambda: generate_project_files(env_vars, project_dir=project_dir))
+            if actions['build']:
+                run_action(f"Build of {target_name} {build_type}", build)
+            if actions['ini']:
+                run_action("ProjectVersion update", lambda: update_ini(project_dir))
+            if not any(actions.values()):
+                print("Nothing to rebuild")
+    except KeyboardInterrupt:
+        print("Stopped watching")
+    finally:
+        watcher.close()
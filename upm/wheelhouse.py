@@ -0,0 +1,107 @@
+"""
+Local wheelhouse for installing setup dependencies without PyPI.
+
+`upm wheelhouse sync` builds wheels for every requirement (including transitive ones) into a flat
+directory, once per requirements hash and interpreter; wheels are shared between hashes. `upm setup`
+then installs from it with `pip install --no-index --find-links`, so bootstrapping a venv only reads
+the local disk. Copy the directory to air-gapped agents and point UPM_WHEELHOUSE at it.
+"""
+import os
+import sys
+import json
+import argparse
+from urllib.parse import unquote, urlparse
+
+if __name__ == "__main__" and __package__ in (None, ''):
+    # Running as a script (e.g. from generated VS Code tasks); make sibling modules importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from upm.download import get_cache_dir
+from upm.fingerprint import load_manifest, update_manifest
+from upm.timing import span
+from upm.process import run
+from upm.venvs import get_requirements_key, get_key_digest
+
+WHEELHOUSE_ENV = 'UPM_WHEELHOUSE'
+WHEELHOUSE_DIR = 'wheelhouse'
+WHEELHOUSE_MANIFEST = 'wheelhouse.json'
+DEFAULT_REQUIREMENTS_FILE = os.path.join('upm', 'requirements.txt')
+
+def get_wheelhouse_dir():
+    """Return the wheelhouse directory (UPM_WHEELHOUSE overrides <cache>/wheelhouse)."""
+    return os.getenv(WHEELHOUSE_ENV) or os.path.join(get_cache_dir(), WHEELHOUSE_DIR)
+
+def get_synced_wheels(wheelhouse_dir, key):
+    """Return the wheels synced for key, or None if the wheelhouse doesn't have all of them."""
+    entry = load_manifest(os.path.join(wheelhouse_dir, WHEELHOUSE_MANIFEST)).get(get_key_digest(key))
+    if entry is None:
+        return None
+    if not all(os.path.exists(os.path.join(wheelhouse_dir, wheel)) for wheel in entry['wheels']):
+        return None
+    return entry['wheels']
+
+def is_synced(wheelhouse_dir, key):
+    return get_synced_wheels(wheelhouse_dir, key) is not None
+
+def sync_wheelhouse(requirements_file, wheelhouse_dir=None, force=False):
+    """Build wheels for requirements_file into the wheelhouse unless it's already synced. Returns the wheels."""
+    wheelhouse_dir = wheelhouse_dir or get_wheelhouse_dir()
+    key = get_requirements_key(requirements_file)
+    wheels = get_synced_wheels(wheelhouse_dir, key)
+    if wheels is not None and not force:
+        print(f"Wheelhouse {wheelhouse_dir} is up to date for {requirements_file}")
+        return wheels
+
+    os.makedirs(wheelhouse_dir, exist_ok=True)
+    report_path = os.path.join(wheelhouse_dir, f".{os.getpid()}.files")
+    before = set(os.listdir(wheelhouse_dir))
+    print(f"Syncing wheelhouse {wheelhouse_dir} from {requirements_file}...")
+    try:
+        # --find-links reuses wheels already in the wheelhouse; pip wheel also builds any sdists
+        with span('pip wheel', category='process'):
+            run([
+                sys.executable, '-m', 'pip', 'wheel',
+                '--wheel-dir', wheelhouse_dir,
+                '--find-links', wheelhouse_dir,
+                '-r', requirements_file
+            ])
+        # Resolve again against the wheelhouse alone to record exactly which wheels this hash needs
+        with span('pip install --dry-run', category='process'):
+            run([
+                sys.executable, '-m', 'pip', 'install', '--dry-run', '--ignore-installed', '--quiet',
+                '--no-index', '--find-links', wheelhouse_dir,
+                '--report', report_path,
+                '-r', requirements_file
+            ])
+        wheels = sorted(get_report_wheels(report_path))
+    finally:
+        if os.path.exists(report_path):
+            os.remove(report_path)
+
+    def update(manifest):
+        manifest[get_key_digest(key)] = dict(key, wheels=wheels)
+    update_manifest(os.path.join(wheelhouse_dir, WHEELHOUSE_MANIFEST), update)
+    added = len(set(wheels) - before)
+    print(f"Wheelhouse has {len(wheels)} wheel{'s' if len(wheels) != 1 else ''} for {requirements_file} ({added} new)")
+    return wheels
+
+def get_report_wheels(report_path):
+    with open(report_path, 'r') as f:
+        report = json.load(f)
+    return [os.path.basename(unquote(urlparse(item['download_info']['url']).path)) for item in report['install']]
+
+def wheelhouse(args):
+    if args.action == 'sync':
+        return sync_wheelhouse(args.requirements, args.wheelhouse, force=args.force)
+    print(args.wheelhouse or get_wheelhouse_dir())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local wheelhouse for setup dependencies.")
+    parser.add_argument('action', choices=['sync', 'path'], help="'sync' builds wheels for the requirements; 'path' prints the wheelhouse directory")
+    parser.add_argument('--requirements', type=str, default=DEFAULT_REQUIREMENTS_FILE, metavar='FILE',
+                        help=f"Requirements file to sync (default: {DEFAULT_REQUIREMENTS_FILE})")
+    parser.add_argument('--wheelhouse', type=str, default=None, metavar='DIR',
+                        help=f"Wheelhouse directory (default: ${WHEELHOUSE_ENV} or the user cache)")
+    parser.add_argument('--force', action='store_true', help='Sync even if the wheelhouse is already up to date')
+    args = parser.parse_args()
+    wheelhouse(args)